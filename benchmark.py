@@ -0,0 +1,840 @@
+# Benchmark suite for the Coffee Machine. Makes seeded random orders, as in
+# random_order.py, on a synthetic menu, and reports the throughput, outlet
+# utilization and order latency of every setting of a sweep as JSON.
+#
+# Run with no arguments for the quick sweep, or with --full for batches of
+# up to a million orders, which takes a long time. Any setting can be swept
+# over other values from the command line, see --help. Save a run with
+# --output, and compare a later run against it with --baseline. With
+# --priority, the latency of express and complex drinks at peak is compared
+# between the scheduling policies instead, with --batch, the throughput
+# of batched orders on the sample menu, with --fleet, the throughput of
+# fleets of machines, with --processes, the throughput of outlet
+# processes against outlet threads, and with --wal, the throughput, commit
+# latency and recovery time of a machine with a write-ahead log.
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+from clock import VirtualClock
+from coffee_machine import CoffeeMachine, Order
+from event_log import NullSink
+from fleet import Fleet
+from process_machine import ProcessMachine
+from random_order import SEED, generateOrders
+from write_ahead_log import WriteAheadLog
+
+# Number of ingredients in every recipe of the synthetic menu
+RECIPE_SIZE = 4
+
+# Settings swept over by default, and the values of each
+QUICK_SWEEP = {
+    "num_orders": [10, 1000, 10000],
+    "num_outlets": [1, 4],
+    "menu_size": [4, 16],
+    "overlap": [0.0, 1.0],
+    "locking": list(CoffeeMachine.LOCKING_MODES),
+}
+
+FULL_SWEEP = {
+    "num_orders": [10, 1000, 100000, 1000000],
+    "num_outlets": [1, 2, 4, 8],
+    "menu_size": [4, 16, 64],
+    "overlap": [0.0, 0.5, 1.0],
+    "locking": list(CoffeeMachine.LOCKING_MODES),
+}
+
+# Menu of the priority benchmark. Express drinks are quick to pour and
+# ordered with a higher priority, complex drinks take long to pour.
+PRIORITY_MENU = {
+    "hot_water": {"hot_water": 1},
+    "latte": {"hot_milk": 1, "espresso": 1},
+    "cappuccino": {"hot_milk": 1, "espresso": 1, "foam": 1},
+    "mocha": {"hot_milk": 1, "espresso": 1, "cocoa": 1},
+}
+EXPRESS_DRINKS = {"hot_water": 10}
+COMPLEX_DRINKS = {"latte": 60, "cappuccino": 75, "mocha": 90}
+
+# Config the batching benchmark takes its menu from
+SAMPLE_CONFIG = "test_data/standard_input.json"
+
+# Seconds each drink pours for in the fleet benchmark, and in the batching
+# benchmark besides no pour time, unless --pour-time is given. Machines only
+# work side by side while drinks pour, so with no pour time there is nothing
+# for a fleet to spread, nor outlets for a batch to keep idle.
+FLEET_POUR_TIME = 0.002
+
+# Settings that tell the results of two runs apart
+SETTINGS = ("num_orders", "num_outlets", "menu_size", "overlap", "locking",
+    "pour_time")
+
+def buildMenu(menu_size, overlap, stock):
+    """Builds a synthetic menu, in which every recipe takes one unit of
+    RECIPE_SIZE ingredients.
+
+    Parameters
+    ----------
+    menu_size : int
+        Number of drinks on the menu.
+
+    overlap : float
+        Share (from 0 to 1) of the ingredients of a recipe that every
+        recipe has in common. At 0 no two recipes share an ingredient, and
+        at 1 all recipes take the same ingredients.
+
+    stock : int
+        Starting quantity of every ingredient.
+
+    Returns
+    -------
+    beverages : dict
+        Recipe of each drink.
+
+    total_items_qty : dict
+        Starting quantity of each ingredient.
+
+    """
+
+    if overlap < 0 or overlap > 1:
+        raise ValueError("Overlap must be between 0 and 1.")
+
+    shared = round(RECIPE_SIZE * overlap)
+
+    beverages = {}
+    total_items_qty = {}
+
+    for i in range(menu_size):
+        recipe = {}
+
+        for j in range(RECIPE_SIZE):
+            if j < shared:
+                ingredient = "shared_" + str(j)
+            else:
+                ingredient = "item_" + str(i) + "_" + str(j)
+
+            recipe[ingredient] = 1
+            total_items_qty[ingredient] = stock
+
+        beverages["drink_" + str(i)] = recipe
+
+    return beverages, total_items_qty
+
+
+def percentile(values, fraction):
+    """Returns a percentile of a sorted list, by the nearest rank.
+
+    Parameters
+    ----------
+    values : list
+        Sorted values.
+
+    fraction : float
+        Percentile wanted, from 0 to 1.
+
+    Returns
+    -------
+    value : float
+        The percentile, or 0.0 for an empty list.
+
+    """
+
+    if not values:
+        return 0.0
+
+    rank = max(int(round(fraction * len(values))), 1)
+
+    return values[min(rank, len(values)) - 1]
+
+
+def runBenchmark(num_orders, num_outlets, menu_size, overlap, locking,
+    pour_time=0, seed=SEED):
+    """Makes a batch of seeded random orders and measures the machine.
+
+    Stock is set so that every drink can be made, so the numbers are about
+    scheduling and locking only.
+
+    Parameters
+    ----------
+    num_orders : int
+        Number of drinks in the batch.
+
+    num_outlets : int
+        Number of outlets of the machine.
+
+    menu_size : int
+        Number of drinks on the menu.
+
+    overlap : float
+        Share of the ingredients recipes have in common, as in buildMenu.
+
+    locking : str
+        Locking mode of the machine.
+
+    pour_time : float
+        Seconds each drink spends pouring.
+
+    seed : int
+        Seed the orders are generated with.
+
+    Returns
+    -------
+    result : dict
+        Settings of the run, along with the seconds taken, drinks made per
+        second, outlet utilization, and the p50 and p99 latency (seconds
+        from an order being queued to it being done).
+
+    """
+
+    beverages, total_items_qty = buildMenu(menu_size, overlap, num_orders)
+    orders = generateOrders(list(beverages.keys()), num_orders, seed)
+
+    # events are dropped, a million drinks would not fit in memory
+    CM = CoffeeMachine(num_outlets, beverages, total_items_qty,
+        locking=locking, pour_time=pour_time, event_sink=NullSink())
+    CM.start()
+
+    latencies = []
+    service = 0.0
+    made = 0
+
+    # makeOrder would keep every result, so stream them instead
+    start = time.perf_counter()
+    for result in CM.streamOrder(orders):
+        latencies.append(result.wait + result.service)
+        service += result.service
+
+        if result.status == 1:
+            made += 1
+
+    elapsed = time.perf_counter() - start
+    CM.shutdown(wait=True)
+
+    latencies.sort()
+
+    return {
+        "num_orders": num_orders,
+        "num_outlets": num_outlets,
+        "menu_size": menu_size,
+        "overlap": overlap,
+        "locking": locking,
+        "pour_time": pour_time,
+        "made": made,
+        "seconds": elapsed,
+        "throughput": num_orders / elapsed,
+        "utilization": service / (elapsed * num_outlets),
+        "p50": percentile(latencies, 0.50),
+        "p99": percentile(latencies, 0.99),
+    }
+
+
+def runPriorityBenchmark(num_orders, num_outlets, scheduling, aging=30,
+    seed=SEED):
+    """Makes a peak of seeded random orders arrive at once, on a virtual
+    clock at real pour times, and measures the latency of express and
+    complex drinks. The whole peak waits in line, so the scheduler can
+    pick from all of it.
+
+    Parameters
+    ----------
+    num_orders : int
+        Number of drinks in the peak.
+
+    num_outlets : int
+        Number of outlets of the machine.
+
+    scheduling : str
+        Scheduling policy of the machine.
+
+    aging : float
+        Seconds of waiting worth one level of priority.
+
+    seed : int
+        Seed the orders are generated with.
+
+    Returns
+    -------
+    result : dict
+        Settings of the run, along with the p50 and p99 latency (simulated
+        seconds from the peak to the drink being done) of express and of
+        complex drinks.
+
+    """
+
+    pour_times = dict(EXPRESS_DRINKS)
+    pour_times.update(COMPLEX_DRINKS)
+
+    total_items_qty = {}
+    for recipe in PRIORITY_MENU.values():
+        for ingredient in recipe:
+            total_items_qty[ingredient] = num_orders
+
+    CM = CoffeeMachine(num_outlets, PRIORITY_MENU, total_items_qty,
+        queue_size=num_orders, event_sink=NullSink(),
+        pour_times=pour_times, clock=VirtualClock(), scheduling=scheduling,
+        aging=aging)
+
+    orders = [Order(drink, int(drink in EXPRESS_DRINKS))
+        for drink in generateOrders(list(PRIORITY_MENU.keys()), num_orders,
+        seed)]
+
+    latencies = {"express": [], "complex": []}
+    for result in CM.streamOrder(orders):
+        if result.drink_name in EXPRESS_DRINKS:
+            kind = "express"
+        else:
+            kind = "complex"
+
+        latencies[kind].append(result.wait + result.service)
+
+    result = {
+        "num_orders": num_orders,
+        "num_outlets": num_outlets,
+        "scheduling": scheduling,
+        "aging": aging,
+    }
+
+    for kind in latencies:
+        latencies[kind].sort()
+        result[kind + "_p50"] = percentile(latencies[kind], 0.50)
+        result[kind + "_p99"] = percentile(latencies[kind], 0.99)
+
+    return result
+
+
+def runBatchBenchmark(num_orders, num_outlets, batch, locking="global",
+    pour_time=0, seed=SEED):
+    """Makes seeded random orders from the menu of the sample config, as
+    random_order.py writes to temp_orders.txt, with and without batching,
+    and measures the throughput. Stock is set so that every drink the
+    machine has the ingredients for can be made.
+
+    Parameters
+    ----------
+    num_orders : int
+        Number of drinks in the order.
+
+    num_outlets : int
+        Number of outlets of the machine.
+
+    batch : int
+        Largest batch of identical drinks, or None for no batching.
+
+    locking : str
+        Locking mode of the machine.
+
+    pour_time : float
+        Seconds each drink spends pouring. With no pour time, batching
+        only saves trips through the line, while with one it also decides
+        how busy the outlets are kept.
+
+    seed : int
+        Seed the orders are generated with.
+
+    Returns
+    -------
+    result : dict
+        Settings of the run, along with the seconds taken and drinks made
+        per second.
+
+    """
+
+    with open(SAMPLE_CONFIG, "r") as f:
+        data = json.load(f)
+
+    beverages = data['machine']['beverages']
+    largest = max(max(recipe.values()) for recipe in beverages.values())
+    total_items_qty = {ingredient: largest * num_orders
+        for ingredient in data['machine']['total_items_quantity']}
+
+    orders = generateOrders(list(beverages.keys()), num_orders, seed)
+
+    CM = CoffeeMachine(num_outlets, beverages, total_items_qty,
+        locking=locking, pour_time=pour_time, event_sink=NullSink())
+    CM.start()
+
+    start = time.perf_counter()
+    CM.makeOrder(orders, batch=batch)
+    elapsed = time.perf_counter() - start
+
+    CM.shutdown(wait=True)
+
+    return {
+        "num_orders": num_orders,
+        "num_outlets": num_outlets,
+        "batch": batch,
+        "locking": locking,
+        "pour_time": pour_time,
+        "seconds": elapsed,
+        "throughput": num_orders / elapsed,
+    }
+
+
+def runFleetBenchmark(num_orders, num_machines, num_outlets, menu_size=16,
+    overlap=0.5, pour_time=FLEET_POUR_TIME, seed=SEED):
+    """Makes a batch of seeded random orders on a fleet of identical
+    machines, and measures the throughput. Each machine gets enough stock
+    to make the whole batch, so no drink is ever passed over.
+
+    Parameters
+    ----------
+    num_orders : int
+        Number of drinks in the batch.
+
+    num_machines : int
+        Number of machines of the fleet.
+
+    num_outlets : int
+        Number of outlets of every machine.
+
+    menu_size : int
+        Number of drinks on the menu.
+
+    overlap : float
+        Share of the ingredients recipes have in common, as in buildMenu.
+
+    pour_time : float
+        Seconds each drink spends pouring.
+
+    seed : int
+        Seed the orders are generated with.
+
+    Returns
+    -------
+    result : dict
+        Settings of the run, along with the seconds taken, drinks made per
+        second, and the number of drinks routed to each machine.
+
+    """
+
+    beverages, total_items_qty = buildMenu(menu_size, overlap, num_orders)
+    orders = generateOrders(list(beverages.keys()), num_orders, seed)
+
+    fleet = Fleet([CoffeeMachine(num_outlets, beverages,
+        dict(total_items_qty), pour_time=pour_time, event_sink=NullSink())
+        for i in range(num_machines)])
+
+    made = 0
+
+    start = time.perf_counter()
+    for routed in fleet.streamOrder(orders):
+        if routed.result.status == 1:
+            made += 1
+
+    elapsed = time.perf_counter() - start
+
+    return {
+        "num_orders": num_orders,
+        "num_machines": num_machines,
+        "num_outlets": num_outlets,
+        "pour_time": pour_time,
+        "made": made,
+        "seconds": elapsed,
+        "throughput": num_orders / elapsed,
+        "routed": fleet.stats()["routed"],
+    }
+
+
+def runProcessBenchmark(num_orders, num_outlets, backend, menu_size=16,
+    overlap=0.5, pour_time=FLEET_POUR_TIME, seed=SEED):
+    """Makes a batch of seeded random orders on outlet threads or outlet
+    processes, and measures the throughput. The machine gets enough stock
+    to make the whole batch. Threads run in optimistic locking mode, so
+    neither backend holds a lock other outlets wait on while a drink
+    pours, and the gap between them is what processes buy by running
+    outside the interpreter lock.
+
+    Parameters
+    ----------
+    num_orders : int
+        Number of drinks in the batch.
+
+    num_outlets : int
+        Number of outlet threads or processes.
+
+    backend : str
+        "threads" to make the orders on the machine itself, or "processes"
+        to make them on a ProcessMachine.
+
+    menu_size : int
+        Number of drinks on the menu.
+
+    overlap : float
+        Share of the ingredients recipes have in common, as in buildMenu.
+
+    pour_time : float
+        Seconds each drink spends pouring.
+
+    seed : int
+        Seed the orders are generated with.
+
+    Returns
+    -------
+    result : dict
+        Settings of the run, along with the seconds taken and drinks made
+        per second.
+
+    """
+
+    beverages, total_items_qty = buildMenu(menu_size, overlap, num_orders)
+    orders = generateOrders(list(beverages.keys()), num_orders, seed)
+
+    machine = CoffeeMachine(num_outlets, beverages, total_items_qty,
+        locking="optimistic", pour_time=pour_time, event_sink=NullSink())
+
+    # processes are started before the clock, as threads are
+    if backend == "processes":
+        maker = ProcessMachine(machine)
+        maker.start()
+    else:
+        maker = machine
+        maker.start()
+
+    start = time.perf_counter()
+    results = maker.makeOrder(orders)
+    elapsed = time.perf_counter() - start
+
+    if backend == "processes":
+        maker.close()
+    else:
+        maker.shutdown()
+
+    return {
+        "num_orders": num_orders,
+        "num_outlets": num_outlets,
+        "backend": backend,
+        "locking": machine.locking,
+        "pour_time": pour_time,
+        "made": sum(1 for result in results if result.status == 1),
+        "seconds": elapsed,
+        "throughput": num_orders / elapsed,
+    }
+
+
+def runWalBenchmark(num_orders, num_outlets, logged, menu_size=16,
+    overlap=0.5, pour_time=FLEET_POUR_TIME, seed=SEED):
+    """Makes a batch of seeded random orders on a machine with or without a
+    write-ahead log, and measures the throughput. With the log, the commit
+    latency of the changes, and the time a new machine takes to recover
+    the levels from it, are measured too.
+
+    Parameters
+    ----------
+    num_orders : int
+        Number of drinks in the batch.
+
+    num_outlets : int
+        Number of outlets of the machine.
+
+    logged : bool
+        Whether the machine keeps its levels in a write-ahead log.
+
+    menu_size : int
+        Number of drinks on the menu.
+
+    overlap : float
+        Share of the ingredients recipes have in common, as in buildMenu.
+
+    pour_time : float
+        Seconds each drink spends pouring.
+
+    seed : int
+        Seed the orders are generated with.
+
+    Returns
+    -------
+    result : dict
+        Settings of the run, along with the seconds taken and drinks made
+        per second, and with the log, its stats and those of recovering.
+
+    """
+
+    beverages, total_items_qty = buildMenu(menu_size, overlap, num_orders)
+    orders = generateOrders(list(beverages.keys()), num_orders, seed)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "stock.wal")
+
+        if logged:
+            wal = WriteAheadLog(path)
+        else:
+            wal = None
+
+        machine = CoffeeMachine(num_outlets, beverages,
+            dict(total_items_qty), locking="ingredient", pour_time=pour_time,
+            event_sink=NullSink(), wal=wal)
+        machine.start()
+
+        start = time.perf_counter()
+        results = machine.makeOrder(orders)
+        elapsed = time.perf_counter() - start
+
+        machine.shutdown()
+
+        result = {
+            "num_orders": num_orders,
+            "num_outlets": num_outlets,
+            "wal": logged,
+            "pour_time": pour_time,
+            "made": sum(1 for result in results if result.status == 1),
+            "seconds": elapsed,
+            "throughput": num_orders / elapsed,
+        }
+
+        if logged:
+            # the log is left open, as after a crash
+            recovered = WriteAheadLog(path)
+            recovered.open({})
+            recovered.close()
+
+            result["wal_stats"] = wal.stats()
+            result["recovery"] = recovered.stats()["recovery"]
+            wal.close()
+
+    return result
+
+
+def sweep(settings, pour_time=0, seed=SEED):
+    """Runs the benchmark for every combination of the given settings.
+
+    Parameters
+    ----------
+    settings : dict
+        Values of num_orders, num_outlets, menu_size, overlap and locking
+        to sweep over.
+
+    pour_time : float
+        Seconds each drink spends pouring.
+
+    seed : int
+        Seed the orders are generated with.
+
+    Returns
+    -------
+    results : list
+        Result of every run, as returned by runBenchmark.
+
+    """
+
+    names = SETTINGS[:-1]
+    results = []
+
+    for values in itertools.product(*[settings[name] for name in names]):
+        results.append(runBenchmark(*values, pour_time=pour_time,
+            seed=seed))
+
+    return results
+
+
+def compareToBaseline(results, baseline, tolerance=0.1):
+    """Compares the results of a run against those of a stored run.
+
+    Parameters
+    ----------
+    results : list
+        Results of the current run.
+
+    baseline : list
+        Results of the stored run. Settings missing from either run are
+        left out.
+
+    tolerance : float
+        Share by which throughput can drop before it counts as a
+        regression.
+
+    Returns
+    -------
+    comparison : list
+        For every setting in both runs, the settings along with the ratio
+        of the current to the stored throughput and p99 latency, and
+        whether throughput regressed.
+
+    """
+
+    stored = {}
+    for result in baseline:
+        stored[tuple(result[name] for name in SETTINGS)] = result
+
+    comparison = []
+
+    for result in results:
+        old = stored.get(tuple(result[name] for name in SETTINGS))
+        if old is None:
+            continue
+
+        entry = {name: result[name] for name in SETTINGS}
+        entry["throughput_ratio"] = result["throughput"] / old["throughput"]
+
+        if old["p99"] > 0:
+            entry["p99_ratio"] = result["p99"] / old["p99"]
+        else:
+            entry["p99_ratio"] = None
+
+        entry["regressed"] = entry["throughput_ratio"] < 1 - tolerance
+        comparison.append(entry)
+
+    return comparison
+
+
+def main(argv=None):
+    """Runs the benchmark from the command line, and prints the report.
+
+    Parameters
+    ----------
+    argv : list
+        Command line arguments, defaults to those of the script.
+
+    Returns
+    -------
+    code : int
+        1 if a baseline was given and throughput regressed, else 0.
+
+    """
+
+    parser = argparse.ArgumentParser(description="Benchmark the coffee "+
+        "machine over a sweep of settings.")
+    parser.add_argument("--full", action="store_true",
+        help="sweep the full settings, up to a million orders")
+    parser.add_argument("--num-orders", type=int, nargs="+")
+    parser.add_argument("--num-outlets", type=int, nargs="+")
+    parser.add_argument("--menu-size", type=int, nargs="+")
+    parser.add_argument("--overlap", type=float, nargs="+")
+    parser.add_argument("--locking", nargs="+",
+        choices=CoffeeMachine.LOCKING_MODES)
+    parser.add_argument("--pour-time", type=float, default=0)
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--output", help="file to write the report to")
+    parser.add_argument("--baseline", help="report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    parser.add_argument("--priority", action="store_true",
+        help="compare the latency of express and complex drinks at peak "+
+        "between scheduling policies")
+    parser.add_argument("--batch", type=int, nargs="+",
+        help="compare the throughput of orders batched up to these sizes "+
+        "against no batching")
+    parser.add_argument("--fleet", type=int, nargs="+",
+        help="compare the throughput of fleets of these numbers of machines")
+    parser.add_argument("--processes", type=int, nargs="+",
+        help="compare outlet processes against outlet threads, with these "+
+        "numbers of outlets")
+    parser.add_argument("--wal", type=int, nargs="+",
+        help="compare a machine with a write-ahead log against one "+
+        "without, with these numbers of outlets")
+    args = parser.parse_args(argv)
+
+    if args.wal is not None:
+        pour_time = args.pour_time or FLEET_POUR_TIME
+
+        results = []
+        for num_orders in args.num_orders or [2000]:
+            for num_outlets in args.wal:
+                for logged in [False, True]:
+                    results.append(runWalBenchmark(num_orders, num_outlets,
+                        logged, pour_time=pour_time, seed=args.seed))
+
+        print(json.dumps({"seed": args.seed, "results": results}, indent=2))
+        return 0
+
+    if args.processes is not None:
+        pour_time = args.pour_time or FLEET_POUR_TIME
+
+        results = []
+        for num_orders in args.num_orders or [2000]:
+            for num_outlets in args.processes:
+                for backend in ["threads", "processes"]:
+                    results.append(runProcessBenchmark(num_orders,
+                        num_outlets, backend, pour_time=pour_time,
+                        seed=args.seed))
+
+        print(json.dumps({"seed": args.seed, "results": results}, indent=2))
+        return 0
+
+    if args.fleet is not None:
+        pour_time = args.pour_time or FLEET_POUR_TIME
+
+        results = []
+        for num_orders in args.num_orders or [2000]:
+            for num_outlets in args.num_outlets or [2]:
+                for num_machines in args.fleet:
+                    results.append(runFleetBenchmark(num_orders,
+                        num_machines, num_outlets, pour_time=pour_time,
+                        seed=args.seed))
+
+        print(json.dumps({"seed": args.seed, "results": results}, indent=2))
+        return 0
+
+    if args.batch is not None:
+        # without and with drinks pouring, unless --pour-time is given
+        pour_times = [args.pour_time] if args.pour_time else [0,
+            FLEET_POUR_TIME]
+
+        results = []
+        for num_orders in args.num_orders or [10000]:
+            for num_outlets in args.num_outlets or [3]:
+                for locking in args.locking or CoffeeMachine.LOCKING_MODES:
+                    for pour_time in pour_times:
+                        for batch in [None] + args.batch:
+                            results.append(runBatchBenchmark(num_orders,
+                                num_outlets, batch, locking, pour_time,
+                                args.seed))
+
+        print(json.dumps({"seed": args.seed, "results": results}, indent=2))
+        return 0
+
+    if args.priority:
+        results = []
+        for num_orders in args.num_orders or [100, 1000]:
+            for num_outlets in args.num_outlets or [1, 4]:
+                for scheduling in ["fifo", "priority"]:
+                    results.append(runPriorityBenchmark(num_orders,
+                        num_outlets, scheduling, seed=args.seed))
+
+        print(json.dumps({"seed": args.seed, "results": results}, indent=2))
+        return 0
+
+    if args.full:
+        settings = dict(FULL_SWEEP)
+    else:
+        settings = dict(QUICK_SWEEP)
+
+    # settings given on the command line replace those of the sweep
+    for name in SETTINGS[:-1]:
+        values = getattr(args, name)
+        if values is not None:
+            settings[name] = values
+
+    report = {
+        "python": platform.python_version(),
+        "seed": args.seed,
+        "results": sweep(settings, args.pour_time, args.seed),
+    }
+
+    code = 0
+    if args.baseline is not None:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)["results"]
+
+        report["comparison"] = compareToBaseline(report["results"],
+            baseline, args.tolerance)
+
+        if any(entry["regressed"] for entry in report["comparison"]):
+            code = 1
+
+    text = json.dumps(report, indent=2)
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    return code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,238 @@
+# Clocks for the Coffee Machine. The machine reads the time and waits for
+# drinks to pour through a clock, so the same code runs against real time,
+# or against a virtual clock that only moves when it is told to.
+#
+# A clock is any object with now() and sleep(seconds) methods, and a
+# virtual attribute saying whether time only moves when the clock is
+# advanced.
+
+import heapq
+import itertools
+import threading
+import time
+
+class RealClock:
+    """ Clock that reads and waits on real time.
+
+    Attributes
+    ----------
+
+    virtual : bool
+        Always False, time moves on its own.
+
+    """
+
+    virtual = False
+
+
+    def now(self):
+        """Returns the current time.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        now : float
+            Seconds on the monotonic clock of the system.
+
+        """
+
+        return time.monotonic()
+
+
+    def sleep(self, seconds):
+        """Waits for some time.
+
+        Parameters
+        ----------
+        seconds : float
+            Seconds to wait for.
+
+        Returns
+        -------
+
+        """
+
+        time.sleep(seconds)
+
+
+class VirtualClock:
+    """ Discrete-event clock. Time stands still until the clock is
+    advanced, and actions scheduled for a later time are run in time order
+    as the clock passes them. A day of drinks can be gone through in
+    however long it takes to compute them.
+
+    Attributes
+    ----------
+
+    virtual : bool
+        Always True, time only moves when the clock is advanced.
+
+    time : float
+        Current time of the clock, in seconds.
+
+    events : list
+        Heap of scheduled actions, as (time, sequence number, action,
+        arguments) tuples. The sequence number keeps actions scheduled for
+        the same time in the order they were scheduled.
+
+    """
+
+    virtual = True
+
+
+    def __init__(self, start=0.0):
+        """Initializes the VirtualClock class.
+
+        Parameters
+        ----------
+
+        start : float
+            Time the clock starts at.
+
+        Returns
+        -------
+
+        """
+
+        if not isinstance(start, (int, float)):
+            raise ValueError("Start time is not a number.")
+
+        self.time = start
+        self.events = []
+        self.counter = itertools.count()
+
+        # outlet threads may read and move the clock at the same time
+        self.lock = threading.RLock()
+
+
+    def now(self):
+        """Returns the current time.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        now : float
+            Current time of the clock.
+
+        """
+
+        return self.time
+
+
+    def sleep(self, seconds):
+        """Moves the clock forward by some time, running every action
+        scheduled up to then.
+
+        Parameters
+        ----------
+        seconds : float
+            Seconds to move forward by.
+
+        Returns
+        -------
+
+        """
+
+        if seconds < 0:
+            raise ValueError("Cannot move the clock back in time.")
+
+        with self.lock:
+            self.advanceTo(self.time + seconds)
+
+
+    def schedule(self, when, action, *args):
+        """Schedules an action to run once the clock gets to a time.
+
+        Parameters
+        ----------
+        when : float
+            Time to run the action at. Cannot be before the current time.
+
+        action : callable
+            Called with args once the clock gets to when.
+
+        args : tuple
+            Arguments of the action.
+
+        Returns
+        -------
+
+        """
+
+        with self.lock:
+            if when < self.time:
+                raise ValueError("Cannot schedule an action in the past.")
+
+            heapq.heappush(self.events, (when, next(self.counter), action,
+                args))
+
+
+    def nextTime(self):
+        """Returns the time of the next scheduled action.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        when : float
+            Time the next action is scheduled for, or None if no action is.
+
+        """
+
+        with self.lock:
+            if not self.events:
+                return None
+
+            return self.events[0][0]
+
+
+    def advanceTo(self, when):
+        """Moves the clock forward to a time, running every action
+        scheduled up to then, at the time it was scheduled for.
+
+        Parameters
+        ----------
+        when : float
+            Time to move to. Cannot be before the current time.
+
+        Returns
+        -------
+
+        """
+
+        with self.lock:
+            if when < self.time:
+                raise ValueError("Cannot move the clock back in time.")
+
+            while self.events and self.events[0][0] <= when:
+                at, number, action, args = heapq.heappop(self.events)
+                self.time = at
+                action(*args)
+
+            self.time = when
+
+
+    def run(self):
+        """Runs every scheduled action, including those scheduled by the
+        actions themselves, moving the clock along.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+
+        """
+
+        with self.lock:
+            while self.events:
+                self.advanceTo(self.events[0][0])
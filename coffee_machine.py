@@ -1,8 +1,325 @@
 # This class simulates a Coffee Machine in Python for solution to
 # the problem posed by HumIt as a part of their interview process.
 
+import asyncio
+import collections
+import contextlib
+import functools
+import heapq
+import operator
 import threading
 import time
+import types
+
+from clock import RealClock
+from event_log import EventLog
+from menu_index import MenuIndex
+from metrics import MetricsRegistry
+from outlet_scheduler import OutletScheduler
+from refill_worker import RefillWorker
+from stock_monitor import StockMonitor
+from versioned_inventory import VersionedInventory
+from write_ahead_log import WriteAheadLog
+
+# Result of a single drink of an order. Status is as returned by
+# canMakeDrink. Shortfall holds the amount each short ingredient was short
+# by, refilled the amount each ingredient was refilled by to make the drink,
+# and missing the ingredients the machine does not have. Wait is the time
+# (in seconds) the drink waited for an outlet, and service the time it then
+# spent on the outlet.
+OrderResult = collections.namedtuple("OrderResult", ["drink_ID",
+    "drink_name", "status", "shortfall", "refilled", "missing", "wait",
+    "service"])
+
+# Consistent copy of the levels of a coffee machine, for monitoring. Version
+# counts the changes committed to the levels so far, and levels is a
+# read-only dict with ingredient as key, and amount as value.
+Snapshot = collections.namedtuple("Snapshot", ["version", "levels"])
+
+# Single order of a drink, which an order list can hold instead of a plain
+# drink name. Priority and deadline are only used by the "priority"
+# scheduling policy. A higher priority is served sooner, and deadline is the
+# seconds after arriving by which the drink should get an outlet.
+Order = collections.namedtuple("Order", ["drink_name", "priority",
+    "deadline"], defaults=(0, None))
+
+def iterOrders(orders, menu):
+    """Goes through orders one at a time, checking each drink as it comes
+    up. Works on any iterable, such as a list, a generator or an open file
+    with one drink per line, without reading it all in. Drink names are
+    stripped of surrounding whitespace, and blank ones are skipped. The
+    machine, fleets and outlet processes all check orders with this.
+
+    Parameters
+    ----------
+    orders : iterable
+        User requested drinks, as drink names or Order, or a single drink
+        name.
+
+    menu : object
+        Drinks that can be ordered, such as the recipes of a machine, or
+        anything else a drink name can be looked up in with in.
+
+    Returns
+    -------
+    drinks : generator
+        Checked orders, as Order, in order.
+
+    """
+
+    # check if single order
+    if isinstance(orders, str):
+        orders = [orders]
+
+    # check if user supplies a list, or anything else with an order
+    # that can be gone through
+    if (isinstance(orders, (dict, set, frozenset)) or
+        not hasattr(orders, "__iter__")):
+        raise ValueError("Orders were expected in a list or other "+
+            "iterable.")
+
+    return checkEachOrder(orders, menu)
+
+
+def checkEachOrder(orders, menu):
+    """Checks orders lazily, as they are taken from the iterable.
+
+    Parameters
+    ----------
+    orders : iterable
+        User requested drinks, as drink names or Order.
+
+    menu : object
+        Drinks that can be ordered.
+
+    Returns
+    -------
+    drinks : generator
+        Checked orders, as Order, in order.
+
+    """
+
+    # Orders type checks
+    for order in orders:
+
+        if not isinstance(order, Order):
+            order = Order(order)
+
+        drink = order.drink_name
+        if not isinstance(drink, str):
+            raise ValueError("Drink name in order is not a string.")
+
+        drink = drink.strip()
+        if not drink:
+            continue
+
+        if drink not in menu:
+            raise ValueError("Drink recipe for ordered drink is not known.")
+
+        if not isinstance(order.priority, int):
+            raise ValueError("Priority of order is not an integer.")
+
+        if order.deadline is not None and (not isinstance(
+            order.deadline, (int, float)) or order.deadline < 0):
+            raise ValueError("Deadline of order is not a number of at "+
+                "least 0.")
+
+        yield order._replace(drink_name=drink)
+
+
+class OrderTicket:
+    """ Class for a drink order travelling from makeOrder through the
+    scheduler to an outlet worker. A ticket is for a single drink, or for
+    a batch of the same drink when batching.
+
+    Attributes
+    ----------
+
+    drink_name : str
+        Name of the ordered drink.
+
+    drink_IDs : list
+        Positions in its order of the drinks the ticket is for.
+
+    queued_at : float
+        Time the drinks were handed to the scheduler.
+
+    done : threading.Event
+        Set by the outlet worker once the drinks have been handled.
+
+    results : list
+        Result of every drink, as an OrderResult, in the order of
+        drink_IDs, once done.
+
+    error : Exception
+        Error raised while making the drinks, if any.
+
+    reserved : bool
+        Whether the ingredients of the drinks were reserved already, so
+        the outlet only pours them.
+
+    refilled : dict
+        Amount each ingredient was refilled by while the drinks waited for
+        refills, with the "wait" refill policy.
+
+    """
+
+    __slots__ = ("drink_name", "drink_IDs", "queued_at", "done", "results",
+        "error", "reserved", "refilled")
+
+
+    def __init__(self, drink_name, drink_IDs, queued_at, reserved=False):
+        """Initializes the OrderTicket class.
+
+        Parameters
+        ----------
+
+        drink_name : str
+            Name of the ordered drink.
+
+        drink_IDs : list
+            Positions in its order of the drinks the ticket is for.
+
+        queued_at : float
+            Time the drinks were handed to the scheduler.
+
+        reserved : bool
+            Whether the ingredients of the drinks were reserved already.
+
+        Returns
+        -------
+
+        """
+
+        self.drink_name = drink_name
+        self.drink_IDs = drink_IDs
+        self.queued_at = queued_at
+        self.done = threading.Event()
+        self.results = None
+        self.error = None
+        self.reserved = reserved
+        self.refilled = {}
+
+
+class OrderPlan:
+    """ Class for what the levels of a coffee machine can make out of an
+    order list, worked out before any drink is handed to an outlet.
+    Orders are taken in list order, without refilling anything.
+
+    Attributes
+    ----------
+
+    orders : list
+        List of user requested drinks the plan is for.
+
+    prefix : int
+        Number of orders at the start of the list that can all be made.
+
+    makeable : list
+        Positions of the orders that can be made, skipping the ones that
+        cannot.
+
+    short : list
+        Positions of the orders that cannot be made because ingredients
+        run out by the time they come up.
+
+    unavailable : list
+        Positions of the orders needing an ingredient the machine does not
+        have.
+
+    shortfall : dict
+        Amount of each ingredient that has to be added for every order
+        that is not unavailable to be made. Only has ingredients that are
+        short.
+
+    remaining : dict
+        Levels left after making the makeable orders.
+
+    """
+
+    __slots__ = ("orders", "prefix", "makeable", "short", "unavailable",
+        "shortfall", "remaining")
+
+
+    def __init__(self, orders, prefix, makeable, short, unavailable,
+        shortfall, remaining):
+        """Initializes the OrderPlan class.
+
+        Parameters
+        ----------
+
+        The parameters are the attributes of the class, in order.
+
+        Returns
+        -------
+
+        """
+
+        self.orders = orders
+        self.prefix = prefix
+        self.makeable = makeable
+        self.short = short
+        self.unavailable = unavailable
+        self.shortfall = shortfall
+        self.remaining = remaining
+
+
+class Reservation:
+    """ Class for the ingredients of a group of drinks, such as the drinks
+    of one customer, taken out of the levels of a coffee machine all at
+    once. The group is either reserved in full or rejected, so it is never
+    left half made.
+
+    Attributes
+    ----------
+
+    orders : list
+        Drink names of the group.
+
+    status : str
+        "held" while the ingredients are reserved, "rejected" if they
+        could not be, "committed" once the drinks are handed to the
+        outlets, and "released" once the ingredients are handed back.
+
+    vector : tuple
+        Ingredients reserved, indexed by ingredient ID, or None if the
+        group needs an ingredient the machine does not have.
+
+    amounts : dict
+        Amount reserved of each ingredient the group uses.
+
+    shortfall : dict
+        Amount each ingredient was short by, if rejected.
+
+    missing : list
+        Ingredients of the group the machine does not have, if rejected.
+
+    """
+
+    __slots__ = ("orders", "status", "vector", "amounts", "shortfall",
+        "missing")
+
+
+    def __init__(self, orders, status, vector, amounts, shortfall, missing):
+        """Initializes the Reservation class.
+
+        Parameters
+        ----------
+
+        The parameters are the attributes of the class, in order.
+
+        Returns
+        -------
+
+        """
+
+        self.orders = orders
+        self.status = status
+        self.vector = vector
+        self.amounts = amounts
+        self.shortfall = shortfall
+        self.missing = missing
+
 
 class CoffeeMachine:
     """ Class for simulating a coffee machine. Stores inherent attributes
@@ -19,15 +336,126 @@ class CoffeeMachine:
         Recipes for the various drinks the machine makes.
 
     raw_material_qty : dict
-        Stores quantity of raw material in the coffee machine.
+        Read-only view of the quantity of raw material in the coffee
+        machine, built from the latest snapshot.
+
+    ingredients : list
+        Names of the ingredients in the machine. The position of an
+        ingredient in this list is its ingredient ID.
+
+    ingredient_ids : dict
+        Ingredient ID of each ingredient in the machine.
+
+    levels : list
+        Quantity of each ingredient, indexed by ingredient ID. In
+        optimistic locking mode, the levels are kept in inventory instead.
+
+    recipe_vectors : dict
+        Recipe of each drink compiled to a tuple of quantities indexed by
+        ingredient ID, for drinks whose ingredients are all in the machine.
+
+    recipe_ids : dict
+        Ingredient IDs each compiled recipe uses, in recipe order.
+
+    missing_ingredients : dict
+        Ingredients of each drink that are not in the machine.
 
     menu : list
         Stores names of all drinks that can be made by the machine
 
+    menu_index : MenuIndex
+        Number of each drink the levels hold, kept up to date as the
+        levels change.
+
+    scheduler : OutletScheduler
+        Line of orders the outlet workers pull from. Counts queue depth
+        and wait times. Orders simulated on a virtual clock each keep a
+        line of their own.
+
+    workers : list
+        Long-lived outlet worker threads, one per outlet, while the
+        machine is started.
+
+    pool_users : int
+        Number of orders running on workers started for orders, while the
+        machine was not started.
+
+    locking : str
+        Locking mode, "global" for one lock around the whole machine,
+        "ingredient" for one lock per ingredient, or "optimistic" for
+        versioned inventory updates without locks.
+
+    inventory : VersionedInventory
+        Versioned ingredient levels, in optimistic locking mode only.
+
+    snapshots : VersionedInventory
+        Immutable copies of the levels, swapped in on every change, so
+        they can be read without any lock. The same as inventory in
+        optimistic locking mode.
+
+    pour_time : float
+        Seconds an outlet spends pouring a drink.
+
+    pour_times : dict
+        Seconds an outlet spends pouring each drink, for drinks that do
+        not take pour_time.
+
+    clock : object
+        Clock the machine reads the time from and waits on.
+
+    scheduling : str
+        Policy orders are handed to the outlets by, "fifo" or "priority".
+
+    aging : float
+        Seconds of waiting worth one level of priority, with the
+        "priority" policy.
+
+    events : EventLog
+        Log the outlets emit events about their drinks to.
+
+    refill_policy : str
+        What happens to a drink short on ingredients, "auto", "reject" or
+        "wait".
+
+    refills : RefillWorker
+        Worker carrying out the refills drinks wait for, with the "wait"
+        refill policy, and restocks.
+
+    stock : StockMonitor
+        Forecast of when each ingredient runs out, or None if stock is not
+        tracked.
+
+    on_low_stock : callable
+        Called when an ingredient is forecast to run out soon, if given.
+
+    restock : dict
+        Quantity to refill each ingredient by in the background once it
+        is forecast to run out soon.
+
+    wal : WriteAheadLog
+        Log the changes to the levels are kept on disk with, or None.
+
+    metrics : MetricsRegistry
+        Counters of the drinks done by status, histograms of the seconds
+        they waited and spent on an outlet, the seconds the outlets were
+        busy, and gauges of the outlets and levels. Export them with
+        metrics.export, or serve them with metrics.serve.
+
     """
 
+    # known locking modes
+    LOCKING_MODES = ("global", "ingredient", "optimistic")
+
+    # known refill policies
+    REFILL_POLICIES = ("auto", "reject", "wait")
+
 
-    def __init__(self, num_outlets=1, beverages={}, raw_material_qty={}):
+    def __init__(self, num_outlets=1, beverages={}, raw_material_qty={},
+        queue_size=None, locking="global", pour_time=0, event_sink=None,
+        pour_times=None, clock=None, scheduling="fifo", aging=30,
+        refill_policy="auto", refill_delay=0, refill_rate=None,
+        stock_window=None, stock_horizon=300, on_low_stock=None,
+        restock=None, compiled=None, wal=None):
         """Initialized the CoffeeMachine class.
 
         Paramaters
@@ -45,28 +473,288 @@ class CoffeeMachine:
             Stores quantity of raw material in the coffee machine.
             Dictionary with ingredient as key, and current amount as value.
 
+        queue_size : int
+            Maximum number of orders waiting for an outlet at once.
+            Defaults to twice the number of outlets.
+
+        locking : str
+            Locking mode. With "global", a single lock is held while a
+            drink is checked and its ingredients taken out, so outlets
+            take turns at it. With "ingredient", only the ingredients
+            named in the recipe are locked, so drinks that share no
+            ingredient are checked concurrently. With "optimistic", no
+            lock is held while making a drink. The drink is checked and
+            deducted on a copy of the levels, which is committed only if
+            no other drink was committed meanwhile, and is done again
+            otherwise. In every mode, drinks pour with no lock held.
+
+        pour_time : float
+            Seconds an outlet spends pouring a drink, once its ingredients
+            are taken out. Defaults to 0.
+
+        event_sink : object
+            Sink for the events about drinks, such as a StdoutSink,
+            JsonlSink or MemorySink from event_log. Defaults to printing
+            to standard output.
+
+        pour_times : dict
+            Seconds an outlet spends pouring each drink, with drink name
+            as key. Drinks left out take pour_time.
+
+        clock : object
+            Clock to read the time from and wait on, such as a RealClock
+            or VirtualClock from clock. Defaults to real time. With a
+            virtual clock, orders are gone through as a discrete-event
+            simulation on the calling thread, and pouring a drink only
+            books its outlet for the pour time, so no time really passes.
+
+        scheduling : str
+            Policy orders are handed to the outlets by. With "fifo", in
+            the order they were given. With "priority", by their priority
+            and deadline, as given with Order, see OutletScheduler.
+
+        aging : float
+            Seconds of waiting worth one level of priority, and how long
+            an order without a deadline is given, with the "priority"
+            policy. Defaults to 30.
+
+        refill_policy : str
+            What happens to a drink short on ingredients. With "auto", the
+            short ingredients are topped up on the spot, by what is
+            missing, while the ingredients are locked. With "reject", the
+            drink is not made. With "wait", the outlet asks the refill
+            worker for what is missing and moves on to other drinks, and
+            the drink goes back to the front of the line once the refill
+            is done. A batch waits whole, for what the whole batch is
+            short by. Defaults to "auto".
+
+        refill_delay : float
+            Seconds every refill takes, with the "wait" refill policy.
+            Refills are done one after another. Defaults to 0.
+
+        refill_rate : float
+            Units refilled per second on top of refill_delay, with the
+            "wait" refill policy. Defaults to None, for refills that take
+            the same time whatever they add.
+
+        stock_window : int
+            Number of pours the rate each ingredient is used at is worked
+            out from, see StockMonitor. Defaults to None, for not tracking
+            stock.
+
+        stock_horizon : float
+            Seconds ahead an ingredient running out is reported, when
+            tracking stock. It is reported with a "low_stock" event, once
+            until it is back beyond the horizon. Defaults to 300.
+
+        on_low_stock : callable
+            Called with the name, level and seconds left of an ingredient
+            reported low, when tracking stock. Called by the outlet that
+            poured the drink, once no lock is held.
+
+        restock : dict
+            Quantity to refill each ingredient by once it is reported low,
+            when tracking stock, with ingredient as key. The refill is
+            carried out by the refill worker in the background, taking
+            refill_delay and refill_rate. Ingredients left out are not
+            restocked.
+
+        compiled : CompiledConfig
+            Config the beverages and raw_material_qty given come from,
+            already checked and compiled, such as one loaded by loadConfig
+            from machine_config. The config is then not checked or
+            compiled again. Defaults to None.
+
+        wal : WriteAheadLog
+            Log to keep the levels on disk with, see write_ahead_log. If
+            the log already holds levels, such as after a crash, the
+            machine starts from them instead of raw_material_qty, for the
+            ingredients they cover. Every pour, refill and reservation is
+            logged, and a drink is only done once its change is on disk.
+            Defaults to None, for levels kept in memory only.
+
         Returns
         -------
 
         """
 
-        # Check if input is supplied in the correct format
-        self.__checkFormat(num_outlets, beverages, raw_material_qty)
+        if pour_times is None:
+            pour_times = {}
+
+        if clock is None:
+            clock = RealClock()
+
+        if restock is None:
+            restock = {}
+
+        # a compiled config was checked when it was compiled
+        if compiled is None:
+            # Check if input is supplied in the correct format
+            self.__checkFormat(num_outlets, beverages, raw_material_qty)
 
-        # Check if values make sense semantically
-        self.__checkSemantics(num_outlets, beverages, raw_material_qty)
+            # Check if values make sense semantically
+            self.__checkSemantics(num_outlets, beverages, raw_material_qty)
+
+        elif (compiled.num_outlets != num_outlets or
+            compiled.beverages is not beverages or
+            compiled.raw_material_qty is not raw_material_qty):
+            raise ValueError("Compiled config is not of this machine.")
+
+        # Check if the machine options are known
+        self.__checkOptions(locking, pour_time, pour_times, clock,
+            beverages, refill_policy, on_low_stock, restock,
+            raw_material_qty, wal)
 
         # If no error, continue onwards and assign values
         self.num_outlets = num_outlets
         self.beverages = beverages
-        self.raw_material_qty = raw_material_qty
         self.menu = list(beverages.keys())
 
-        # lock for multithreading
+        # ingredients are given IDs, and recipes are compiled once to
+        # vectors over them
+        if compiled is None:
+            self.ingredients = list(raw_material_qty.keys())
+            self.ingredient_ids = {}
+            for i in range(len(self.ingredients)):
+                self.ingredient_ids[self.ingredients[i]] = i
+
+            self.__compileRecipes(beverages)
+        else:
+            # compiled recipes are only read, so they are shared
+            self.ingredients = list(compiled.ingredients)
+            self.ingredient_ids = dict(compiled.ingredient_ids)
+            self.recipe_vectors = compiled.recipe_vectors
+            self.recipe_ids = compiled.recipe_ids
+            self.missing_ingredients = compiled.missing_ingredients
+
+        self.levels = [raw_material_qty[ingredient]
+            for ingredient in self.ingredients]
+
+        # levels kept on disk take over from those given
+        self.wal = wal
+        if wal is not None:
+            levels = wal.open(dict(zip(self.ingredients, self.levels)))
+            self.levels = [levels[ingredient]
+                for ingredient in self.ingredients]
+
+        self.locking = locking
+        self.pour_time = pour_time
+        self.pour_times = dict(pour_times)
+        self.clock = clock
+
+        # versioned levels, used in optimistic locking mode
+        if locking == "optimistic":
+            self.inventory = VersionedInventory(tuple(self.levels))
+            self.snapshots = self.inventory
+        else:
+            self.inventory = None
+            self.snapshots = VersionedInventory(tuple(self.levels))
+
+        # servings of every drink, worked out again for the drinks a
+        # change to the levels touches
+        self.menu_index = MenuIndex(self.menu, self.recipe_vectors,
+            self.recipe_ids, self.__currentLevels)
+
+        # lock for multithreading, used in global locking mode
         self.lock = threading.Lock()
 
-        # list of running threads
-        self.running_threads = []
+        # guards the status of reservations, so each is committed or
+        # released only once
+        self.reservation_lock = threading.Lock()
+
+        # one lock per ingredient, used in ingredient locking mode
+        self.ingredient_locks = {}
+        for ingredient in raw_material_qty:
+            self.ingredient_locks[ingredient] = threading.Lock()
+
+        # locks each recipe needs, in sorted ingredient order, so two
+        # outlets never end up waiting on each other in a cycle
+        self.recipe_locks = {}
+        for drink in beverages:
+            self.recipe_locks[drink] = [self.ingredient_locks[ingredient]
+                for ingredient in sorted(beverages[drink])
+                if ingredient in self.ingredient_locks]
+
+        # line of orders, handed to an outlet as soon as one is free
+        self.queue_size = queue_size
+        self.scheduling = scheduling
+        self.aging = aging
+        self.scheduler = OutletScheduler(num_outlets, queue_size,
+            scheduling, aging, clock)
+
+        # outlet worker threads, created by start
+        self.workers = []
+
+        # orders running on a set of workers started just for them, which
+        # the last one to finish shuts down
+        self.pool_lock = threading.Lock()
+        self.pool_users = 0
+
+        # events about drinks, written out by a background thread
+        self.events = EventLog(event_sink)
+
+        # counters and histograms the outlets record into, and gauges read
+        # when the metrics are exported
+        self.metrics = MetricsRegistry()
+        self.__addMetrics()
+
+        # refills drinks wait for, done away from the outlets
+        self.refill_policy = refill_policy
+        self.refills = RefillWorker(self.refill, refill_delay, refill_rate,
+            clock)
+
+        # forecast of when each ingredient runs out, from the last pours
+        if stock_window is None:
+            self.stock = None
+        else:
+            self.stock = StockMonitor(self.ingredients, stock_window,
+                stock_horizon)
+
+        self.on_low_stock = on_low_stock
+        self.restock = dict(restock)
+
+        # event loop and semaphore guarding the outlets for coroutines
+        self.__async_outlets = None
+
+
+    def __addMetrics(self):
+        """ Method to add the metrics of the machine to its registry.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+
+        """
+
+        metrics = self.metrics
+
+        self.__drinks_done = metrics.counter("coffee_drinks_total",
+            "Drinks done, by status: 1 made, 0 short of an ingredient, -1 "+
+            "missing an ingredient.", ("drink", "status"))
+        self.__drink_wait = metrics.histogram("coffee_drink_wait_seconds",
+            "Seconds drinks waited for an outlet.", ("drink",))
+        self.__drink_service = metrics.histogram(
+            "coffee_drink_service_seconds", "Seconds drinks spent on an "+
+            "outlet.", ("drink",))
+        self.__outlet_busy = metrics.counter(
+            "coffee_outlet_busy_seconds_total", "Seconds the outlets spent "+
+            "making drinks, added up across outlets.")
+
+        # utilization is the rate of busy seconds over the outlets
+        metrics.gauge("coffee_outlets", "Number of outlets.",
+            lambda: {(): self.num_outlets})
+        metrics.gauge("coffee_outlets_busy", "Number of outlets making a "+
+            "drink now.", lambda: {(): self.scheduler.stats()["busy"]})
+        metrics.gauge("coffee_queue_depth", "Number of orders waiting for "+
+            "an outlet now.",
+            lambda: {(): self.scheduler.stats()["queue_depth"]})
+        metrics.gauge("coffee_ingredient_level", "Quantity of each "+
+            "ingredient now.", lambda: {(ingredient,): level
+            for ingredient, level in zip(self.ingredients,
+            self.snapshots.read()[1])}, ("ingredient",))
 
 
     def __checkFormat(self, num_outlets, beverages, raw_material_qty):
@@ -175,263 +863,2273 @@ class CoffeeMachine:
                     "be less than 0.")
 
 
-    def refill(self, ingredient, qty):
-        """ Method to refill certain ingredient by given amount.
-        Assumes populated coffee machine.
-        
-        Parameters
-        ----------
+    @property
+    def raw_material_qty(self):
+        """Quantity of raw material in the coffee machine. Read-only
+        dictionary with ingredient as key, and current amount as value.
+        """
 
-        ingredient : str
-            Name of ingredient to be refilled
+        return self.snapshot().levels
 
-        qty : int
-            Quantity to be added
+
+    def snapshot(self):
+        """Returns a consistent copy of the levels, as of the last change
+        committed. Never takes a lock the outlets take, so monitoring can
+        read it at any rate without holding up any drink.
+
+        Parameters
+        ----------
+        None
 
         Returns
         -------
+        snapshot : Snapshot
+            Version and read-only levels of the copy.
 
         """
 
-        # type checks
-        if not isinstance(ingredient, str):
-            raise ValueError("Ingredient is not a string.")
-
-        if not isinstance(qty, int):
-            raise ValueError("Quantity is not an integer.")
-
-        # check if ingredient found in dictionary
-        if ingredient not in self.raw_material_qty :
-            raise ValueError("Ingredient not in coffee machine.")
-
-        # semantic check : refilling should not leave the coffee maachine
-        # with negative value
-        if self.raw_material_qty[ingredient] + qty < 0 :
-            raise ValueError("Cannot add because final quantity of "+
-                "ingredient after refilling becomes negative")
+        version, levels = self.snapshots.read()
 
-        # add to coffee machine
-        self.raw_material_qty[ingredient] += qty
+        return Snapshot(version, types.MappingProxyType(dict(zip(
+            self.ingredients, levels))))
 
 
-    def __canMakeDrink(self, drink_name):
-        """Method to check if a certain drink can be made with the current
-        contents of the machine. Assumes populated coffee machine.
+    def __publishLevels(self, ids):
+        """Method to swap in a new snapshot after some levels changed, in
+        the locking modes with locks. Must be called while the locks of
+        those ingredients are still held. Only those ingredients are
+        copied into the last snapshot, since other outlets may be midway
+        through changing the rest, so a snapshot never shows part of a
+        drink.
 
         Parameters
         ----------
-        drink_name : str
-            Name of drink to be made
+        ids : iterable
+            Ingredient IDs whose levels changed.
 
         Returns
         -------
-        status : int
-            Returns if it is possible to make drink.
-            Casewise, returns:
-                1, if drink can be made
-                0, if insufficient ingredients
-                -1, if ingredient not found
 
         """
-        if not isinstance(drink_name, str):
-            raise ValueError("Drink name is not a string in canMake.")
 
-        if drink_name not in self.beverages:
-            raise ValueError("Drink recipe is not known in canMake.")
+        values = [(i, self.levels[i]) for i in ids]
 
-        # get recipe from coffee machine
-        recipe = self.beverages[drink_name]
+        def publish(levels):
+            levels = list(levels)
+            for i, amount in values:
+                levels[i] = amount
 
-        # first check if all ingredients even exist
-        for ingredient in recipe:
-            if ingredient not in self.raw_material_qty:
-                return -1
-        
-        # then check if quantities are sufficient
-        for ingredient in recipe:
-            if self.raw_material_qty[ingredient] < recipe[ingredient]:
-                return 0
+            return tuple(levels), None
 
-        return 1
+        self.snapshots.update(publish)
 
 
-    def __pourDrink(self, drink_name):
-        """Method to subtract contents of drink. 
-        Only used after it is known that a drink can be made. 
-        Assumes populated coffee machine.
+    def __currentLevels(self):
+        """ Method to get the current levels, wherever the locking mode
+        keeps them.
 
         Parameters
         ----------
-        drink_name : str
-            Name of drink to be made
+        None
 
         Returns
         -------
+        levels : list
+            Quantity of each ingredient, indexed by ingredient ID.
 
         """
-        recipe = self.beverages[drink_name]
 
-        for ingredient in recipe:
-            self.raw_material_qty[ingredient] -= recipe[ingredient]
+        if self.inventory is not None:
+            return self.inventory.levels()
 
+        return self.levels
 
-    def __makeDrink(self, drink_name, drink_ID):
-        """Method to make a drink order.
+
+    def __compileRecipes(self, beverages):
+        """ Method to compile the recipes into vectors indexed by
+        ingredient ID, so checking and pouring a drink works on whole
+        vectors instead of one ingredient at a time.
 
         Parameters
         ----------
-        drink_name : str
-            String of drink name.
 
-        drink_ID : int
-            Drink ID for determining which process it is.
+        beverages : dict
+            Recipes for the various drinks the machine makes.
 
         Returns
         -------
 
         """
 
-        # check if drink has known recipe, and is a string
-        if not isinstance(drink_name, str):
-            raise ValueError("Drink name is not a string.")
-
-        if drink_name not in self.beverages:
-            raise ValueError("Drink recipe is not known.")
+        self.recipe_vectors = {}
+        self.recipe_ids = {}
+        self.missing_ingredients = {}
 
-        with self.lock:
-            status = self.__canMakeDrink(drink_name)
-
-            print("Currently preparing drink number " + str(drink_ID) + ".")
-            print()
-
-            # if drink can be made
-            if status == 1:
-                # make it
-                self.__pourDrink(drink_name)
-                print(drink_name + " can be made.")
-                print("Now pouring the ingredients ...")
-                # time.sleep(2)
-                print("Done!")
-                print()
-                print("###########")
-
-            # if drink can't be made due to insufficiency
-            elif status == 0:
-                insuff_ing_list = []
-                insuff_ing_qty = []
-
-                # find which ingredients are insufficient
-                recipe = self.beverages[drink_name]
-                for ingredient in recipe:
-                    if self.raw_material_qty[ingredient] < recipe[ingredient]:
-                        insuff_ing_list.append(ingredient)
-                        insuff_ing_qty.append(recipe[ingredient] - 
-                            self.raw_material_qty[ingredient])
-
-                print(drink_name + " will not be made because some ingredients "+
-                    "are not sufficient, which are: ")
-                print(insuff_ing_list)
-
-                # Refill and make the drink
-
-                print("Extra amount of these ingredients required is :")
-                print(insuff_ing_qty)
-
-                # refill these ingredients using the method
-                for i in range(len(insuff_ing_list)):
-                    self.refill(insuff_ing_list[i], insuff_ing_qty[i])
-
-                print("Refilled the ingredients, now they are sufficient "+
-                    "for making the drink.")
-                print("Making the drink now.")
-                self.__pourDrink(drink_name)
-                print("Now pouring the ingredients ...")
-                # time.sleep(2)
-                print("Done!")
-                print()
-                print("###########")
-                
-            # if machine doesn't have required ingredients
-            else:  
-                recipe = self.beverages[drink_name]
-                nonex_ing_list = []
-
-                # find which ingredients don't exist
-                for ingredient in recipe:
-                    if ingredient not in self.raw_material_qty:
-                        nonex_ing_list.append(ingredient)
-
-                print(drink_name + " cannot be made because some ingredients "+
-                    "are not available, which are : ")
-                print(nonex_ing_list)
-                print()
-                print("###########")
-                # time.sleep(2)
-
-            self.running_threads.remove(drink_ID)
-
-    def makeOrder(self, orders=[]):
-        """Class method exposed to the user. Makes 'n' drinks in parallel, 
-        based on the order list supplied by the user.
+        for drink in beverages:
+            recipe = beverages[drink]
 
-        Parameters
-        ----------
-        orders : list
-            List of user requested drinks
+            self.missing_ingredients[drink] = [ingredient
+                for ingredient in recipe
+                if ingredient not in self.ingredient_ids]
 
-        Returns
-        -------
+            # drinks missing an ingredient can never be made
+            if self.missing_ingredients[drink]:
+                continue
 
-        """
+            vector = [0] * len(self.ingredients)
+            for ingredient in recipe:
+                vector[self.ingredient_ids[ingredient]] = recipe[ingredient]
 
-        # check if single order
-        if isinstance(orders, str):
-            orders = [orders]
+            self.recipe_vectors[drink] = tuple(vector)
+            self.recipe_ids[drink] = tuple(self.ingredient_ids[ingredient]
+                for ingredient in recipe)
 
-        # check if user supplies a list
-        if not isinstance(orders, list):
-            raise ValueError("Orders were expected in a list.")
 
-        # Orders type checks
-        for drink in orders:
+    def __checkOptions(self, locking, pour_time, pour_times, clock,
+        beverages, refill_policy, on_low_stock, restock, raw_material_qty,
+        wal):
+        """ Method to check if the options of the machine, which are not
+        part of the recipes and raw material, are known and make sense.
 
-            if not isinstance(drink, str):
-                raise ValueError("Drink name in order is not a string.")
+        Parameters
+        ----------
 
-            if drink not in self.beverages:
-                raise ValueError("Drink recipe for ordered drink is not known.")
+        locking : str
+            Locking mode of the machine.
 
-        if len(orders) == 0:
-            print("No orders were given, please give orders.")
-            return
+        pour_time : float
+            Seconds an outlet spends pouring a drink.
 
-        self.orders = orders
+        pour_times : dict
+            Seconds an outlet spends pouring each drink.
 
-        # list of threads containing tasks
-        threads = []
+        clock : object
+            Clock of the machine.
 
-        # iterate over orders drink wise, spawn parallel processes
-        # but only do this if more processes are allowed
-        for i in range(len(self.orders)):
+        beverages : dict
+            Recipes for the various drinks the machine makes.
+
+        refill_policy : str
+            Refill policy of the machine.
+
+        on_low_stock : callable
+            Callback for ingredients forecast to run out soon.
+
+        restock : dict
+            Quantity to refill each ingredient by once it runs low.
+
+        raw_material_qty : dict
+            Quantity of raw material in the coffee machine.
+
+        wal : WriteAheadLog
+            Log to keep the levels on disk with.
+
+        Returns
+        -------
+
+        """
+
+        if locking not in self.LOCKING_MODES:
+            raise ValueError("Locking mode is not known.")
+
+        if refill_policy not in self.REFILL_POLICIES:
+            raise ValueError("Refill policy is not known.")
+
+        if not isinstance(pour_times, dict):
+            raise ValueError("Pour times are not a dict.")
+
+        for drink in pour_times:
+            if drink not in beverages:
+                raise ValueError("Drink in pour times is not known.")
+
+        for seconds in [pour_time] + list(pour_times.values()):
+            if not isinstance(seconds, (int, float)):
+                raise ValueError("Pour time is not a number.")
+
+            if seconds < 0:
+                raise ValueError("Pour time cannot be less than 0.")
+
+        if not (callable(getattr(clock, "now", None)) and
+            callable(getattr(clock, "sleep", None))):
+            raise ValueError("Clock has no now or sleep method.")
+
+        if not isinstance(getattr(clock, "virtual", None), bool):
+            raise ValueError("Clock does not say if it is virtual.")
+
+        if on_low_stock is not None and not callable(on_low_stock):
+            raise ValueError("Low stock callback is not callable.")
+
+        if not isinstance(restock, dict):
+            raise ValueError("Restock quantities are not a dict.")
+
+        for ingredient in restock:
+            if ingredient not in raw_material_qty:
+                raise ValueError("Ingredient in restock is not known.")
+
+            if not isinstance(restock[ingredient], int) or (
+                restock[ingredient] <= 0):
+                raise ValueError("Restock quantity is not an integer more "+
+                    "than 0.")
+
+        if wal is not None and not isinstance(wal, WriteAheadLog):
+            raise ValueError("Write-ahead log is not a WriteAheadLog.")
+
+
+    @contextlib.contextmanager
+    def __lockIngredients(self, locks):
+        """ Method to hold the locks guarding some ingredients, for use in
+        a with statement. In global locking mode the machine lock is held
+        instead.
+
+        Parameters
+        ----------
+
+        locks : list
+            Locks of the ingredients, in sorted ingredient order.
+
+        Returns
+        -------
+
+        """
+
+        if self.locking == "global":
+            with self.lock:
+                yield
+            return
+
+        for lock in locks:
+            lock.acquire()
+
+        try:
+            yield
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+
+
+    def refill(self, ingredient, qty):
+        """ Method to refill certain ingredient by given amount.
+        Assumes populated coffee machine.
+        
+        Parameters
+        ----------
+
+        ingredient : str
+            Name of ingredient to be refilled
+
+        qty : int
+            Quantity to be added
+
+        Returns
+        -------
+
+        """
+
+        # type checks
+        if not isinstance(ingredient, str):
+            raise ValueError("Ingredient is not a string.")
+
+        if not isinstance(qty, int):
+            raise ValueError("Quantity is not an integer.")
+
+        # check if ingredient found in dictionary
+        if ingredient not in self.ingredient_ids :
+            raise ValueError("Ingredient not in coffee machine.")
+
+        i = self.ingredient_ids[ingredient]
+
+        if self.inventory is not None:
+            self.inventory.update(lambda levels: (levels[:i] +
+                (self.__addIngredient(levels[i], qty),) + levels[i+1:], None))
+        else:
+            with self.__lockIngredients([self.ingredient_locks[ingredient]]):
+                self.levels[i] = self.__addIngredient(self.levels[i], qty)
+                self.__publishLevels([i])
+
+        self.menu_index.update([i])
+
+        if self.wal is not None:
+            self.wal.log("refill", None, {ingredient: qty})
+
+
+    def __addIngredient(self, amount, qty):
+        """ Method to work out the amount of an ingredient after a refill.
+
+        Parameters
+        ----------
+
+        amount : int
+            Current amount of the ingredient
+
+        qty : int
+            Quantity to be added
+
+        Returns
+        -------
+        amount : int
+            Amount of the ingredient after the refill.
+
+        """
+
+        # semantic check : refilling should not leave the coffee maachine
+        # with negative value
+        if amount + qty < 0 :
+            raise ValueError("Cannot add because final quantity of "+
+                "ingredient after refilling becomes negative")
+
+        # add to coffee machine
+        return amount + qty
+
+
+    def __canMakeDrink(self, drink_name, levels=None):
+        """Method to check if a certain drink can be made with the current
+        contents of the machine. Assumes populated coffee machine.
+
+        Parameters
+        ----------
+        drink_name : str
+            Name of drink to be made
+
+        levels : list
+            Levels to check against, indexed by ingredient ID. Defaults
+            to the levels of the machine.
+
+        Returns
+        -------
+        status : int
+            Returns if it is possible to make drink.
+            Casewise, returns:
+                1, if drink can be made
+                0, if insufficient ingredients
+                -1, if ingredient not found
+
+        """
+        if not isinstance(drink_name, str):
+            raise ValueError("Drink name is not a string in canMake.")
+
+        if drink_name not in self.beverages:
+            raise ValueError("Drink recipe is not known in canMake.")
+
+        if levels is None:
+            levels = self.__currentLevels()
+
+        # first check if all ingredients even exist
+        if self.missing_ingredients[drink_name]:
+            return -1
+        
+        # then check if quantities are sufficient, in one vector compare
+        if not all(map(operator.ge, levels,
+            self.recipe_vectors[drink_name])):
+            return 0
+
+        return 1
+
+
+    def __pourDrink(self, drink_name, levels):
+        """Method to subtract contents of drink, in one vector subtract.
+        Only used after it is known that a drink can be made. 
+        Assumes populated coffee machine.
+
+        Parameters
+        ----------
+        drink_name : str
+            Name of drink to be made
+
+        levels : list
+            Levels to subtract from, indexed by ingredient ID.
+
+        Returns
+        -------
+        new_levels : tuple
+            Levels after the drink is poured. The levels given are not
+            changed.
+
+        """
+
+        return tuple(map(operator.sub, levels,
+            self.recipe_vectors[drink_name]))
+
+
+    def __makeDrink(self, drink_name, drink_ID):
+        """Method to make a drink order.
+
+        Parameters
+        ----------
+        drink_name : str
+            String of drink name.
+
+        drink_ID : int
+            Drink ID for determining which process it is.
+
+        Returns
+        -------
+        outcome : tuple
+            Outcome of the drink, as returned by takeIngredients.
+
+        """
+
+        # check if drink has known recipe, and is a string
+        if not isinstance(drink_name, str):
+            raise ValueError("Drink name is not a string.")
+
+        if drink_name not in self.beverages:
+            raise ValueError("Drink recipe is not known.")
+
+        # locks are only held while the ingredients are taken out, and
+        # nothing is held while reporting and pouring, in every locking
+        # mode
+        outcome = self.__commitDrink(drink_name)
+
+        # a drink waiting for a refill is reported once it is made
+        if not self.__mustWait([outcome]):
+            self.__reportDrink(drink_name, drink_ID, *outcome)
+
+        return outcome
+
+    def __commitDrink(self, drink_name):
+        """Method to take the ingredients of a drink out of the levels of
+        the machine, holding locks only while doing so.
+
+        Parameters
+        ----------
+        drink_name : str
+            String of drink name.
+
+        Returns
+        -------
+        outcome : tuple
+            Outcome of the drink, as returned by takeIngredients.
+
+        """
+
+        if self.inventory is not None:
+            outcome = self.inventory.update(lambda levels:
+                self.__takeIngredients(drink_name, levels))
+
+            if self.__isPoured(outcome[0]):
+                self.menu_index.update(self.recipe_ids[drink_name])
+        else:
+            with self.__lockIngredients(self.recipe_locks[drink_name]):
+                new_levels, outcome = self.__takeIngredients(drink_name,
+                    self.levels)
+
+                if new_levels is not None:
+                    self.__storeLevels(drink_name, new_levels)
+
+        self.__recordPours(drink_name, [outcome])
+
+        return outcome
+
+    def __storeLevels(self, drink_name, new_levels):
+        """Method to store the levels after a drink, once the locks of its
+        ingredients are held.
+
+        Parameters
+        ----------
+        drink_name : str
+            String of drink name.
+
+        new_levels : tuple
+            Levels after the drink, indexed by ingredient ID.
+
+        Returns
+        -------
+
+        """
+
+        # other outlets may be changing ingredients this drink does not
+        # use, so only its own ingredients are written back
+        if self.locking == "ingredient":
+            for i in self.recipe_ids[drink_name]:
+                self.levels[i] = new_levels[i]
+        else:
+            self.levels[:] = new_levels
+
+        self.__publishLevels(self.recipe_ids[drink_name])
+        self.menu_index.update(self.recipe_ids[drink_name])
+
+    def __takeIngredients(self, drink_name, levels):
+        """Method to take the ingredients of a drink out of the levels.
+        Ingredients that are not sufficient are refilled by the missing
+        amount first, with the "auto" refill policy, and the drink is not
+        taken otherwise. Does not change the levels it is given.
+
+        Parameters
+        ----------
+        drink_name : str
+            String of drink name.
+
+        levels : list
+            Levels to take the ingredients out of, indexed by ingredient ID.
+
+        Returns
+        -------
+        new_levels : tuple
+            Levels after the drink, or None if the drink cannot be made.
+
+        outcome : tuple
+            Status of the drink, as returned by canMakeDrink, followed by
+            the ingredients that had to be refilled, the amounts they had
+            to be refilled by, and the ingredients the machine does not
+            have.
+
+        """
+
+        status = self.__canMakeDrink(drink_name, levels)
+
+        insuff_ing_list = []
+        insuff_ing_qty = []
+
+        # if machine doesn't have required ingredients
+        if status == -1:
+            return None, (status, insuff_ing_list, insuff_ing_qty,
+                list(self.missing_ingredients[drink_name]))
+
+        vector = self.recipe_vectors[drink_name]
+
+        # if drink can't be made due to insufficiency
+        if status == 0:
+            # find which ingredients are insufficient
+            for i in self.recipe_ids[drink_name]:
+                if levels[i] < vector[i]:
+                    insuff_ing_list.append(self.ingredients[i])
+                    insuff_ing_qty.append(vector[i] - levels[i])
+
+            # with other policies, the drink is left to the outlet
+            if self.refill_policy != "auto":
+                return None, (status, insuff_ing_list, insuff_ing_qty, [])
+
+            # refill these ingredients by what is missing
+            levels = tuple(map(max, levels, vector))
+
+        return self.__pourDrink(drink_name, levels), (status,
+            insuff_ing_list, insuff_ing_qty, [])
+
+    def __reportDrink(self, drink_name, drink_ID, status, insuff_ing_list,
+        insuff_ing_qty, nonex_ing_list):
+        """Method to report on a drink, once its ingredients are taken, and
+        wait for it to pour. Reports are emitted as events, so the outlet
+        never waits on them being written.
+
+        Parameters
+        ----------
+        drink_name : str
+            String of drink name.
+
+        drink_ID : int
+            Drink ID for determining which process it is.
+
+        status : int
+            Status of the drink, as returned by canMakeDrink.
+
+        insuff_ing_list : list
+            Ingredients that had to be refilled.
+
+        insuff_ing_qty : list
+            Amounts the ingredients had to be refilled by.
+
+        nonex_ing_list : list
+            Ingredients the machine does not have.
+
+        Returns
+        -------
+
+        """
+
+        self.__reportTaken(drink_name, drink_ID, status, insuff_ing_list,
+            insuff_ing_qty, nonex_ing_list)
+
+        # if drink is not made
+        if not self.__isPoured(status):
+            return
+
+        self.clock.sleep(self.__pourTime(drink_name))
+        self.events.emit("poured", drink_ID, drink_name)
+
+    def __pourTime(self, drink_name):
+        """Method to get the seconds an outlet spends pouring a drink.
+
+        Parameters
+        ----------
+        drink_name : str
+            String of drink name.
+
+        Returns
+        -------
+        seconds : float
+            Pour time of the drink.
+
+        """
+
+        return self.pour_times.get(drink_name, self.pour_time)
+
+    def __isPoured(self, status):
+        """Method to tell if a drink is poured, given its status.
+
+        Parameters
+        ----------
+        status : int
+            Status of the drink, as returned by canMakeDrink.
+
+        Returns
+        -------
+        poured : bool
+            Whether the drink is poured.
+
+        """
+
+        return status == 1 or (status == 0 and self.refill_policy == "auto")
+
+    def __mustWait(self, outcomes):
+        """Method to tell if the drinks of a ticket have to wait for a
+        refill, which with the "wait" refill policy is whenever they were
+        found short, since a batch waits whole.
+
+        Parameters
+        ----------
+        outcomes : list
+            Outcome of every drink of the ticket, as returned by
+            takeIngredients.
+
+        Returns
+        -------
+        wait : bool
+            Whether the drinks have to wait.
+
+        """
+
+        return self.refill_policy == "wait" and outcomes[0][0] == 0
+
+    def __recordPours(self, drink_name, outcomes):
+        """Method to record the ingredients the poured drinks of a ticket
+        used, when tracking stock, and log them to the write-ahead log, if
+        any. Must be called with no lock held, since logging waits for the
+        change to be on disk.
+
+        Parameters
+        ----------
+        drink_name : str
+            String of drink name.
+
+        outcomes : list
+            Outcome of every drink, as returned by takeIngredients.
+
+        Returns
+        -------
+
+        """
+
+        if self.stock is None and self.wal is None:
+            return
+
+        poured = [outcome for outcome in outcomes
+            if self.__isPoured(outcome[0])]
+
+        if not poured:
+            return
+
+        vector = self.recipe_vectors[drink_name]
+        used = tuple(map(operator.mul, vector, [len(poured)] * len(vector)))
+
+        if self.wal is not None:
+            self.__logPours(drink_name, poured, used)
+
+        if self.stock is not None:
+            self.__recordUse(drink_name, used)
+
+    def __logPours(self, drink_name, outcomes, used):
+        """Method to log the change poured drinks made to the levels, and
+        wait for it to be on disk.
+
+        Parameters
+        ----------
+        drink_name : str
+            String of drink name.
+
+        outcomes : list
+            Outcome of every poured drink, as returned by takeIngredients.
+
+        used : tuple
+            Quantity of each ingredient the drinks used, indexed by
+            ingredient ID.
+
+        Returns
+        -------
+
+        """
+
+        change = {}
+        for i in self.recipe_ids[drink_name]:
+            if used[i] > 0:
+                change[self.ingredients[i]] = -used[i]
+
+        # short ingredients were refilled by what was missing first
+        for outcome in outcomes:
+            for ingredient, qty in zip(outcome[1], outcome[2]):
+                change[ingredient] += qty
+
+        self.wal.log("pour", drink_name, change)
+
+    def __recordUse(self, drink_name, used):
+        """Method to record ingredients taken out of the levels, and
+        report the ingredients now forecast to run out within the horizon.
+        Must be called with no lock held, since the callback may refill.
+
+        Parameters
+        ----------
+        drink_name : str
+            String of drink name the ingredients were taken for, or None
+            for a group.
+
+        used : tuple
+            Quantity of each ingredient taken, indexed by ingredient ID.
+
+        Returns
+        -------
+
+        """
+
+        low = self.stock.record(self.clock.now(), used,
+            tuple(self.__currentLevels()))
+
+        for ingredient, level, seconds_left in low:
+            self.events.emit("low_stock", None, drink_name,
+                ingredient=ingredient, level=level,
+                seconds_left=seconds_left)
+
+            if self.on_low_stock is not None:
+                self.on_low_stock(ingredient, level, seconds_left)
+
+            # the refill is on its way before a customer finds it short
+            if ingredient in self.restock:
+                self.refills.request({ingredient: self.restock[ingredient]})
+
+    def stockForecast(self):
+        """Returns the time each ingredient is forecast to run out in, at
+        the rate the last pours used it at.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        seconds : dict
+            Seconds left of each ingredient, infinite for ingredients that
+            are not being used.
+
+        """
+
+        if self.stock is None:
+            raise ValueError("Stock is not tracked, set a stock window.")
+
+        return self.stock.forecast(self.clock.now(),
+            tuple(self.__currentLevels()))
+
+    def __reportTaken(self, drink_name, drink_ID, status, insuff_ing_list,
+        insuff_ing_qty, nonex_ing_list):
+        """Method to report on a drink once its ingredients are taken, up
+        to the point it starts pouring. Takes the same parameters as
+        reportDrink.
+
+        Returns
+        -------
+
+        """
+
+        self.events.emit("prepared", drink_ID, drink_name, status=status)
+
+        # if machine doesn't have required ingredients
+        if status == -1:
+            self.events.emit("unavailable", drink_ID, drink_name,
+                ingredients=nonex_ing_list)
+
+        # if drink had to be refilled due to insufficiency, or is not made
+        # at all
+        elif status == 0:
+            self.events.emit("insufficient", drink_ID, drink_name,
+                ingredients=insuff_ing_list, amounts=insuff_ing_qty)
+
+            if self.refill_policy == "auto":
+                self.events.emit("refilled", drink_ID, drink_name,
+                    ingredients=insuff_ing_list, amounts=insuff_ing_qty)
+
+    def __makeDrinks(self, drink_name, drink_IDs):
+        """Method to make the drinks of a ticket, which are all the same
+        drink. A batch of drinks takes its ingredients out in one go, and
+        pours one drink after another without going back to the line.
+
+        Parameters
+        ----------
+        drink_name : str
+            String of drink name.
+
+        drink_IDs : list
+            Drink IDs of the drinks.
+
+        Returns
+        -------
+        outcomes : list
+            Outcome of every drink, as returned by takeIngredients.
+
+        """
+
+        if len(drink_IDs) == 1:
+            return [self.__makeDrink(drink_name, drink_IDs[0])]
+
+        # as with a single drink, nothing is held while the batch pours
+        outcomes = self.__commitBatch(drink_name, len(drink_IDs))
+
+        if not self.__mustWait(outcomes):
+            self.__reportBatch(drink_name, drink_IDs, outcomes)
+
+        return outcomes
+
+    def __pourReserved(self, drink_name, drink_IDs):
+        """Method to pour drinks whose ingredients were reserved already.
+        No lock is held, since the ingredients left the levels when they
+        were reserved.
+
+        Parameters
+        ----------
+        drink_name : str
+            String of drink name.
+
+        drink_IDs : list
+            Drink IDs of the drinks.
+
+        Returns
+        -------
+        outcomes : list
+            Outcome of every drink, as returned by takeIngredients.
+
+        """
+
+        outcomes = [(1, [], [], []) for drink_ID in drink_IDs]
+        self.__reportBatch(drink_name, drink_IDs, outcomes)
+
+        return outcomes
+
+    def __commitBatch(self, drink_name, count):
+        """Method to take the ingredients of a batch of the same drink out
+        of the levels of the machine, holding locks only while doing so.
+
+        Parameters
+        ----------
+        drink_name : str
+            String of drink name.
+
+        count : int
+            Number of drinks in the batch.
+
+        Returns
+        -------
+        outcomes : list
+            Outcome of every drink, as returned by takeIngredients.
+
+        """
+
+        if self.inventory is not None:
+            outcomes = self.inventory.update(lambda levels:
+                self.__takeBatch(drink_name, levels, count))
+
+            if self.__isPoured(outcomes[0][0]):
+                self.menu_index.update(self.recipe_ids[drink_name])
+        else:
+            with self.__lockIngredients(self.recipe_locks[drink_name]):
+                new_levels, outcomes = self.__takeBatch(drink_name,
+                    self.levels, count)
+
+                if new_levels is not None:
+                    self.__storeLevels(drink_name, new_levels)
+
+        self.__recordPours(drink_name, outcomes)
+
+        return outcomes
+
+    def __takeBatch(self, drink_name, levels, count):
+        """Method to take the ingredients of a batch of the same drink out
+        of the levels. If the levels hold the whole batch, it is taken out
+        with a single scaled vector, otherwise drink by drink as they
+        would be made one after another. Does not change the levels it is
+        given.
+
+        Parameters
+        ----------
+        drink_name : str
+            String of drink name.
+
+        levels : list
+            Levels to take the ingredients out of, indexed by ingredient ID.
+
+        count : int
+            Number of drinks in the batch.
+
+        Returns
+        -------
+        new_levels : tuple
+            Levels after the batch, or None if no drink can be made.
+
+        outcomes : list
+            Outcome of every drink, as returned by takeIngredients.
+
+        """
+
+        vector = self.recipe_vectors.get(drink_name)
+
+        if vector is not None:
+            total = tuple(map(operator.mul, vector, [count] * len(vector)))
+
+            if all(map(operator.ge, levels, total)):
+                return tuple(map(operator.sub, levels, total)), [
+                    (1, [], [], []) for i in range(count)]
+
+            # a batch waiting for a refill waits whole, for what the whole
+            # batch is short by
+            if self.refill_policy == "wait":
+                short = [i for i in self.recipe_ids[drink_name]
+                    if levels[i] < total[i]]
+                outcome = (0, [self.ingredients[i] for i in short],
+                    [total[i] - levels[i] for i in short], [])
+
+                return None, [outcome] * count
+
+        new_levels = None
+        outcomes = []
+
+        for i in range(count):
+            taken, outcome = self.__takeIngredients(drink_name, levels)
+            outcomes.append(outcome)
+
+            if taken is not None:
+                levels = new_levels = taken
+
+        return new_levels, outcomes
+
+    def __reportBatch(self, drink_name, drink_IDs, outcomes):
+        """Method to report on a batch of the same drink, once its
+        ingredients are taken, and wait for it to pour.
+
+        Parameters
+        ----------
+        drink_name : str
+            String of drink name.
+
+        drink_IDs : list
+            Drink IDs of the drinks.
+
+        outcomes : list
+            Outcome of every drink, as returned by takeIngredients.
+
+        Returns
+        -------
+
+        """
+
+        poured = []
+        for j in range(len(drink_IDs)):
+            self.__reportTaken(drink_name, drink_IDs[j], *outcomes[j])
+
+            if self.__isPoured(outcomes[j][0]):
+                poured.append(drink_IDs[j])
+
+        if not poured:
+            return
+
+        self.clock.sleep(self.__pourTime(drink_name) * len(poured))
+
+        for drink_ID in poured:
+            self.events.emit("poured", drink_ID, drink_name)
+
+    def __outletWorker(self, scheduler):
+        """Method run by the thread of an outlet. Takes orders from the
+        scheduler and makes them, until the scheduler is closed.
+
+        Parameters
+        ----------
+        scheduler : OutletScheduler
+            Line the outlet was started on. The worker keeps to it, even
+            if the machine is started again on a new line meanwhile.
+
+        Returns
+        -------
+
+        """
+
+        while True:
+            ticket = scheduler.get()
+
+            if ticket is None:
+                return
+
+            waiting = False
+
+            try:
+                # the refill the ticket waited for failed
+                if ticket.error is not None:
+                    continue
+
+                started_at = self.clock.now()
+                if ticket.reserved:
+                    outcomes = self.__pourReserved(ticket.drink_name,
+                        ticket.drink_IDs)
+                else:
+                    outcomes = self.__makeDrinks(ticket.drink_name,
+                        ticket.drink_IDs)
+                finished_at = self.clock.now()
+                self.__outlet_busy.inc(amount=finished_at - started_at)
+
+                # the outlet moves on, and the ticket comes back to the
+                # line once its refill is done
+                if self.__mustWait(outcomes):
+                    waiting = True
+                    self.__waitForRefill(ticket, outcomes[0],
+                        scheduler.putBack, ticket)
+                else:
+                    ticket.results = [self.__buildResult(ticket.drink_name,
+                        ticket.drink_IDs[j], outcome, ticket.queued_at,
+                        started_at, finished_at) for j, outcome in
+                        enumerate(self.__waitedOutcomes(ticket, outcomes))]
+            except Exception as error:
+                waiting = False
+                ticket.error = error
+            finally:
+                scheduler.release()
+
+                if not waiting:
+                    ticket.done.set()
+
+    def __waitForRefill(self, ticket, outcome, action, *args):
+        """Method to have the drinks of a ticket wait for a refill of what
+        they are short by. The refill worker carries out the refill, and
+        the action is run once it is done, such as putting the ticket back
+        at the front of the line it came from.
+
+        Parameters
+        ----------
+        ticket : OrderTicket
+            Ticket of the drinks.
+
+        outcome : tuple
+            Outcome the drinks were found short with, as returned by
+            takeIngredients.
+
+        action : callable
+            Called with args once the refill is done.
+
+        args : tuple
+            Arguments of the action.
+
+        Returns
+        -------
+
+        """
+
+        status, insuff_ing_list, insuff_ing_qty, nonex_ing_list = outcome
+
+        for drink_ID in ticket.drink_IDs:
+            self.events.emit("insufficient", drink_ID, ticket.drink_name,
+                ingredients=insuff_ing_list, amounts=insuff_ing_qty)
+
+        for ingredient, qty in zip(insuff_ing_list, insuff_ing_qty):
+            ticket.refilled[ingredient] = ticket.refilled.get(ingredient,
+                0) + qty
+
+        self.refills.request(dict(zip(insuff_ing_list, insuff_ing_qty)),
+            self.__refillDone, ticket, outcome, action, args,
+            on_error=functools.partial(self.__refillFailed, ticket))
+
+    def __refillFailed(self, ticket, error):
+        """Method run by the refill worker if the refill a ticket waited
+        for fails. The drinks of the ticket fail with the error, once they
+        are handed back.
+
+        Parameters
+        ----------
+        ticket : OrderTicket
+            Ticket of the drinks.
+
+        error : Exception
+            Error the refill failed with.
+
+        Returns
+        -------
+
+        """
+
+        ticket.error = error
+
+    def __refillDone(self, ticket, outcome, action, args):
+        """Method run by the refill worker once the refill a ticket waited
+        for is done.
+
+        Parameters
+        ----------
+        ticket : OrderTicket
+            Ticket of the drinks.
+
+        outcome : tuple
+            Outcome the drinks were found short with.
+
+        action : callable
+            Called with args to hand the drinks back.
+
+        args : tuple
+            Arguments of the action.
+
+        Returns
+        -------
+
+        """
+
+        if ticket.error is None:
+            for drink_ID in ticket.drink_IDs:
+                self.events.emit("refilled", drink_ID, ticket.drink_name,
+                    ingredients=outcome[1], amounts=outcome[2])
+
+        action(*args)
+
+    def __waitedOutcomes(self, ticket, outcomes):
+        """Method to mark the drinks of a ticket that waited for refills as
+        short, by what was refilled for them, as the "auto" refill policy
+        would.
+
+        Parameters
+        ----------
+        ticket : OrderTicket
+            Ticket of the drinks.
+
+        outcomes : list
+            Outcome of every drink, as returned by takeIngredients.
+
+        Returns
+        -------
+        outcomes : list
+            Outcome of every drink.
+
+        """
+
+        if not ticket.refilled:
+            return outcomes
+
+        waited = (0, list(ticket.refilled), list(ticket.refilled.values()),
+            [])
+
+        return [waited if outcome[0] == 1 else outcome
+            for outcome in outcomes]
+
+    def __buildResult(self, drink_name, drink_ID, outcome, queued_at,
+        started_at, finished_at=None):
+        """Method to build the result of a drink once it is done.
+
+        Parameters
+        ----------
+        drink_name : str
+            String of drink name.
+
+        drink_ID : int
+            Drink ID for determining which order it is.
+
+        outcome : tuple
+            Outcome of the drink, as returned by takeIngredients.
+
+        queued_at : float
+            Time the drink started waiting for an outlet.
+
+        started_at : float
+            Time the drink got an outlet.
+
+        finished_at : float
+            Time the drink was done. Defaults to now.
+
+        Returns
+        -------
+        result : OrderResult
+            Result of the drink.
+
+        """
+
+        if finished_at is None:
+            finished_at = self.clock.now()
+
+        status, insuff_ing_list, insuff_ing_qty, nonex_ing_list = outcome
+        shortfall = dict(zip(insuff_ing_list, insuff_ing_qty))
+
+        # short ingredients are refilled by what is missing, unless the
+        # drink was rejected
+        if status == 0 and self.refill_policy != "reject":
+            refilled = dict(shortfall)
+        else:
+            refilled = {}
+
+        wait = started_at - queued_at
+        service = finished_at - started_at
+
+        self.__drinks_done.inc((drink_name, status))
+        self.__drink_wait.observe(wait, (drink_name,))
+        self.__drink_service.observe(service, (drink_name,))
+
+        return OrderResult(drink_ID, drink_name, status, shortfall, refilled,
+            nonex_ing_list, wait, service)
+
+    def start(self):
+        """Starts one long-lived worker thread per outlet. Orders made
+        while the machine is started all run on these threads.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+
+        """
+
+        if self.workers:
+            raise ValueError("Coffee machine is already started.")
+
+        if self.clock.virtual:
+            raise ValueError("Outlet threads cannot run on a virtual clock.")
+
+        # a closed line cannot be reopened, start a fresh one
+        if self.scheduler.closed:
+            self.scheduler = OutletScheduler(self.num_outlets,
+                self.queue_size, self.scheduling, self.aging, self.clock)
+
+        for i in range(self.num_outlets):
+            worker = threading.Thread(target=self.__outletWorker,
+                args=(self.scheduler,), name="outlet-" + str(i), daemon=True)
+            self.workers.append(worker)
+            worker.start()
+
+    def shutdown(self, wait=True):
+        """Stops the outlet worker threads. Orders already waiting for an
+        outlet are still made.
+
+        Parameters
+        ----------
+        wait : bool
+            Whether to block until every worker thread has finished.
+
+        Returns
+        -------
+
+        """
+
+        # drinks waiting for a refill come back to the line before it closes
+        self.refills.flush()
+        self.scheduler.close()
+
+        if wait:
+            for worker in self.workers:
+                worker.join()
+
+        self.workers = []
+
+    def __iterOrders(self, orders):
+        """Method to go through orders one at a time, checking each drink
+        against the recipes of the machine, see iterOrders.
+
+        Parameters
+        ----------
+        orders : iterable
+            User requested drinks, or a single drink name.
+
+        Returns
+        -------
+        drinks : iterator
+            Checked orders, as Order, in order.
+
+        """
+
+        return iterOrders(orders, self.beverages)
+
+    def __checkOrders(self, orders):
+        """Method to check all orders at once, for methods that need the
+        whole list.
+
+        Parameters
+        ----------
+        orders : iterable
+            User requested drinks, or a single drink name.
+
+        Returns
+        -------
+        orders : list
+            List of checked orders, as Order.
+
+        """
+
+        return list(self.__iterOrders(orders))
+
+    def planOrder(self, orders=[]):
+        """Class method exposed to the user. Works out what the current
+        levels can make out of an order list, in one pass over running
+        sums of the recipe vectors, without taking any lock or handing
+        anything to an outlet.
+
+        Parameters
+        ----------
+        orders : list
+            List of user requested drinks
+
+        Returns
+        -------
+        plan : OrderPlan
+            Which orders can be made, which are short and which are
+            unavailable, along with the total shortfall per ingredient.
+
+        """
+
+        orders = [order.drink_name for order in self.__checkOrders(orders)]
+        levels = tuple(self.__currentLevels())
+
+        unavailable = []
+        available = []
+        counts = {}
+
+        for i in range(len(orders)):
+            drink = orders[i]
+
+            if self.missing_ingredients[drink]:
+                unavailable.append(i)
+                continue
+
+            available.append(i)
+            counts[drink] = counts.get(drink, 0) + 1
+
+        # total need of the whole list, one scaled vector per drink
+        demand = (0,) * len(levels)
+        for drink in counts:
+            demand = tuple(map(operator.add, demand, map(operator.mul,
+                self.recipe_vectors[drink], [counts[drink]] * len(levels))))
+
+        shortfall = {}
+        for i in range(len(levels)):
+            if demand[i] > levels[i]:
+                shortfall[self.ingredients[i]] = demand[i] - levels[i]
+
+        # the list stops being makeable at its first unavailable order
+        if unavailable:
+            prefix = unavailable[0]
+        else:
+            prefix = len(orders)
+
+        # enough of everything, every available order can be made
+        if not shortfall:
+            remaining = tuple(map(operator.sub, levels, demand))
+            return OrderPlan(orders, prefix, available, [], unavailable,
+                shortfall, dict(zip(self.ingredients, remaining)))
+
+        # otherwise walk the running sum of the orders that fit, and skip
+        # the ones that would take it over the levels
+        makeable = []
+        short = []
+        used = (0,) * len(levels)
+
+        for i in available:
+            total = tuple(map(operator.add, used,
+                self.recipe_vectors[orders[i]]))
+
+            if all(map(operator.le, total, levels)):
+                makeable.append(i)
+                used = total
+
+            else:
+                short.append(i)
+
+        if short:
+            prefix = min(prefix, short[0])
+
+        remaining = tuple(map(operator.sub, levels, used))
+        return OrderPlan(orders, prefix, makeable, short, unavailable,
+            shortfall, dict(zip(self.ingredients, remaining)))
+
+    def makeOrder(self, orders=[], plan=False, batch=None):
+        """Class method exposed to the user. Makes 'n' drinks in parallel, 
+        based on the order list supplied by the user.
+
+        The orders run on the outlet workers of the machine. If the machine
+        was not started, it is started for this order and shut down after.
+
+        Parameters
+        ----------
+        orders : iterable
+            User requested drinks, such as a list, a generator, or an open
+            file with one drink per line.
+
+        plan : bool
+            Whether to plan the order list first using planOrder. Orders
+            the plan finds unavailable are reported straight away instead
+            of being handed to an outlet, and the plan is kept in
+            self.plan. Planning needs the whole list, so the orders are
+            read in first.
+
+        batch : int
+            Batch drinks, if given. Identical orders are grouped into
+            batches of up to this many drinks, and of no more than their
+            share of the outlets, each of which is handed to a single
+            outlet, takes its ingredients out in one go, and pours its
+            drinks one after another. Batches that are quickest to
+            pour are handed out first, so drinks may be made out of order,
+            but results are still in order. Batching needs the whole list,
+            so the orders are read in first.
+
+        Returns
+        -------
+        results : list
+            Result of every drink, as an OrderResult, in order.
+
+        """
+
+        results = list(self.streamOrder(orders, plan, batch))
+
+        if len(results) == 0:
+            print("No orders were given, please give orders.")
+
+        return results
+
+    def streamOrder(self, orders=[], plan=False, batch=None):
+        """Generator exposed to the user. Makes drinks like makeOrder, and
+        yields the result of each drink in order, as soon as it and every
+        drink before it are done.
+
+        Orders are taken one at a time, and only as fast as the outlets
+        pick them up, so any iterable works, including an open file or an
+        endless generator. Each drink is checked as it comes up, and only
+        the drinks not yet done are kept. Orders are read on a thread of
+        their own, so a drink done is yielded even while the next order is
+        slow to come. An order that fails the checks raises its error once
+        every drink before it is yielded.
+
+        On a virtual clock, the order is simulated on the calling thread
+        instead of being made on the outlet worker threads.
+
+        Parameters
+        ----------
+        orders : iterable
+            User requested drinks, such as a list, a generator, or an open
+            file with one drink per line.
+
+        plan : bool
+            Whether to plan the order list first, as in makeOrder.
+
+        batch : int
+            Largest batch of identical drinks, as in makeOrder.
+
+        Returns
+        -------
+        results : generator
+            Yields the result of every drink, as an OrderResult, in order.
+
+        """
+
+        if batch is not None and (not isinstance(batch, int) or batch <= 0):
+            raise ValueError("Batch size is not an integer more than 0.")
+
+        drinks = self.__iterOrders(orders)
+
+        # planning and batching need the whole list
+        if plan or batch is not None:
+            drinks = self.__checkOrders(drinks)
+
+        # unavailable orders are known without asking an outlet
+        skipped = set()
+        if plan:
+            self.plan = self.planOrder(drinks)
+            skipped = set(self.plan.unavailable)
+
+        # jobs of an order and the positions of their drinks in it
+        if batch is not None:
+            jobs = self.__batchOrders(drinks, skipped, batch)
+        else:
+            jobs = ((order, [i]) for i, order in enumerate(drinks))
+
+        if self.clock.virtual:
+            return self.__simulateOrder(jobs, skipped)
+
+        return self.__runOrder(jobs, skipped)
+
+    def reserve(self, orders=[]):
+        """Class method exposed to the user. Reserves the ingredients of a
+        group of drinks, such as the drinks of one customer, all at once.
+        The total the group needs is checked against the levels and taken
+        out in one step, under the locks of the ingredients of the group,
+        so either the whole group is reserved or none of it is.
+
+        Reserved ingredients leave the levels straight away, so no other
+        order can take them. Make the drinks with commitReservation, or
+        hand the ingredients back with releaseReservation. No lock is held
+        in between.
 
-            while (len(self.running_threads) >= self.num_outlets):
-                time.sleep(3)
+        Parameters
+        ----------
+        orders : list
+            List of user requested drinks of the group.
+
+        Returns
+        -------
+        reservation : Reservation
+            Reservation of the group, "held" if the ingredients were
+            reserved, and "rejected" otherwise.
+
+        """
+
+        orders = [order.drink_name for order in self.__checkOrders(orders)]
+
+        if not orders:
+            raise ValueError("Cannot reserve an empty group of drinks.")
+
+        missing = []
+        for drink in orders:
+            for ingredient in self.missing_ingredients[drink]:
+                if ingredient not in missing:
+                    missing.append(ingredient)
+
+        if missing:
+            return Reservation(orders, "rejected", None, {}, {}, missing)
+
+        # total need of the group, and the ingredients it touches
+        vector = (0,) * len(self.ingredients)
+        for drink in orders:
+            vector = tuple(map(operator.add, vector,
+                self.recipe_vectors[drink]))
+
+        ids = [i for i in range(len(vector)) if vector[i] > 0]
+
+        def take(levels):
+            if all(map(operator.ge, levels, vector)):
+                return tuple(map(operator.sub, levels, vector)), {}
+
+            return None, {self.ingredients[i]: vector[i] - levels[i]
+                for i in ids if levels[i] < vector[i]}
+
+        shortfall = self.__updateLevels(ids, take)
+
+        if shortfall:
+            status = "rejected"
+        else:
+            status = "held"
+
+            if self.wal is not None:
+                self.wal.log("reserve", None,
+                    {self.ingredients[i]: -vector[i] for i in ids})
+
+            if self.stock is not None:
+                self.__recordUse(None, vector)
+
+        return Reservation(orders, status, vector,
+            {self.ingredients[i]: vector[i] for i in ids}, shortfall, [])
+
+    def commitReservation(self, reservation):
+        """Class method exposed to the user. Makes the drinks of a held
+        reservation, in parallel on the outlets. The ingredients were
+        taken out when reserving, so the outlets only pour.
+
+        Parameters
+        ----------
+        reservation : Reservation
+            Reservation made by reserve, which must be held.
+
+        Returns
+        -------
+        results : list
+            Result of every drink of the group, as an OrderResult, in
+            order.
+
+        """
+
+        self.__closeReservation(reservation, "committed")
+
+        jobs = ((Order(reservation.orders[i]), [i])
+            for i in range(len(reservation.orders)))
+
+        if self.clock.virtual:
+            return list(self.__simulateOrder(jobs, set(), True))
+
+        return list(self.__runOrder(jobs, set(), True))
+
+    def releaseReservation(self, reservation):
+        """Class method exposed to the user. Hands the ingredients of a
+        held reservation back to the levels, without making any drink.
+
+        Parameters
+        ----------
+        reservation : Reservation
+            Reservation made by reserve, which must be held.
+
+        Returns
+        -------
+
+        """
+
+        self.__closeReservation(reservation, "released")
+
+        vector = reservation.vector
+        ids = [i for i in range(len(vector)) if vector[i] > 0]
+
+        self.__updateLevels(ids, lambda levels:
+            (tuple(map(operator.add, levels, vector)), None))
+
+        if self.wal is not None:
+            self.wal.log("release", None, dict(reservation.amounts))
+
+    def __closeReservation(self, reservation, status):
+        """Method to move a held reservation on to its final status, once
+        only, even if several threads try at the same time.
+
+        Parameters
+        ----------
+        reservation : Reservation
+            Reservation to close.
+
+        status : str
+            "committed" or "released".
+
+        Returns
+        -------
+
+        """
+
+        if not isinstance(reservation, Reservation):
+            raise ValueError("Reservation is not a Reservation.")
+
+        with self.reservation_lock:
+            if reservation.status != "held":
+                raise ValueError("Reservation is not held.")
+
+            reservation.status = status
+
+    def __updateLevels(self, ids, change):
+        """Method to apply a change to the levels in one step, under the
+        locks of the ingredients it touches, or as a versioned commit in
+        optimistic mode.
+
+        Parameters
+        ----------
+        ids : list
+            Ingredient IDs the change can touch.
+
+        change : callable
+            Called with the current levels, and returns a pair of the new
+            levels (a tuple, or None to leave them as they are) and a
+            result, as for VersionedInventory.update.
+
+        Returns
+        -------
+        result : object
+            Result returned by change.
+
+        """
+
+        if self.inventory is not None:
+            result = self.inventory.update(change)
+        else:
+            # locks in sorted ingredient order, as for the recipes
+            locks = [self.ingredient_locks[ingredient]
+                for ingredient in sorted(self.ingredients[i] for i in ids)]
+
+            with self.__lockIngredients(locks):
+                new_levels, result = change(self.levels)
+
+                if new_levels is not None:
+                    for i in ids:
+                        self.levels[i] = new_levels[i]
+
+                    self.__publishLevels(ids)
+
+        self.menu_index.update(ids)
+
+        return result
+
+    def __batchOrders(self, orders, skipped, batch):
+        """Method to group identical orders into batches, handed out
+        quickest to pour first.
+
+        Parameters
+        ----------
+        orders : list
+            Checked orders, as Order.
+
+        skipped : set
+            Positions of the drinks known to be unavailable, which are
+            left out of the batches.
+
+        batch : int
+            Largest number of drinks in a batch.
+
+        Returns
+        -------
+        jobs : list
+            Pairs of an order and the positions of the drinks of its batch.
+            Skipped drinks come first, on their own.
+
+        """
+
+        jobs = []
+
+        # positions of the drinks of each distinct order, in order
+        groups = {}
+
+        for i in range(len(orders)):
+            if i in skipped:
+                jobs.append((orders[i], [i]))
+                continue
+
+            groups.setdefault(orders[i], []).append(i)
+
+        # a batch holds no more than its share of the outlets, so a drink
+        # ordered many times is still spread across every outlet instead
+        # of pouring one after another on a single one
+        batches = []
+        for order, positions in groups.items():
+            size = min(batch, -(-len(positions) // self.num_outlets))
+
+            for start in range(0, len(positions), size):
+                batches.append((order, positions[start:start + size]))
+
+        # shortest job first, ties in the order the drinks were first
+        # ordered
+        batches.sort(key=lambda job:
+            self.__pourTime(job[0].drink_name) * len(job[1]))
+
+        return jobs + batches
+
+    def __runOrder(self, jobs, skipped, reserved=False):
+        """Generator to make the drinks of an order on the outlet worker
+        threads, in real time.
+
+        Parameters
+        ----------
+        jobs : iterable
+            Pairs of a checked order, as Order, and the positions of its
+            drinks in the order list.
+
+        skipped : set
+            Positions of the drinks known to be unavailable, which are
+            reported without an outlet.
+
+        reserved : bool
+            Whether the ingredients of the drinks were reserved already.
+
+        Returns
+        -------
+        results : generator
+            Yields the result of every drink, as an OrderResult, in order.
+
+        """
+
+        # run on the started workers, or on a set shared by the orders
+        # running meanwhile
+        scheduler, pooled = self.__joinPool()
+
+        # ticket and position in it of the drinks handed on but not yet
+        # yielded, by drink ID, filled in as the orders are read
+        pending = {}
+        errors = []
+        arrived = threading.Condition()
+        ended = False
+
+        # held while a ticket is handed on, so none is once stopped
+        feeding = threading.Lock()
+        stopped = False
+
+        def produce():
+            nonlocal ended
+
+            try:
+                # iterate over orders job wise, each one is picked up by the
+                # next free outlet, and waits in line while none is
+                for order, drink_IDs in jobs:
+                    ticket = OrderTicket(order.drink_name, drink_IDs,
+                        self.clock.now(), reserved)
+
+                    with feeding:
+                        if stopped:
+                            return
+
+                        if drink_IDs[0] in skipped:
+                            ticket.results = [self.__skipDrink(
+                                order.drink_name, drink_IDs[0],
+                                ticket.queued_at)]
+                            ticket.done.set()
+
+                        else:
+                            scheduler.put(ticket, order.priority,
+                                order.deadline)
+
+                    with arrived:
+                        for j in range(len(drink_IDs)):
+                            pending[drink_IDs[j]] = (ticket, j)
+                        arrived.notify_all()
+            except Exception as error:
+                with arrived:
+                    errors.append(error)
+            finally:
+                with arrived:
+                    ended = True
+                    arrived.notify_all()
+
+        # the orders are read on a thread of their own, so a drink is
+        # handed back as soon as it is done, however slowly they come
+        producer = threading.Thread(target=produce, name="order-reader",
+            daemon=True)
+        producer.start()
+
+        next_ID = 0
+
+        try:
+            while True:
+                with arrived:
+                    while next_ID not in pending and not ended:
+                        arrived.wait()
+
+                    if next_ID not in pending:
+                        if errors:
+                            raise errors[0]
+
+                        break
+
+                    ticket, j = pending.pop(next_ID)
+
+                ticket.done.wait()
+                yield self.__finishTicket(ticket, j)
+                next_ID += 1
+        finally:
+            # orders not yet read are never handed on, while those handed
+            # on are still made
+            with feeding:
+                stopped = True
+
+            if pooled:
+                self.__leavePool()
+
+            # the whole order is reported by the time it is done
+            self.events.flush()
+
+    def __joinPool(self):
+        """Method to get the line to hand the drinks of an order to. If the
+        machine is not started, workers are started for the order, and
+        shared with any other order running meanwhile.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        scheduler : OutletScheduler
+            Line of the workers making the order.
+
+        pooled : bool
+            Whether the workers were started for orders, and the order
+            should leave them once done.
+
+        """
+
+        with self.pool_lock:
+            pooled = self.pool_users > 0 or not self.workers
+
+            if pooled:
+                if not self.workers:
+                    self.start()
+
+                self.pool_users += 1
+
+            return self.scheduler, pooled
+
+    def __leavePool(self):
+        """Method to let go of the workers an order ran on. The last order
+        on a set of workers started for orders shuts them down, once every
+        drink handed to them is done.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+
+        """
+
+        with self.pool_lock:
+            self.pool_users -= 1
+            if self.pool_users == 0:
+                self.shutdown(wait=True)
+
+    def __simulateOrder(self, jobs, skipped, reserved=False):
+        """Generator to go through the drinks of an order as a
+        discrete-event simulation on a virtual clock. Every drink arrives
+        when the order starts, and waits in a line of its own, made just
+        as the line of the outlet workers is, so drinks left in it when
+        the caller stops early are never made by another order. Whenever
+        the first outlet frees up, the clock is moved to that time, and
+        the outlet takes the next job the line hands out. Pouring books
+        the outlet until the job is done, so no time really passes.
+
+        Parameters
+        ----------
+        jobs : iterable
+            Pairs of a checked order, as Order, and the positions of its
+            drinks in the order list.
+
+        skipped : set
+            Positions of the drinks known to be unavailable, which are
+            reported without an outlet.
+
+        reserved : bool
+            Whether the ingredients of the drinks were reserved already.
+
+        Returns
+        -------
+        results : generator
+            Yields the result of every drink, as an OrderResult, in order.
+
+        """
+
+        arrived_at = self.clock.now()
+
+        # the simulated outlets of the order are its own, and so is their
+        # line
+        scheduler = OutletScheduler(self.num_outlets, self.queue_size,
+            self.scheduling, self.aging, self.clock)
+
+        # time each outlet is free from, the first to free up on top
+        outlets = [arrived_at] * self.num_outlets
+
+        # results of the drinks done but not yet yielded, by drink ID
+        done = {}
+        next_ID = 0
+
+        jobs = iter(jobs)
+        more = True
+
+        try:
+            while True:
+                # the line is topped up as soon as there is room, as the
+                # producer would
+                while more and not scheduler.full():
+                    job = next(jobs, None)
+                    if job is None:
+                        more = False
+                        break
+
+                    order, drink_IDs = job
+
+                    if drink_IDs[0] in skipped:
+                        done[drink_IDs[0]] = self.__skipDrink(
+                            order.drink_name, drink_IDs[0], arrived_at)
+                        continue
+
+                    scheduler.put(OrderTicket(order.drink_name,
+                        drink_IDs, arrived_at, reserved), order.priority,
+                        order.deadline)
+
+                if scheduler.queue_depth == 0:
+                    if self.refills.pending == 0:
+                        break
+
+                    # drinks waiting for a refill come back once it is done
+                    self.clock.advanceTo(self.clock.nextTime())
+                    continue
+
+                # outlets free up in time order, so the clock only moves
+                # forward, unless it waited for a refill with them idle
+                started_at = max(heapq.heappop(outlets), self.clock.now())
+                self.clock.advanceTo(started_at)
+
+                ticket = scheduler.get()
+                drink = ticket.drink_name
+
+                # the refill the ticket waited for failed
+                if ticket.error is not None:
+                    scheduler.release()
+                    raise ticket.error
+
+                try:
+                    if ticket.reserved:
+                        outcomes = [(1, [], [], [])
+                            for drink_ID in ticket.drink_IDs]
+                    elif len(ticket.drink_IDs) == 1:
+                        outcomes = [self.__commitDrink(drink)]
+                    else:
+                        outcomes = self.__commitBatch(drink,
+                            len(ticket.drink_IDs))
+
+                    # the outlet moves on, and the ticket comes back to the
+                    # line once its refill is done
+                    if self.__mustWait(outcomes):
+                        self.__waitForRefill(ticket, outcomes[0],
+                            scheduler.putBack, ticket)
+                        outcomes = []
+
+                    # the drinks of a batch pour one after another
+                    finished_at = started_at
+                    for j in range(len(outcomes)):
+                        self.__reportTaken(drink, ticket.drink_IDs[j],
+                            *outcomes[j])
+
+                        if self.__isPoured(outcomes[j][0]):
+                            finished_at += self.__pourTime(drink)
+                            self.events.emit("poured", ticket.drink_IDs[j],
+                                drink)
+                finally:
+                    scheduler.release()
+
+                heapq.heappush(outlets, finished_at)
+                self.__outlet_busy.inc(amount=finished_at - started_at)
+
+                outcomes = self.__waitedOutcomes(ticket, outcomes)
+                for j in range(len(outcomes)):
+                    done[ticket.drink_IDs[j]] = self.__buildResult(drink,
+                        ticket.drink_IDs[j], outcomes[j], ticket.queued_at,
+                        started_at, finished_at)
+
+                # hand back the results done so far, in order
+                while next_ID in done:
+                    yield done.pop(next_ID)
+                    next_ID += 1
+
+            while next_ID in done:
+                yield done.pop(next_ID)
+                next_ID += 1
+
+            # the order is over once the last outlet frees up
+            self.clock.advanceTo(max(max(outlets), self.clock.now()))
+        finally:
+            # the whole order is reported by the time it is done
+            self.events.flush()
+
+    def __skipDrink(self, drink_name, drink_ID, queued_at):
+        """Method to report a drink the plan found unavailable, without
+        handing it to an outlet.
+
+        Parameters
+        ----------
+        drink_name : str
+            String of drink name.
+
+        drink_ID : int
+            Drink ID for determining which order it is.
+
+        queued_at : float
+            Time the drink was ordered at.
+
+        Returns
+        -------
+        result : OrderResult
+            Result of the drink.
+
+        """
+
+        outcome = (-1, [], [], list(self.missing_ingredients[drink_name]))
+        self.__reportDrink(drink_name, drink_ID, *outcome)
 
-            self.running_threads.append(i)
+        return self.__buildResult(drink_name, drink_ID, outcome, queued_at,
+            queued_at, queued_at)
 
-            drink_task = threading.Thread(target=self.__makeDrink, 
-                args=(self.orders[i], i))
+    def __finishTicket(self, ticket, position):
+        """Method to get the result of a drink of a ticket that is done,
+        passing on any error raised while making it.
 
-            threads.append(drink_task)
-            drink_task.start()
+        Parameters
+        ----------
+        ticket : OrderTicket
+            Ticket that is done.
+
+        position : int
+            Position of the drink in the drink IDs of the ticket.
+
+        Returns
+        -------
+        result : OrderResult
+            Result of the drink.
+
+        """
 
-        for thread in threads:
-            thread.join()
+        if ticket.error is not None:
+            raise ticket.error
 
-        return
+        return ticket.results[position]
     
+    def __asyncOutlets(self):
+        """Method to get the semaphore guarding the outlets for coroutines
+        on the running event loop. A new one is made for every new loop.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        outlets : asyncio.Semaphore
+            Semaphore with one slot per outlet.
+
+        """
+
+        loop = asyncio.get_running_loop()
+
+        if self.__async_outlets is None or self.__async_outlets[0] is not loop:
+            self.__async_outlets = (loop, asyncio.Semaphore(self.num_outlets))
+
+        return self.__async_outlets[1]
+
+    async def makeDrinkAsync(self, drink_name, drink_ID=0):
+        """Coroutine exposed to the user. Makes a drink on the running
+        event loop, waiting for a free outlet without blocking the loop or
+        taking a thread.
+
+        Locks are only held while the ingredients are taken, never while
+        the drink pours, as with makeOrder, so an order takes as long on
+        the event loop as on the outlet threads in every locking mode.
+        Drinks pour on the event loop in real time, even if the machine
+        has a virtual clock. With a write-ahead log, the ingredients are taken on a
+        thread of the default executor, so the loop keeps running while
+        the change is synced to disk.
+
+        Parameters
+        ----------
+        drink_name : str
+            String of drink name.
+
+        drink_ID : int
+            Drink ID for determining which order it is.
+
+        Returns
+        -------
+        result : OrderResult
+            Result of the drink.
+
+        """
+
+        # check if drink has known recipe, and is a string
+        if not isinstance(drink_name, str):
+            raise ValueError("Drink name is not a string.")
+
+        if drink_name not in self.beverages:
+            raise ValueError("Drink recipe is not known.")
+
+        if self.refill_policy == "wait" and self.clock.virtual:
+            raise ValueError("Drinks cannot wait for refills on the event "+
+                "loop with a virtual clock.")
+
+        loop = asyncio.get_running_loop()
+        ticket = OrderTicket(drink_name, [drink_ID], time.monotonic())
+
+        while True:
+            async with self.__asyncOutlets():
+                started_at = time.monotonic()
+
+                if self.wal is not None:
+                    outcome = await loop.run_in_executor(None,
+                        self.__commitDrink, drink_name)
+                else:
+                    outcome = self.__commitDrink(drink_name)
+
+                if not self.__mustWait([outcome]):
+                    self.__reportTaken(drink_name, drink_ID, *outcome)
+
+                    if self.__isPoured(outcome[0]):
+                        await asyncio.sleep(self.__pourTime(drink_name))
+                        self.events.emit("poured", drink_ID, drink_name)
+
+                    self.__outlet_busy.inc(amount=time.monotonic() -
+                        started_at)
+                    break
+
+            # the outlet is free for other drinks while this one waits for
+            # its refill
+            refilled = loop.create_future()
+            self.__waitForRefill(ticket, outcome, loop.call_soon_threadsafe,
+                refilled.set_result, None)
+            await refilled
+
+            # the refill the drink waited for failed
+            if ticket.error is not None:
+                raise ticket.error
+
+        outcome = self.__waitedOutcomes(ticket, [outcome])[0]
+
+        return self.__buildResult(drink_name, drink_ID, outcome,
+            ticket.queued_at, started_at, time.monotonic())
+
+    async def makeOrderAsync(self, orders=[]):
+        """Asynchronous generator exposed to the user. Makes 'n' drinks
+        concurrently on the running event loop, and yields each drink as
+        soon as it is done, which may be out of order.
+
+        Parameters
+        ----------
+        orders : list
+            List of user requested drinks
+
+        Returns
+        -------
+        results : async generator
+            Yields the result of every drink, as an OrderResult.
+
+        """
+
+        orders = [order.drink_name for order in self.__checkOrders(orders)]
+
+        tasks = [asyncio.ensure_future(self.makeDrinkAsync(orders[i], i))
+            for i in range(len(orders))]
+
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            # drinks not yet done when the caller stops are called off
+            for task in tasks:
+                task.cancel()
+
+    def availableMenu(self):
+        """Returns the drinks the levels hold at least one of, without
+        checking any recipe, so menu displays can ask as often as they
+        like. Drinks short on ingredients are left out, even if the refill
+        policy would refill them.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        available : tuple
+            Names of the drinks, in menu order.
+
+        """
+
+        return self.menu_index.availableMenu()
+
+    def servingsLeft(self, drink_name):
+        """Returns how many of a drink the levels hold, without checking
+        its recipe.
+
+        Parameters
+        ----------
+        drink_name : str
+            String of drink name.
+
+        Returns
+        -------
+        servings : int
+            Number of the drink the levels hold, 0 for a drink missing an
+            ingredient, and infinite for a drink that takes no ingredients.
+
+        """
+
+        if not isinstance(drink_name, str):
+            raise ValueError("Drink name is not a string.")
+
+        if drink_name not in self.beverages:
+            raise ValueError("Drink recipe is not known.")
+
+        return self.menu_index.servingsLeft(drink_name)
+
     def returnIngredientLevel(self):
-        """Returns amount of each ingredient left.
+        """Returns amount of each ingredient left, as of the latest
+        snapshot.
 
         Parameters
         ----------
@@ -440,7 +3138,7 @@ class CoffeeMachine:
         Returns
         -------
         ingredients_level : dict
-            Returns a dict of all ingredients, where the value is the amount of
-            ingredient that is left in the machine.
+            Returns a read-only dict of all ingredients, where the value is
+            the amount of ingredient that is left in the machine.
         """
         return self.raw_material_qty
\ No newline at end of file
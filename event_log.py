@@ -0,0 +1,437 @@
+# Event log for the Coffee Machine. Outlets emit structured events about the
+# drinks they make into a queue, and a background thread hands them to a
+# sink, so no outlet ever waits on the terminal or a file.
+#
+# A sink is any object with a write(event) method, and optionally flush()
+# and close() methods. Sinks are only ever called from the background thread.
+
+import collections
+import json
+import queue
+import sys
+import threading
+import time
+
+# Structured event about a drink. Kinds are "prepared", "insufficient",
+# "refilled", "poured" and "unavailable", and "low_stock" about an
+# ingredient forecast to run out soon after a drink. Details holds the extra
+# fields of the kind, and timestamp is the time.time() the event was emitted
+# at.
+Event = collections.namedtuple("Event",
+    ["kind", "drink_ID", "drink_name", "details", "timestamp"])
+
+# known kinds of events
+EVENT_KINDS = ("prepared", "insufficient", "refilled", "poured",
+    "unavailable", "low_stock")
+
+class StdoutSink:
+    """ Sink that prints events to standard output, in the same words the
+    coffee machine has always used.
+    """
+
+
+    def write(self, event):
+        """Prints an event.
+
+        Parameters
+        ----------
+        event : Event
+            Event to be printed.
+
+        Returns
+        -------
+
+        """
+
+        details = event.details
+
+        if event.kind == "prepared":
+            print("Currently preparing drink number " +
+                str(event.drink_ID) + ".")
+            print()
+
+            if details["status"] == 1:
+                print(event.drink_name + " can be made.")
+
+        elif event.kind == "insufficient":
+            print(event.drink_name + " will not be made because some "+
+                "ingredients are not sufficient, which are: ")
+            print(details["ingredients"])
+            print("Extra amount of these ingredients required is :")
+            print(details["amounts"])
+
+        elif event.kind == "refilled":
+            print("Refilled the ingredients, now they are sufficient "+
+                "for making the drink.")
+            print("Making the drink now.")
+
+        elif event.kind == "poured":
+            print("Now pouring the ingredients ...")
+            print("Done!")
+            print()
+            print("###########")
+
+        elif event.kind == "unavailable":
+            print(event.drink_name + " cannot be made because some "+
+                "ingredients are not available, which are : ")
+            print(details["ingredients"])
+            print()
+            print("###########")
+
+        elif event.kind == "low_stock":
+            print(details["ingredient"] + " is running low, and will run "+
+                "out in about " + str(round(details["seconds_left"])) +
+                " seconds.")
+
+
+    def flush(self):
+        """Flushes standard output.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+
+        """
+
+        sys.stdout.flush()
+
+
+class JsonlSink:
+    """ Sink that appends events to a file, one JSON object per line.
+
+    Attributes
+    ----------
+
+    file : file
+        File the events are written to.
+
+    """
+
+
+    def __init__(self, path):
+        """Initializes the JsonlSink class.
+
+        Parameters
+        ----------
+
+        path : str
+            Path of the file to append events to.
+
+        Returns
+        -------
+
+        """
+
+        if not isinstance(path, str):
+            raise ValueError("Path of event file is not a string.")
+
+        self.file = open(path, "a")
+
+
+    def write(self, event):
+        """Writes an event as a line of JSON.
+
+        Parameters
+        ----------
+        event : Event
+            Event to be written.
+
+        Returns
+        -------
+
+        """
+
+        record = event._asdict()
+        details = record.pop("details")
+        record.update(details)
+
+        self.file.write(json.dumps(record) + "\n")
+
+
+    def flush(self):
+        """Flushes the file.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+
+        """
+
+        self.file.flush()
+
+
+    def close(self):
+        """Closes the file.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+
+        """
+
+        self.file.close()
+
+
+class MemorySink:
+    """ Sink that keeps events in a list, for tests and tools.
+
+    Attributes
+    ----------
+
+    events : list
+        Events written so far, in order.
+
+    """
+
+
+    def __init__(self):
+        """Initializes the MemorySink class.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+
+        """
+
+        self.events = []
+
+
+    def write(self, event):
+        """Keeps an event.
+
+        Parameters
+        ----------
+        event : Event
+            Event to be kept.
+
+        Returns
+        -------
+
+        """
+
+        self.events.append(event)
+
+
+    def kinds(self, drink_ID=None):
+        """Returns the kinds of the events kept, in order.
+
+        Parameters
+        ----------
+        drink_ID : int
+            Only return kinds of events about this drink, if given.
+
+        Returns
+        -------
+        kinds : list
+            Kinds of the events.
+
+        """
+
+        return [event.kind for event in self.events
+            if drink_ID is None or event.drink_ID == drink_ID]
+
+
+class NullSink:
+    """ Sink that drops every event, for benchmarks that make too many
+    drinks to keep their events around.
+    """
+
+
+    def write(self, event):
+        """Drops an event.
+
+        Parameters
+        ----------
+        event : Event
+            Event to be dropped.
+
+        Returns
+        -------
+
+        """
+
+        pass
+
+
+class EventLog:
+    """ Class for handing events from the outlets to a sink. Emitting only
+    puts the event in an unbounded queue, and a background thread drains
+    the queue into the sink.
+
+    Attributes
+    ----------
+
+    sink : object
+        Sink the events are written to.
+
+    queue : queue.Queue
+        Events emitted but not yet written.
+
+    thread : threading.Thread
+        Background thread draining the queue, started on the first event.
+
+    failed : int
+        Number of events the sink raised an error on, which are dropped.
+
+    """
+
+
+    def __init__(self, sink=None):
+        """Initializes the EventLog class.
+
+        Parameters
+        ----------
+
+        sink : object
+            Sink the events are written to. Defaults to a StdoutSink.
+
+        Returns
+        -------
+
+        """
+
+        if sink is None:
+            sink = StdoutSink()
+
+        if not callable(getattr(sink, "write", None)):
+            raise ValueError("Event sink has no write method.")
+
+        self.sink = sink
+        self.queue = queue.Queue()
+        self.thread = None
+        self.thread_lock = threading.Lock()
+        self.failed = 0
+
+
+    def emit(self, kind, drink_ID, drink_name, **details):
+        """Emits an event. Never waits on the sink.
+
+        Parameters
+        ----------
+        kind : str
+            Kind of the event, one of EVENT_KINDS.
+
+        drink_ID : int
+            Drink ID of the drink the event is about.
+
+        drink_name : str
+            Name of the drink the event is about.
+
+        details : dict
+            Extra fields of the event.
+
+        Returns
+        -------
+
+        """
+
+        if kind not in EVENT_KINDS:
+            raise ValueError("Event kind is not known.")
+
+        if self.thread is None:
+            self.__startThread()
+
+        self.queue.put(Event(kind, drink_ID, drink_name, details,
+            time.time()))
+
+
+    def __startThread(self):
+        """Method to start the background thread, if no other caller has
+        started it already.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+
+        """
+
+        with self.thread_lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.__drain,
+                    name="event-log", daemon=True)
+                self.thread.start()
+
+
+    def __drain(self):
+        """Method run by the background thread. Writes events to the sink
+        until it gets None.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+
+        """
+
+        while True:
+            event = self.queue.get()
+
+            try:
+                if event is None:
+                    return
+
+                self.sink.write(event)
+
+                # flush once the queue runs dry, not after every event
+                if self.queue.empty() and hasattr(self.sink, "flush"):
+                    self.sink.flush()
+            except Exception:
+                # a broken sink must not stop the log, or flush would hang
+                self.failed += 1
+            finally:
+                self.queue.task_done()
+
+
+    def flush(self):
+        """Blocks until every event emitted so far has been written.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+
+        """
+
+        self.queue.join()
+
+
+    def close(self):
+        """Writes every waiting event and stops the background thread. It
+        is started again if another event is emitted. Must not be called
+        while events are still being emitted.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+
+        """
+
+        with self.thread_lock:
+            if self.thread is None:
+                return
+
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
@@ -0,0 +1,431 @@
+# Fleet of Coffee Machines. Holds several machines of one site, each with
+# its own outlets and stock, and routes every order to the machine it will
+# be done soonest on, out of those with the stock to make it.
+
+import collections
+import operator
+import queue
+import threading
+
+from coffee_machine import CoffeeMachine, OrderResult, iterOrders
+
+# Result of a single drink of an order made by a fleet. Machine is the
+# position in the fleet of the machine that made the drink, or None if no
+# machine could, and result is its OrderResult, with drink_ID the position
+# of the drink in the order list of the fleet.
+FleetResult = collections.namedtuple("FleetResult", ["machine", "result"])
+
+class Fleet:
+    """ Class for routing orders across several coffee machines. Each order
+    goes to the machine with the lowest expected wait, that is the pour
+    time of the drinks routed to it and not yet done, per outlet. Only
+    machines that have the stock for the drink are picked, so a machine
+    that runs short is passed over for the next one instead of being
+    refilled.
+
+    Stock is followed on a copy of the levels of every machine, with every
+    drink routed to it taken out. The copy is taken from the snapshots of
+    the machines when an order starts while no other order is going on,
+    and orders going on at the same time all route against it, so they
+    never hand out the same stock twice. Refills are only seen once every
+    order going on is over.
+
+    Attributes
+    ----------
+
+    machines : list
+        Coffee machines of the fleet.
+
+    menu : set
+        Drinks at least one machine of the fleet knows the recipe of.
+
+    levels : list
+        Stock of every machine, as routing takes drinks out of it, while
+        orders are going on.
+
+    work : list
+        Pour time of the drinks routed to each machine, not yet done.
+
+    drinks : list
+        Number of drinks routed to each machine, not yet done.
+
+    active : int
+        Number of orders going on.
+
+    routed : list
+        Number of drinks routed to each machine so far.
+
+    fallbacks : int
+        Number of drinks routed to another machine because the machine
+        with the lowest expected wait did not have the stock.
+
+    unavailable : int
+        Number of drinks no machine had the stock or the ingredients for.
+
+    """
+
+
+    def __init__(self, machines=[]):
+        """Initializes the Fleet class.
+
+        Parameters
+        ----------
+
+        machines : list
+            Coffee machines of the fleet. A machine should only be used
+            through the fleet, so its stock is followed right.
+
+        Returns
+        -------
+
+        """
+
+        if not isinstance(machines, list):
+            raise ValueError("Machines of fleet are not a list.")
+
+        if not machines:
+            raise ValueError("Fleet has no machines.")
+
+        for machine in machines:
+            if not isinstance(machine, CoffeeMachine):
+                raise ValueError("Machine of fleet is not a CoffeeMachine.")
+
+        self.machines = machines
+        self.menu = set()
+        for machine in machines:
+            self.menu.update(machine.beverages)
+
+        self.levels = None
+        self.work = [0.0] * len(machines)
+        self.drinks = [0] * len(machines)
+        self.active = 0
+
+        self.routed = [0] * len(machines)
+        self.fallbacks = 0
+        self.unavailable = 0
+
+        # guards the counters, and the stock and outstanding work every
+        # order routes against
+        self.lock = threading.Lock()
+
+
+    def makeOrder(self, orders=[]):
+        """Class method exposed to the user. Makes 'n' drinks across the
+        machines of the fleet.
+
+        Parameters
+        ----------
+        orders : iterable
+            User requested drinks, as names or as Order.
+
+        Returns
+        -------
+        results : list
+            Result of every drink, as a FleetResult, in order.
+
+        """
+
+        return list(self.streamOrder(orders))
+
+
+    def streamOrder(self, orders=[]):
+        """Generator exposed to the user. Routes drinks to the machines as
+        they come, each machine making its drinks with its own outlets as
+        a stream, and yields the result of every drink in order, as soon
+        as it and every drink before it are done. Orders are routed on a
+        thread of their own, so a drink done is yielded even while the next
+        order is slow to come.
+
+        Parameters
+        ----------
+        orders : iterable
+            User requested drinks, as names or as Order.
+
+        Returns
+        -------
+        results : generator
+            Yields the result of every drink, as a FleetResult, in order.
+
+        """
+
+        machines = self.machines
+
+        # the stock is only taken afresh while no other order routes
+        # against it
+        with self.lock:
+            if self.active == 0:
+                self.levels = [machine.snapshots.read()[1]
+                    for machine in machines]
+            self.active += 1
+
+        # drinks routed to each machine, and their positions in the order
+        lines = [queue.Queue() for machine in machines]
+        positions = [collections.deque() for machine in machines]
+
+        done = {}
+        errors = []
+        finished = threading.Condition(self.lock)
+
+        def feed(k):
+            machine = self.machines[k]
+            try:
+                for result in machine.streamOrder(iter(lines[k].get, None)):
+                    with finished:
+                        position = positions[k].popleft()
+                        self.work[k] -= self.__pourTime(machine,
+                            result.drink_name)
+                        self.drinks[k] -= 1
+
+                        done[position] = FleetResult(k,
+                            result._replace(drink_ID=position))
+                        finished.notify_all()
+            except Exception as error:
+                with finished:
+                    errors.append(error)
+                    finished.notify_all()
+
+        feeders = [threading.Thread(target=feed, args=(k,),
+            name="fleet-" + str(k), daemon=True)
+            for k in range(len(machines))]
+        for feeder in feeders:
+            feeder.start()
+
+        # number of orders routed so far, whether routing is over, and the
+        # error it stopped on, if any
+        progress = [0, False, None]
+
+        def route():
+            try:
+                for order in iterOrders(orders, self.menu):
+                    with finished:
+                        if stopped:
+                            return
+
+                        position = progress[0]
+                        k = self.__route(order.drink_name)
+
+                        if k is None:
+                            done[position] = FleetResult(None,
+                                self.__unavailable(order.drink_name,
+                                position))
+                        else:
+                            machine = machines[k]
+                            self.levels[k] = tuple(map(operator.sub,
+                                self.levels[k],
+                                machine.recipe_vectors[order.drink_name]))
+                            self.work[k] += self.__pourTime(machine,
+                                order.drink_name)
+                            self.drinks[k] += 1
+                            positions[k].append(position)
+
+                            # the machine makes the drink as soon as it
+                            # comes, and hands it back as soon as it is done
+                            lines[k].put(order)
+
+                        progress[0] += 1
+                        finished.notify_all()
+            except Exception as error:
+                with finished:
+                    progress[2] = error
+            finally:
+                with finished:
+                    progress[1] = True
+                    finished.notify_all()
+
+                for line in lines:
+                    line.put(None)
+
+        # orders are routed on a thread of their own, so a drink done is
+        # handed back however slowly the next order comes
+        stopped = False
+        router = threading.Thread(target=route, name="fleet-router",
+            daemon=True)
+        router.start()
+
+        next_ID = 0
+
+        try:
+            while True:
+                with finished:
+                    while (next_ID not in done and not errors and
+                        not (progress[1] and next_ID >= progress[0])):
+                        finished.wait()
+
+                    if next_ID not in done:
+                        if errors:
+                            raise errors[0]
+
+                        # an order that failed the checks is raised once
+                        # every drink before it is handed back
+                        if progress[2] is not None:
+                            raise progress[2]
+
+                        break
+
+                    result = done.pop(next_ID)
+
+                yield result
+                next_ID += 1
+        finally:
+            # orders not yet routed are never routed, while drinks already
+            # routed are still made, even if the caller stops early
+            with finished:
+                stopped = True
+
+            for line in lines:
+                line.put(None)
+
+            for feeder in feeders:
+                feeder.join()
+
+            with self.lock:
+                self.active -= 1
+
+
+    def __route(self, drink_name):
+        """Method to pick the machine to make a drink on, once the lock is
+        held.
+
+        Parameters
+        ----------
+        drink_name : str
+            String of drink name.
+
+        Returns
+        -------
+        machine : int
+            Position of the machine in the fleet, or None if no machine
+            has the stock or the ingredients for the drink.
+
+        """
+
+        best = None
+        chosen = None
+
+        for k in range(len(self.machines)):
+            machine = self.machines[k]
+
+            if drink_name not in machine.recipe_vectors:
+                continue
+
+            # expected wait per outlet, ties going to fewer drinks
+            wait = (self.work[k] / machine.num_outlets,
+                self.drinks[k] / machine.num_outlets)
+
+            # machine picked if stock made no difference
+            if best is None or wait < best[0]:
+                best = (wait, k)
+
+            if not all(map(operator.ge, self.levels[k],
+                machine.recipe_vectors[drink_name])):
+                continue
+
+            if chosen is None or wait < chosen[0]:
+                chosen = (wait, k)
+
+        if chosen is None:
+            self.unavailable += 1
+            return None
+
+        if chosen[1] != best[1]:
+            self.fallbacks += 1
+
+        self.routed[chosen[1]] += 1
+
+        return chosen[1]
+
+
+    def __unavailable(self, drink_name, position):
+        """Method to build the result of a drink no machine can make. The
+        shortfall is that of the machine with the ingredients and the
+        least stock missing, and the missing ingredients are those of the
+        first machine that knows the drink otherwise.
+
+        Parameters
+        ----------
+        drink_name : str
+            String of drink name.
+
+        position : int
+            Position of the drink in the order list.
+
+        Returns
+        -------
+        result : OrderResult
+            Result of the drink.
+
+        """
+
+        shortfall = None
+        missing = None
+
+        for k in range(len(self.machines)):
+            machine = self.machines[k]
+
+            if drink_name not in machine.beverages:
+                continue
+
+            if drink_name not in machine.recipe_vectors:
+                if missing is None:
+                    missing = list(machine.missing_ingredients[drink_name])
+                continue
+
+            vector = machine.recipe_vectors[drink_name]
+            levels = self.levels[k]
+            short = {machine.ingredients[i]: vector[i] - levels[i]
+                for i in machine.recipe_ids[drink_name]
+                if levels[i] < vector[i]}
+
+            if shortfall is None or sum(short.values()) < sum(
+                shortfall.values()):
+                shortfall = short
+
+        if shortfall is None:
+            return OrderResult(position, drink_name, -1, {}, {}, missing,
+                0.0, 0.0)
+
+        return OrderResult(position, drink_name, 0, shortfall, {}, [], 0.0,
+            0.0)
+
+
+    def __pourTime(self, machine, drink_name):
+        """Method to get the seconds a machine spends pouring a drink.
+
+        Parameters
+        ----------
+        machine : CoffeeMachine
+            Machine making the drink.
+
+        drink_name : str
+            String of drink name.
+
+        Returns
+        -------
+        seconds : float
+            Pour time of the drink.
+
+        """
+
+        return machine.pour_times.get(drink_name, machine.pour_time)
+
+
+    def stats(self):
+        """Returns a consistent copy of the routing counters.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        stats : dict
+            Dict with the counters listed in the class attributes.
+
+        """
+
+        with self.lock:
+            return {
+                "routed": list(self.routed),
+                "fallbacks": self.fallbacks,
+                "unavailable": self.unavailable,
+            }
@@ -0,0 +1,466 @@
+# Compiled config for the Coffee Machine. A config is checked and compiled
+# once, and written out as a compact binary file holding the ingredient IDs,
+# the recipe matrix and a hash of the config it came from. Machines are then
+# made from the file without checking or compiling the config again, which
+# cuts the start up of every worker on a large catalog of recipes.
+#
+# The file is laid out as a header, then sections of 64-bit integers in the
+# byte order of the machine that wrote it, then the names as UTF-8:
+#
+#   header          magic, format version, content hash, and the number of
+#                   outlets, ingredients, names, drinks and recipe entries
+#   name lengths    length of every name in characters, ingredients of the
+#                   machine first, then other ingredients the recipes name,
+#                   then drinks
+#   levels          quantity of each ingredient, by ingredient ID
+#   offsets         first recipe entry of each drink, and the end of the last
+#   entry names     name ID of each recipe entry, in recipe order
+#   entry amounts   quantity of each recipe entry
+#   matrix          compiled recipe of each drink, one row per drink, by
+#                   ingredient ID, all 0 for drinks missing an ingredient
+#   names           all the names, one after another, as one string
+
+import array
+import hashlib
+import json
+import os
+import struct
+
+from coffee_machine import CoffeeMachine
+from event_log import NullSink
+
+# Marks a compiled config file, and the layout it is written in
+MAGIC = b"CMCF"
+FORMAT_VERSION = 1
+
+# Magic, format version, content hash, and the number of outlets,
+# ingredients, names, drinks and recipe entries
+HEADER = struct.Struct("=4sI32s5q")
+
+# Bytes of every integer of the sections
+ITEM_SIZE = 8
+
+class CompiledConfig:
+    """ Class for a checked and compiled coffee machine config. Holds the
+    config as given, along with the recipes compiled as the machine
+    compiles them, so a machine made from it only has to take them over.
+
+    Attributes
+    ----------
+
+    num_outlets : int
+        Number of outlets in the coffee machine.
+
+    beverages : dict
+        Recipes for the various drinks the machine makes.
+
+    raw_material_qty : dict
+        Starting quantity of raw material in the coffee machine.
+
+    ingredients : list
+        Names of the ingredients in the machine, by ingredient ID.
+
+    ingredient_ids : dict
+        Ingredient ID of each ingredient in the machine.
+
+    levels : tuple
+        Starting quantity of each ingredient, by ingredient ID.
+
+    recipe_vectors : dict
+        Recipe of each drink compiled to a tuple of quantities indexed by
+        ingredient ID, for drinks whose ingredients are all in the machine.
+
+    recipe_ids : dict
+        Ingredient IDs each compiled recipe uses, in recipe order.
+
+    missing_ingredients : dict
+        Ingredients of each drink that are not in the machine.
+
+    content_hash : str
+        SHA-256 hash of the config the compiled config came from, as hex.
+
+    """
+
+
+    def __init__(self, num_outlets, beverages, raw_material_qty,
+        recipe_vectors, recipe_ids, missing_ingredients, content_hash):
+        """Initializes the CompiledConfig class. Use compileConfig or
+        loadConfig to get one, as the parts are not checked here.
+
+        Parameters
+        ----------
+
+        num_outlets : int
+            Number of outlets in the coffee machine.
+
+        beverages : dict
+            Recipes for the various drinks the machine makes.
+
+        raw_material_qty : dict
+            Starting quantity of raw material in the coffee machine.
+
+        recipe_vectors : dict
+            Compiled recipe of each drink that can be made at all.
+
+        recipe_ids : dict
+            Ingredient IDs each compiled recipe uses, in recipe order.
+
+        missing_ingredients : dict
+            Ingredients of each drink that are not in the machine.
+
+        content_hash : str
+            SHA-256 hash of the config, as hex.
+
+        Returns
+        -------
+
+        """
+
+        self.num_outlets = num_outlets
+        self.beverages = beverages
+        self.raw_material_qty = raw_material_qty
+
+        self.ingredients = list(raw_material_qty.keys())
+        self.ingredient_ids = dict(zip(self.ingredients,
+            range(len(self.ingredients))))
+        self.levels = tuple(raw_material_qty.values())
+
+        self.recipe_vectors = recipe_vectors
+        self.recipe_ids = recipe_ids
+        self.missing_ingredients = missing_ingredients
+        self.content_hash = content_hash
+
+
+    def machine(self, **options):
+        """Makes a coffee machine from the config, without checking or
+        compiling it again.
+
+        Parameters
+        ----------
+        options : dict
+            Other arguments of CoffeeMachine, such as locking or
+            pour_time.
+
+        Returns
+        -------
+        machine : CoffeeMachine
+            Machine with the outlets, recipes and raw material of the
+            config.
+
+        """
+
+        return CoffeeMachine(self.num_outlets, self.beverages,
+            self.raw_material_qty, compiled=self, **options)
+
+
+    def write(self, path):
+        """Writes the config out as a compiled config file. The file is
+        written whole and then moved into place, so a worker loading it
+        meanwhile never reads part of it.
+
+        Parameters
+        ----------
+        path : str
+            Path of the file.
+
+        Returns
+        -------
+
+        """
+
+        ingredients = self.ingredients
+        drinks = list(self.beverages.keys())
+
+        # ingredients the recipes name that the machine does not have get
+        # name IDs after those of the machine
+        name_ids = dict(self.ingredient_ids)
+        names = list(ingredients)
+        for drink in drinks:
+            for ingredient in self.missing_ingredients[drink]:
+                if ingredient not in name_ids:
+                    name_ids[ingredient] = len(names)
+                    names.append(ingredient)
+
+        offsets = [0]
+        entry_names = []
+        entry_amounts = []
+        matrix = []
+        empty = (0,) * len(ingredients)
+
+        for drink in drinks:
+            recipe = self.beverages[drink]
+            for ingredient in recipe:
+                entry_names.append(name_ids[ingredient])
+                entry_amounts.append(recipe[ingredient])
+            offsets.append(len(entry_names))
+
+            matrix.extend(self.recipe_vectors.get(drink, empty))
+
+        names = names + drinks
+
+        try:
+            sections = [array.array("q", section) for section in [
+                [len(name) for name in names], self.levels, offsets,
+                entry_names, entry_amounts, matrix]]
+        except OverflowError:
+            raise ValueError("Quantity is too large to compile.")
+
+        header = HEADER.pack(MAGIC, FORMAT_VERSION, bytes.fromhex(
+            self.content_hash), self.num_outlets, len(ingredients),
+            len(names) - len(drinks), len(drinks), len(entry_names))
+
+        temp_path = path + ".tmp"
+        with open(temp_path, "wb") as f:
+            f.write(header)
+            for section in sections:
+                f.write(section.tobytes())
+            f.write("".join(names).encode("utf-8"))
+
+        os.replace(temp_path, path)
+
+
+def contentHash(data):
+    """Hashes the content of a config.
+
+    Parameters
+    ----------
+    data : bytes
+        Content of the config.
+
+    Returns
+    -------
+    content_hash : str
+        SHA-256 hash of the content, as hex.
+
+    """
+
+    return hashlib.sha256(data).hexdigest()
+
+
+def compileConfig(num_outlets, beverages, raw_material_qty,
+    content_hash=None):
+    """Checks a config and compiles its recipes, as a coffee machine does.
+
+    Parameters
+    ----------
+    num_outlets : int
+        Number of outlets in the coffee machine.
+
+    beverages : dict
+        Recipes for the various drinks the machine makes.
+
+    raw_material_qty : dict
+        Starting quantity of raw material in the coffee machine.
+
+    content_hash : str
+        Hash of the config file it came from, as given by contentHash.
+        Defaults to a hash of the config itself.
+
+    Returns
+    -------
+    config : CompiledConfig
+        Checked and compiled config.
+
+    """
+
+    # the machine raises on a config that is not well formed
+    machine = CoffeeMachine(num_outlets, beverages, raw_material_qty,
+        event_sink=NullSink())
+
+    if content_hash is None:
+        content_hash = contentHash(json.dumps([num_outlets, beverages,
+            raw_material_qty], separators=(",", ":")).encode("utf-8"))
+
+    return CompiledConfig(num_outlets, beverages, raw_material_qty,
+        machine.recipe_vectors, machine.recipe_ids,
+        machine.missing_ingredients, content_hash)
+
+
+def loadConfig(path, content_hash=None):
+    """Loads a compiled config file. The config is not checked or compiled
+    again, as it was when the file was written.
+
+    Parameters
+    ----------
+    path : str
+        Path of the file.
+
+    content_hash : str
+        Hash the config the file came from should have, such as the hash
+        of the config file now. Defaults to None, for any config.
+
+    Returns
+    -------
+    config : CompiledConfig
+        Config of the file.
+
+    """
+
+    with open(path, "rb") as f:
+        data = f.read()
+
+    return readConfig(data, content_hash)
+
+
+def readConfig(data, content_hash=None):
+    """Reads a compiled config out of the content of its file.
+
+    Parameters
+    ----------
+    data : bytes
+        Content of the file, or any other buffer holding it.
+
+    content_hash : str
+        Hash the config the file came from should have. Defaults to None,
+        for any config.
+
+    Returns
+    -------
+    config : CompiledConfig
+        Config of the file.
+
+    """
+
+    # the buffer cannot be closed while a view of it is open
+    view = memoryview(data)
+
+    try:
+        if len(view) < HEADER.size or bytes(view[:4]) != MAGIC:
+            raise ValueError("File is not a compiled config.")
+
+        (magic, version, stored_hash, num_outlets, num_ingredients,
+            num_names, num_drinks, num_entries) = HEADER.unpack_from(view)
+
+        if version != FORMAT_VERSION:
+            raise ValueError("Compiled config format is not supported.")
+
+        if content_hash is not None and stored_hash.hex() != content_hash:
+            raise ValueError("Compiled config is out of date.")
+
+        sizes = [num_names + num_drinks, num_ingredients, num_drinks + 1,
+            num_entries, num_entries]
+
+        # every section is turned into a list in one go, which is far
+        # quicker than going through it one item at a time
+        start = HEADER.size
+        sections = []
+        for size in sizes:
+            end = start + size * ITEM_SIZE
+            if end > len(view):
+                raise ValueError("Compiled config is truncated.")
+
+            section = view[start:end].cast("q")
+            sections.append(section.tolist())
+            section.release()
+            start = end
+
+        lengths, levels, offsets, entry_names, entry_amounts = sections
+
+        end = start + num_drinks * num_ingredients * ITEM_SIZE
+        if end > len(view):
+            raise ValueError("Compiled config is truncated.")
+
+        # every row of the matrix is unpacked straight into a recipe vector
+        if num_ingredients > 0:
+            section = view[start:end]
+            rows = list(struct.Struct("=" + str(num_ingredients) +
+                "q").iter_unpack(section))
+            section.release()
+        else:
+            rows = [()] * num_drinks
+
+        try:
+            text = str(view[end:], "utf-8")
+        except UnicodeDecodeError:
+            raise ValueError("Compiled config is truncated.")
+
+        if sum(lengths) != len(text):
+            raise ValueError("Compiled config is truncated.")
+
+        names = []
+        start = 0
+        for length in lengths:
+            names.append(text[start:start + length])
+            start += length
+
+        drinks = names[num_names:]
+        names = names[:num_names]
+
+        raw_material_qty = dict(zip(names[:num_ingredients], levels))
+
+        beverages = {}
+        recipe_vectors = {}
+        recipe_ids = {}
+        missing_ingredients = {}
+
+        keys = [names[i] for i in entry_names]
+
+        for d in range(num_drinks):
+            drink = drinks[d]
+            first = offsets[d]
+            last = offsets[d + 1]
+
+            beverages[drink] = dict(zip(keys[first:last],
+                entry_amounts[first:last]))
+            ids = tuple(entry_names[first:last])
+
+            # name IDs past those of the machine are missing ingredients
+            if ids and max(ids) >= num_ingredients:
+                missing_ingredients[drink] = [names[i] for i in ids
+                    if i >= num_ingredients]
+                continue
+
+            missing_ingredients[drink] = []
+            recipe_vectors[drink] = rows[d]
+            recipe_ids[drink] = ids
+
+        return CompiledConfig(num_outlets, beverages, raw_material_qty,
+            recipe_vectors, recipe_ids, missing_ingredients,
+            stored_hash.hex())
+    finally:
+        view.release()
+
+
+def cachedConfig(config_path, cache_path=None):
+    """Loads a config file in the format of standard_input.json, from its
+    compiled config file if that came from the same content, and checks,
+    compiles and writes it out again otherwise.
+
+    Parameters
+    ----------
+    config_path : str
+        Path of the JSON config file.
+
+    cache_path : str
+        Path of the compiled config file. Defaults to the path of the
+        config file, with the extension .cmcf.
+
+    Returns
+    -------
+    config : CompiledConfig
+        Checked and compiled config.
+
+    """
+
+    if cache_path is None:
+        cache_path = os.path.splitext(config_path)[0] + ".cmcf"
+
+    with open(config_path, "rb") as f:
+        content = f.read()
+
+    content_hash = contentHash(content)
+
+    # hashing the config is far cheaper than parsing and checking it
+    try:
+        return loadConfig(cache_path, content_hash)
+    except (OSError, ValueError):
+        pass
+
+    data = json.loads(content)
+
+    config = compileConfig(data["machine"]["outlets"]["count_n"],
+        data["machine"]["beverages"], data["machine"]["total_items_quantity"],
+        content_hash)
+    config.write(cache_path)
+
+    return config
@@ -0,0 +1,243 @@
+# Menu index for the Coffee Machine. Keeps how many servings of every drink
+# the levels hold, so a menu display can ask what the machine makes right
+# now without checking every recipe. Whenever some levels change, only the
+# drinks using those ingredients are worked out again.
+
+import math
+import threading
+
+class MenuIndex:
+    """ Class for the drinks a coffee machine can make from its levels. An
+    inverted index from each ingredient to the drinks using it picks the
+    drinks to work out again when the levels of some ingredients change.
+
+    Changes are only noted when they happen, since pours far outnumber
+    menu displays on a busy machine and an outlet should not pay for them.
+    The drinks they touch are worked out once each, the next time the
+    index is asked, so asking again with nothing changed takes no work.
+
+    Attributes
+    ----------
+
+    menu : list
+        Names of all drinks, in menu order.
+
+    recipe_vectors : dict
+        Recipe of each drink compiled to a tuple of quantities indexed by
+        ingredient ID, for drinks whose ingredients are all in the machine.
+
+    recipe_ids : dict
+        Ingredient IDs each compiled recipe uses.
+
+    read_levels : callable
+        Called with no arguments to read the current levels.
+
+    drinks : list
+        Drinks using each ingredient, indexed by ingredient ID.
+
+    servings : dict
+        Number of each drink the levels held when last worked out.
+
+    available : tuple
+        Drinks the levels held at least one of when last worked out, in
+        menu order.
+
+    changed : set
+        Ingredient IDs whose levels changed since the index was last
+        asked.
+
+    """
+
+
+    def __init__(self, menu, recipe_vectors, recipe_ids, read_levels):
+        """Initializes the MenuIndex class.
+
+        Parameters
+        ----------
+
+        menu : list
+            Names of all drinks, in menu order.
+
+        recipe_vectors : dict
+            Compiled recipe of each drink that can be made at all.
+
+        recipe_ids : dict
+            Ingredient IDs each compiled recipe uses.
+
+        read_levels : callable
+            Called with no arguments to read the current levels, indexed
+            by ingredient ID.
+
+        Returns
+        -------
+
+        """
+
+        self.menu = list(menu)
+        self.recipe_vectors = recipe_vectors
+        self.recipe_ids = recipe_ids
+        self.read_levels = read_levels
+
+        levels = read_levels()
+
+        self.drinks = [[] for i in range(len(levels))]
+        for drink in self.menu:
+            for i in recipe_ids.get(drink, ()):
+                if recipe_vectors[drink][i] > 0:
+                    self.drinks[i].append(drink)
+
+        # drinks missing an ingredient can never be made
+        self.servings = {}
+        for drink in self.menu:
+            if drink in recipe_vectors:
+                self.servings[drink] = self.__servings(drink, levels)
+            else:
+                self.servings[drink] = 0
+
+        self.available = self.__available()
+        self.changed = set()
+
+        # outlets change the levels from several threads at once
+        self.lock = threading.Lock()
+
+
+    def update(self, ids):
+        """Notes that the levels of some ingredients changed. Must be
+        called after every change to the levels.
+
+        Parameters
+        ----------
+        ids : iterable
+            Ingredient IDs whose levels changed.
+
+        Returns
+        -------
+
+        """
+
+        with self.lock:
+            self.changed.update(ids)
+
+
+    def availableMenu(self):
+        """Returns the drinks the levels hold at least one of.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        available : tuple
+            Names of the drinks, in menu order.
+
+        """
+
+        if self.changed:
+            self.__refresh()
+
+        return self.available
+
+
+    def servingsLeft(self, drink_name):
+        """Returns how many of a drink the levels hold.
+
+        Parameters
+        ----------
+        drink_name : str
+            Name of drink.
+
+        Returns
+        -------
+        servings : int
+            Number of the drink the levels hold, infinite for a drink that
+            takes no ingredients.
+
+        """
+
+        if self.changed:
+            self.__refresh()
+
+        return self.servings[drink_name]
+
+
+    def __refresh(self):
+        """Method to work out the servings of the drinks using the
+        ingredients that changed, once each. The levels are read after the
+        changes are taken, so a change noted meanwhile is seen the next
+        time.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+
+        """
+
+        with self.lock:
+            changed = self.changed
+            self.changed = set()
+
+            drinks = set()
+            for i in changed:
+                drinks.update(self.drinks[i])
+
+            levels = self.read_levels()
+            flipped = False
+
+            for drink in drinks:
+                servings = self.__servings(drink, levels)
+
+                # the menu only changes when a drink runs out or comes back
+                if (servings > 0) != (self.servings[drink] > 0):
+                    flipped = True
+
+                self.servings[drink] = servings
+
+            if flipped:
+                self.available = self.__available()
+
+
+    def __servings(self, drink_name, levels):
+        """Method to work out how many of a drink the levels hold.
+
+        Parameters
+        ----------
+        drink_name : str
+            Name of drink.
+
+        levels : list
+            Quantity of each ingredient, indexed by ingredient ID.
+
+        Returns
+        -------
+        servings : int
+            Number of the drink the levels hold.
+
+        """
+
+        vector = self.recipe_vectors[drink_name]
+
+        return min([levels[i] // vector[i]
+            for i in self.recipe_ids[drink_name] if vector[i] > 0],
+            default=math.inf)
+
+
+    def __available(self):
+        """Method to list the drinks the levels hold at least one of.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        available : tuple
+            Names of the drinks, in menu order.
+
+        """
+
+        return tuple(drink for drink in self.menu
+            if self.servings[drink] > 0)
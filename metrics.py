@@ -0,0 +1,687 @@
+# Metrics for the Coffee Machine. Counters and histograms are recorded by
+# the outlets as they make drinks, and exported in the Prometheus text
+# format, either dumped on demand or served over HTTP on a local port, so
+# throughput and tail latency can be watched while the machine runs.
+#
+# Recording has to stay cheap, as every drink records a few metrics. Each
+# thread records into a shard of its own, which no other thread writes, so
+# no lock is taken. Shards are only added up when the metrics are exported.
+
+import abc
+import bisect
+import http.server
+import threading
+
+# upper bounds, in seconds, of the buckets of a histogram, from a
+# millisecond up to a minute
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1, 2.5, 5, 10, 30, 60)
+
+def formatLabels(label_names, labels, extra=""):
+    """Formats the labels of a sample, escaped as the text format needs.
+
+    Parameters
+    ----------
+    label_names : tuple
+        Names of the labels.
+
+    labels : tuple
+        Values of the labels, in the order of their names.
+
+    extra : str
+        Label already formatted, added after the others, such as the bound
+        of a bucket.
+
+    Returns
+    -------
+    labels : str
+        Labels in braces, or an empty string if there are none.
+
+    """
+
+    pairs = []
+    for name, value in zip(label_names, labels):
+        value = str(value).replace("\\", "\\\\").replace("\"", "\\\"")
+        pairs.append(name + "=\"" + value.replace("\n", "\\n") + "\"")
+
+    if extra:
+        pairs.append(extra)
+
+    if not pairs:
+        return ""
+
+    return "{" + ",".join(pairs) + "}"
+
+
+class Metric(abc.ABC):
+    """ Base class for metrics recorded in shards, one per thread. A shard
+    is a dict with the label values as key. Shards of threads that are gone
+    are folded into one, so threads started for every order do not add up
+    to ever more shards.
+
+    Attributes
+    ----------
+
+    name : str
+        Name of the metric.
+
+    help : str
+        Description of the metric.
+
+    label_names : tuple
+        Names of the labels of the metric.
+
+    """
+
+    # type of the metric in the text format
+    TYPE = None
+
+
+    def __init__(self, name, help, label_names=()):
+        """Initializes the Metric class.
+
+        Parameters
+        ----------
+
+        name : str
+            Name of the metric.
+
+        help : str
+            Description of the metric.
+
+        label_names : tuple
+            Names of the labels of the metric. Defaults to no labels.
+
+        Returns
+        -------
+
+        """
+
+        self.name = name
+        self.help = help
+        self.label_names = tuple(label_names)
+
+        # shard of the current thread, and the shards with their threads
+        self.local = threading.local()
+        self.shards = []
+        self.retired = {}
+
+        # guards the list of shards, taken only once per thread
+        self.lock = threading.Lock()
+
+
+    def shard(self):
+        """Returns the shard of the current thread, adding it the first
+        time the thread records.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        shard : dict
+            Shard of the current thread.
+
+        """
+
+        try:
+            return self.local.shard
+        except AttributeError:
+            pass
+
+        shard = {}
+        with self.lock:
+            self.__retireShards()
+            self.shards.append((threading.current_thread(), shard))
+
+        self.local.shard = shard
+        return shard
+
+
+    def __retireShards(self):
+        """Method to fold the shards of threads that are gone into the
+        retired shard, once the lock is held. Those threads record nothing
+        more, so their shards are read without a race.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+
+        """
+
+        alive = []
+        for thread, shard in self.shards:
+            if thread.is_alive():
+                alive.append((thread, shard))
+                continue
+
+            for labels in shard:
+                self.retired[labels] = self.merge(self.retired.get(labels),
+                    shard[labels])
+
+        self.shards = alive
+
+
+    def values(self):
+        """Returns the value of every set of labels recorded so far, added
+        up across the shards. Shards are copied whole, so a value being
+        recorded meanwhile is either in or out.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        values : dict
+            Value of the metric, with the label values as key.
+
+        """
+
+        with self.lock:
+            self.__retireShards()
+            totals = dict(self.retired)
+            shards = [shard.copy() for thread, shard in self.shards]
+
+        for shard in shards:
+            for labels in shard:
+                totals[labels] = self.merge(totals.get(labels), shard[labels])
+
+        return totals
+
+
+    @abc.abstractmethod
+    def merge(self, total, value):
+        """Adds a value recorded in a shard to a total, which is None if
+        there is none yet.
+        """
+
+
+    @abc.abstractmethod
+    def samples(self):
+        """Returns the lines of the metric in the text format, after its
+        HELP and TYPE lines.
+        """
+
+
+class Counter(Metric):
+    """ Class for a metric that only goes up, such as the number of drinks
+    made.
+    """
+
+    TYPE = "counter"
+
+
+    def inc(self, labels=(), amount=1):
+        """Adds to the counter.
+
+        Parameters
+        ----------
+        labels : tuple
+            Values of the labels, in the order of their names.
+
+        amount : float
+            Amount to add. Defaults to 1.
+
+        Returns
+        -------
+
+        """
+
+        shard = self.shard()
+        shard[labels] = shard.get(labels, 0) + amount
+
+
+    def merge(self, total, value):
+        """Adds a count to a total.
+        """
+
+        if total is None:
+            return value
+
+        return total + value
+
+
+    def samples(self):
+        """Returns a line per set of labels.
+        """
+
+        values = self.values()
+
+        return [self.name + formatLabels(self.label_names, labels) + " " +
+            str(values[labels]) for labels in sorted(values)]
+
+
+class Histogram(Metric):
+    """ Class for a metric counting values into buckets of fixed bounds,
+    such as the seconds drinks take, along with their count and sum. A
+    bucket counts the values up to its bound, and the last one every value.
+
+    Attributes
+    ----------
+
+    buckets : tuple
+        Upper bounds of the buckets, in increasing order.
+
+    """
+
+    TYPE = "histogram"
+
+
+    def __init__(self, name, help, label_names=(), buckets=DEFAULT_BUCKETS):
+        """Initializes the Histogram class.
+
+        Parameters
+        ----------
+
+        name : str
+            Name of the metric.
+
+        help : str
+            Description of the metric.
+
+        label_names : tuple
+            Names of the labels of the metric. Defaults to no labels.
+
+        buckets : tuple
+            Upper bounds of the buckets, in increasing order. Defaults to
+            DEFAULT_BUCKETS.
+
+        Returns
+        -------
+
+        """
+
+        buckets = tuple(buckets)
+
+        if not buckets:
+            raise ValueError("Histogram has no buckets.")
+
+        for bound in buckets:
+            if not isinstance(bound, (int, float)):
+                raise ValueError("Bucket bound is not a number.")
+
+        if list(buckets) != sorted(set(buckets)):
+            raise ValueError("Bucket bounds are not increasing.")
+
+        Metric.__init__(self, name, help, label_names)
+        self.buckets = buckets
+
+
+    def observe(self, value, labels=()):
+        """Counts a value into its bucket.
+
+        Parameters
+        ----------
+        value : float
+            Value to count.
+
+        labels : tuple
+            Values of the labels, in the order of their names.
+
+        Returns
+        -------
+
+        """
+
+        shard = self.shard()
+
+        # count in each bucket, then the sum of the values
+        counts = shard.get(labels)
+        if counts is None:
+            counts = [0] * (len(self.buckets) + 2)
+            shard[labels] = counts
+
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+
+    def merge(self, total, value):
+        """Adds the bucket counts and sum of a shard to a total.
+        """
+
+        # copied, as the shard keeps being recorded into
+        value = list(value)
+
+        if total is None:
+            return value
+
+        return [total[i] + value[i] for i in range(len(value))]
+
+
+    def samples(self):
+        """Returns a line per bucket, along with the count and the sum, per
+        set of labels. Buckets count every value up to their bound.
+        """
+
+        values = self.values()
+        bounds = [str(bound) for bound in self.buckets] + ["+Inf"]
+
+        lines = []
+        for labels in sorted(values):
+            counts = values[labels]
+
+            total = 0
+            for i in range(len(bounds)):
+                total += counts[i]
+                lines.append(self.name + "_bucket" + formatLabels(
+                    self.label_names, labels, "le=\"" + bounds[i] + "\"") +
+                    " " + str(total))
+
+            name_labels = formatLabels(self.label_names, labels)
+            lines.append(self.name + "_count" + name_labels + " " +
+                str(total))
+            lines.append(self.name + "_sum" + name_labels + " " +
+                str(counts[-1]))
+
+        return lines
+
+
+class Gauge:
+    """ Class for a metric read when it is exported, such as the level of
+    each ingredient, so recording it costs nothing.
+
+    Attributes
+    ----------
+
+    name : str
+        Name of the metric.
+
+    help : str
+        Description of the metric.
+
+    label_names : tuple
+        Names of the labels of the metric.
+
+    function : callable
+        Called with no arguments, returns the value of every set of labels,
+        with the label values as key.
+
+    """
+
+    TYPE = "gauge"
+
+
+    def __init__(self, name, help, function, label_names=()):
+        """Initializes the Gauge class.
+
+        Parameters
+        ----------
+
+        name : str
+            Name of the metric.
+
+        help : str
+            Description of the metric.
+
+        function : callable
+            Returns the value of every set of labels, with the label values
+            as key.
+
+        label_names : tuple
+            Names of the labels of the metric. Defaults to no labels.
+
+        Returns
+        -------
+
+        """
+
+        if not callable(function):
+            raise ValueError("Gauge function is not callable.")
+
+        self.name = name
+        self.help = help
+        self.function = function
+        self.label_names = tuple(label_names)
+
+
+    def values(self):
+        """Returns the value of every set of labels now.
+        """
+
+        return dict(self.function())
+
+
+    def samples(self):
+        """Returns a line per set of labels.
+        """
+
+        values = self.values()
+
+        return [self.name + formatLabels(self.label_names, labels) + " " +
+            str(values[labels]) for labels in sorted(values)]
+
+
+class MetricsRegistry:
+    """ Class for the metrics of a coffee machine. Metrics are added once,
+    by name, and exported together in the Prometheus text format.
+
+    Attributes
+    ----------
+
+    metrics : dict
+        Metrics added so far, with name as key, in the order they were
+        added.
+
+    """
+
+
+    def __init__(self):
+        """Initializes the MetricsRegistry class.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+
+        """
+
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+
+    def __add(self, metric):
+        """Method to add a metric, or to get the one of the same name, type
+        and labels added before.
+
+        Parameters
+        ----------
+        metric : object
+            Metric to add.
+
+        Returns
+        -------
+        metric : object
+            Metric of that name in the registry.
+
+        """
+
+        with self.lock:
+            existing = self.metrics.get(metric.name)
+
+            if existing is None:
+                self.metrics[metric.name] = metric
+                return metric
+
+            if (existing.TYPE != metric.TYPE or
+                existing.label_names != metric.label_names):
+                raise ValueError("Metric of that name is already "+
+                    "registered.")
+
+            return existing
+
+
+    def counter(self, name, help, label_names=()):
+        """Adds a counter, or returns the one of that name.
+
+        Parameters
+        ----------
+        name : str
+            Name of the metric.
+
+        help : str
+            Description of the metric.
+
+        label_names : tuple
+            Names of the labels of the metric. Defaults to no labels.
+
+        Returns
+        -------
+        counter : Counter
+            Counter of that name.
+
+        """
+
+        return self.__add(Counter(name, help, label_names))
+
+
+    def histogram(self, name, help, label_names=(),
+        buckets=DEFAULT_BUCKETS):
+        """Adds a histogram, or returns the one of that name.
+
+        Parameters
+        ----------
+        name : str
+            Name of the metric.
+
+        help : str
+            Description of the metric.
+
+        label_names : tuple
+            Names of the labels of the metric. Defaults to no labels.
+
+        buckets : tuple
+            Upper bounds of the buckets. Defaults to DEFAULT_BUCKETS.
+
+        Returns
+        -------
+        histogram : Histogram
+            Histogram of that name.
+
+        """
+
+        return self.__add(Histogram(name, help, label_names, buckets))
+
+
+    def gauge(self, name, help, function, label_names=()):
+        """Adds a gauge, or returns the one of that name.
+
+        Parameters
+        ----------
+        name : str
+            Name of the metric.
+
+        help : str
+            Description of the metric.
+
+        function : callable
+            Returns the value of every set of labels, with the label values
+            as key.
+
+        label_names : tuple
+            Names of the labels of the metric. Defaults to no labels.
+
+        Returns
+        -------
+        gauge : Gauge
+            Gauge of that name.
+
+        """
+
+        return self.__add(Gauge(name, help, function, label_names))
+
+
+    def export(self):
+        """Returns every metric in the Prometheus text format.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        text : str
+            HELP and TYPE lines of every metric, followed by its samples.
+
+        """
+
+        with self.lock:
+            metrics = list(self.metrics.values())
+
+        lines = []
+        for metric in metrics:
+            lines.append("# HELP " + metric.name + " " +
+                metric.help.replace("\\", "\\\\").replace("\n", "\\n"))
+            lines.append("# TYPE " + metric.name + " " + metric.TYPE)
+            lines.extend(metric.samples())
+
+        return "\n".join(lines) + "\n"
+
+
+    def serve(self, port=0, host="127.0.0.1"):
+        """Serves the metrics over HTTP on a background thread, exported
+        afresh on every request, for a Prometheus server to scrape.
+
+        Parameters
+        ----------
+        port : int
+            Port to listen on. Defaults to 0, for any free port.
+
+        host : str
+            Address to listen on. Defaults to the local machine only.
+
+        Returns
+        -------
+        server : http.server.ThreadingHTTPServer
+            Server, with the port it listens on in server_address. Stop it
+            with its shutdown method.
+
+        """
+
+        server = http.server.ThreadingHTTPServer((host, port),
+            MetricsHandler)
+        server.daemon_threads = True
+        server.registry = self
+
+        thread = threading.Thread(target=server.serve_forever,
+            name="metrics", daemon=True)
+        thread.start()
+
+        return server
+
+
+class MetricsHandler(http.server.BaseHTTPRequestHandler):
+    """ Class for answering the requests of a metrics server, with the
+    metrics of its registry at /metrics.
+    """
+
+
+    def do_GET(self):
+        """Answers a GET request with the metrics, or not found.
+        """
+
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+
+        body = self.server.registry.export().encode("utf-8")
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; "+
+            "charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+    def log_message(self, format, *args):
+        """Keeps requests out of standard error.
+        """
+
+        return
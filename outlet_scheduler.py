@@ -0,0 +1,387 @@
+# Outlet scheduler for the Coffee Machine. Holds the bounded line of orders
+# that the outlet workers pull from, hands the next order to an outlet the
+# moment one frees up, and keeps counters on how long orders had to wait.
+
+import heapq
+import itertools
+import threading
+
+from clock import RealClock
+
+class OutletScheduler:
+    """ Class for handing out orders to the outlets of a coffee machine.
+    Orders wait in a bounded line, and are picked up by the outlet workers.
+    Built on a condition variable, so a worker is woken up as soon as an
+    order arrives, and a producer as soon as there is room in the line,
+    instead of polling.
+
+    The line is a heap. With the "fifo" policy, orders are handed out in
+    the order they arrived. With the "priority" policy, every order is
+    given a due time when it arrives, which is its deadline if it has one,
+    and aging seconds after it arrived otherwise, moved earlier by aging
+    seconds for every level of priority. The order due first is handed out
+    first. This serves orders by earliest deadline and by priority, while
+    an order of low priority only waits for orders of higher priority that
+    arrive less than aging seconds per level after it, so it never starves.
+
+    Attributes
+    ----------
+
+    num_outlets : int
+        Number of outlets taking orders from the line.
+
+    max_queued : int
+        Maximum number of orders that can wait in the line. Adding to a
+        full line blocks until an outlet picks up an order.
+
+    policy : str
+        Order orders are handed out in, "fifo" or "priority".
+
+    aging : float
+        Seconds of waiting worth one level of priority, and how long an
+        order without a deadline is given, with the "priority" policy.
+
+    clock : object
+        Clock arrival and wait times are read from.
+
+    closed : bool
+        Whether the line has been closed, after which no orders are added.
+
+    busy : int
+        Number of outlets currently working on an order.
+
+    queue_depth : int
+        Number of orders currently waiting for an outlet.
+
+    max_queue_depth : int
+        Largest number of orders that were waiting at the same time.
+
+    admitted : int
+        Number of orders that have been given an outlet so far. Orders put
+        back are only counted the first time.
+
+    total_wait : float
+        Sum of the time (in seconds) orders spent waiting for an outlet
+        the first time.
+
+    max_wait : float
+        Longest time (in seconds) a single order waited for an outlet the
+        first time.
+
+    missed_deadlines : int
+        Number of orders given an outlet after their deadline.
+
+    """
+
+    # known policies
+    POLICIES = ("fifo", "priority")
+
+
+    def __init__(self, num_outlets=1, max_queued=None, policy="fifo",
+        aging=30, clock=None):
+        """Initializes the OutletScheduler class.
+
+        Parameters
+        ----------
+
+        num_outlets : int
+            Number of outlets taking orders from the line.
+
+        max_queued : int
+            Maximum number of orders that can wait in the line. Defaults
+            to twice the number of outlets.
+
+        policy : str
+            Order orders are handed out in, "fifo" or "priority".
+
+        aging : float
+            Seconds of waiting worth one level of priority, and how long
+            an order without a deadline is given, with the "priority"
+            policy.
+
+        clock : object
+            Clock to read arrival and wait times from. Defaults to real
+            time.
+
+        Returns
+        -------
+
+        """
+
+        if not isinstance(num_outlets, int):
+            raise ValueError("Number of outlets is not an integer.")
+
+        if num_outlets <= 0:
+            raise ValueError("Number of outlets must be more than 0.")
+
+        if max_queued is None:
+            max_queued = 2 * num_outlets
+
+        if not isinstance(max_queued, int):
+            raise ValueError("Maximum queue size is not an integer.")
+
+        if max_queued <= 0:
+            raise ValueError("Maximum queue size must be more than 0.")
+
+        if policy not in self.POLICIES:
+            raise ValueError("Scheduling policy is not known.")
+
+        if not isinstance(aging, (int, float)) or aging <= 0:
+            raise ValueError("Aging must be a number more than 0.")
+
+        if clock is None:
+            clock = RealClock()
+
+        self.num_outlets = num_outlets
+        self.max_queued = max_queued
+        self.policy = policy
+        self.aging = aging
+        self.clock = clock
+        self.closed = False
+
+        # condition guarding the line and every counter below
+        self.condition = threading.Condition()
+
+        # heap of (due time, arrival number, arrival time, deadline time,
+        # order), where the arrival number breaks ties first come first
+        # served
+        self.line = []
+        self.arrivals = itertools.count()
+
+        self.busy = 0
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+        self.admitted = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.missed_deadlines = 0
+
+
+    def put(self, order, priority=0, deadline=None):
+        """Adds an order to the line. Blocks while the line is full, which
+        keeps the producer from running ahead of the outlets.
+
+        Parameters
+        ----------
+        order : object
+            Order to be handed to an outlet worker. Cannot be None.
+
+        priority : int
+            Priority of the order, higher is served sooner.
+
+        deadline : float
+            Seconds after arriving the order should get an outlet by, if
+            any.
+
+        Returns
+        -------
+
+        """
+
+        if order is None:
+            raise ValueError("Cannot schedule an empty order.")
+
+        if not isinstance(priority, int):
+            raise ValueError("Priority of order is not an integer.")
+
+        if deadline is not None and (not isinstance(deadline, (int, float))
+            or deadline < 0):
+            raise ValueError("Deadline of order is not a number of at "+
+                "least 0.")
+
+        # the wait of an order counts from when it arrives, even if the
+        # line is full at that time
+        arrived_at = self.clock.now()
+
+        deadline_at = None
+        if deadline is not None:
+            deadline_at = arrived_at + deadline
+
+        # the due time is fixed on arrival, so the heap never needs to be
+        # reordered as orders age
+        if self.policy == "fifo":
+            due_at = 0
+        elif deadline_at is not None:
+            due_at = deadline_at - priority * self.aging
+        else:
+            due_at = arrived_at + (1 - priority) * self.aging
+
+        with self.condition:
+            while len(self.line) >= self.max_queued and not self.closed:
+                self.condition.wait()
+
+            if self.closed:
+                raise ValueError("Scheduler is closed, cannot add orders.")
+
+            heapq.heappush(self.line, (due_at, next(self.arrivals),
+                arrived_at, deadline_at, order))
+            self.queue_depth = len(self.line)
+            self.max_queue_depth = max(self.max_queue_depth,
+                self.queue_depth)
+
+            self.condition.notify_all()
+
+
+    def putBack(self, order):
+        """Puts an order an outlet gave back at the front of the line,
+        such as a drink that waited for a refill. Never blocks, since the
+        order had its place in the line already, and takes no new
+        deadline.
+
+        Parameters
+        ----------
+        order : object
+            Order to be handed to an outlet worker again. Cannot be None.
+
+        Returns
+        -------
+
+        """
+
+        if order is None:
+            raise ValueError("Cannot schedule an empty order.")
+
+        with self.condition:
+            heapq.heappush(self.line, (float("-inf"), next(self.arrivals),
+                self.clock.now(), None, order))
+            self.queue_depth = len(self.line)
+            self.max_queue_depth = max(self.max_queue_depth,
+                self.queue_depth)
+
+            self.condition.notify_all()
+
+
+    def get(self):
+        """Blocks until an order is waiting, then takes it off the line and
+        marks an outlet as busy with it. Called by the outlet workers.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        order : object
+            The next order, or None once the scheduler has been closed and
+            every waiting order has been handed out.
+
+        """
+
+        with self.condition:
+            while not self.line and not self.closed:
+                self.condition.wait()
+
+            if not self.line:
+                return None
+
+            due_at, number, arrived_at, deadline_at, order = heapq.heappop(
+                self.line)
+            self.queue_depth = len(self.line)
+            self.busy += 1
+
+            now = self.clock.now()
+            wait = now - arrived_at
+
+            # orders put back sit at the very front, and were admitted
+            # once already, with the wait they had then
+            if due_at != float("-inf"):
+                self.admitted += 1
+                self.total_wait += wait
+                self.max_wait = max(self.max_wait, wait)
+
+                if deadline_at is not None and now > deadline_at:
+                    self.missed_deadlines += 1
+
+            # there is room in the line again
+            self.condition.notify_all()
+
+        return order
+
+
+    def full(self):
+        """Returns whether the line is full, so adding an order would
+        block.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        full : bool
+            Whether the line is full.
+
+        """
+
+        with self.condition:
+            return len(self.line) >= self.max_queued
+
+
+    def release(self):
+        """Marks an outlet as done with its order.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+
+        """
+
+        with self.condition:
+            if self.busy <= 0:
+                raise ValueError("No outlet is in use, cannot release.")
+
+            self.busy -= 1
+
+
+    def close(self):
+        """Closes the line. Orders already waiting are still handed out,
+        after which get returns None to every outlet worker.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+
+        """
+
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+
+    def stats(self):
+        """Returns a consistent copy of the scheduler counters.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        stats : dict
+            Dict with the counters listed in the class attributes, along
+            with the mean wait per admitted order.
+
+        """
+
+        with self.condition:
+            if self.admitted > 0:
+                mean_wait = self.total_wait / self.admitted
+            else:
+                mean_wait = 0.0
+
+            return {
+                "busy": self.busy,
+                "queue_depth": self.queue_depth,
+                "max_queue_depth": self.max_queue_depth,
+                "admitted": self.admitted,
+                "total_wait": self.total_wait,
+                "max_wait": self.max_wait,
+                "mean_wait": mean_wait,
+                "missed_deadlines": self.missed_deadlines,
+            }
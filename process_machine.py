@@ -0,0 +1,499 @@
+# Process-based backend for the Coffee Machine. Outlets run as separate
+# processes instead of threads, so making drinks is not held to one core by
+# the interpreter lock. The levels live in shared memory, guarded by locks
+# that work across processes, and the recipes are compiled once by the
+# machine and handed to every process when it starts, to be read only.
+
+import multiprocessing
+import queue
+import threading
+import time
+import types
+
+from coffee_machine import CoffeeMachine, OrderResult, iterOrders
+from shared_inventory import SharedInventory
+
+def outletProcess(inventory, recipes, refill, tasks, results):
+    """Runs an outlet process. Takes chunks of drinks off the task queue
+    until it gets None, makes each drink out of the shared inventory, and
+    puts the outcome of every chunk on the result queue.
+
+    Parameters
+    ----------
+    inventory : SharedInventory
+        Levels shared with the other outlets.
+
+    recipes : dict
+        Ingredient IDs, compiled recipe and pour time of each drink that
+        can be made, with drink name as key.
+
+    refill : bool
+        Whether ingredients that are not sufficient are refilled by the
+        missing amount, as with the "auto" refill policy.
+
+    tasks : multiprocessing.Queue
+        Chunks of drinks to make, each a list of pairs of position and
+        drink name.
+
+    results : multiprocessing.Queue
+        Outcome of every chunk, a list of the position, whether the drink
+        was made, the shortfall, and the times it started and finished of
+        each drink, or the error that stopped the chunk.
+
+    Returns
+    -------
+
+    """
+
+    try:
+        while True:
+            chunk = tasks.get()
+
+            if chunk is None:
+                return
+
+            try:
+                outcomes = []
+                for position, drink_name in chunk:
+                    ids, vector, pour_time = recipes[drink_name]
+
+                    started_at = time.monotonic()
+                    taken, shortfall = inventory.take(ids, vector, refill)
+
+                    # the ingredients are out of the levels, so the pour
+                    # holds no lock
+                    if taken and pour_time > 0:
+                        time.sleep(pour_time)
+
+                    outcomes.append((position, taken, shortfall, started_at,
+                        time.monotonic()))
+
+                results.put(outcomes)
+            except Exception as error:
+                results.put(error)
+    finally:
+        inventory.close()
+
+
+class ProcessMachine:
+    """ Class for making the orders of a coffee machine on outlet
+    processes. Every outlet is a process of its own, making one drink at a
+    time, and the processes share the levels of the machine in shared
+    memory.
+
+    The levels are copied from the snapshot of the machine when the class
+    is made, and kept in the shared inventory from then on, so the machine
+    should only be used through this class until it is closed. They are
+    copied back to the machine whenever the outlet processes are shut
+    down. Drinks are handed to the outlets in chunks, to make fewer trips
+    between processes. The ingredients of a drink are taken out before it
+    pours, and are not held locked while it pours. Events are not emitted,
+    stock is not tracked, and the metrics of the machine are not recorded.
+    If an outlet process exits while drinks are handed to it, the order
+    fails and every outlet process is shut down.
+
+    Attributes
+    ----------
+
+    machine : CoffeeMachine
+        Machine whose recipes, pour times and refill policy are used.
+
+    num_processes : int
+        Number of outlet processes.
+
+    chunk_size : int
+        Largest number of drinks handed to an outlet at once.
+
+    recipes : dict
+        Ingredient IDs, compiled recipe and pour time of each drink that
+        can be made, with drink name as key.
+
+    inventory : SharedInventory
+        Levels shared with the outlet processes.
+
+    processes : list
+        Outlet processes, while started.
+
+    """
+
+    # seconds between checks that the outlet processes are still running,
+    # while waiting for the drinks of an order
+    POLL_INTERVAL = 0.1
+
+    def __init__(self, machine, num_processes=None, chunk_size=16,
+        context=None):
+        """Initializes the ProcessMachine class.
+
+        Parameters
+        ----------
+
+        machine : CoffeeMachine
+            Machine to make the orders of, on a real clock, with the
+            "auto" or "reject" refill policy.
+
+        num_processes : int
+            Number of outlet processes. Defaults to the number of outlets
+            of the machine. Up to one per core runs at once.
+
+        chunk_size : int
+            Largest number of drinks handed to an outlet at once. Larger
+            chunks make fewer trips between processes, smaller ones spread
+            short orders across more outlets. Defaults to 16.
+
+        context : object
+            Multiprocessing context to start the processes with, such as
+            multiprocessing.get_context("spawn"). Defaults to the default
+            context.
+
+        Returns
+        -------
+
+        """
+
+        if not isinstance(machine, CoffeeMachine):
+            raise ValueError("Machine is not a CoffeeMachine.")
+
+        if machine.clock.virtual:
+            raise ValueError("Outlet processes cannot run on a virtual "+
+                "clock.")
+
+        if machine.refill_policy == "wait":
+            raise ValueError("Outlet processes cannot wait for refills.")
+
+        # drinks taken out of the shared inventory are never logged
+        if machine.wal is not None:
+            raise ValueError("Outlet processes cannot keep a write-ahead "+
+                "log.")
+
+        if num_processes is None:
+            num_processes = machine.num_outlets
+
+        if not isinstance(num_processes, int) or num_processes <= 0:
+            raise ValueError("Number of processes is not an integer more "+
+                "than 0.")
+
+        if not isinstance(chunk_size, int) or chunk_size <= 0:
+            raise ValueError("Chunk size is not an integer more than 0.")
+
+        if context is None:
+            context = multiprocessing.get_context()
+
+        self.machine = machine
+        self.num_processes = num_processes
+        self.chunk_size = chunk_size
+        self.context = context
+
+        # every ingredient of a recipe is locked, in ingredient ID order
+        self.recipes = {}
+        for drink in machine.recipe_vectors:
+            self.recipes[drink] = (tuple(sorted(set(
+                machine.recipe_ids[drink]))), machine.recipe_vectors[drink],
+                machine.pour_times.get(drink, machine.pour_time))
+
+        self.inventory = SharedInventory(machine.snapshots.read()[1],
+            context)
+
+        self.processes = []
+        self.tasks = None
+        self.results = None
+
+        # orders are made one at a time, as they share the task queue
+        self.lock = threading.Lock()
+
+
+    @property
+    def raw_material_qty(self):
+        """Quantity of raw material in the shared inventory. Read-only
+        dictionary with ingredient as key, and current amount as value.
+        """
+
+        return types.MappingProxyType(dict(zip(self.machine.ingredients,
+            self.inventory.levels())))
+
+
+    def refill(self, ingredient, qty):
+        """ Method to refill certain ingredient by given amount, while the
+        outlets keep pouring.
+
+        Parameters
+        ----------
+
+        ingredient : str
+            Name of ingredient to be refilled
+
+        qty : int
+            Quantity to be added
+
+        Returns
+        -------
+
+        """
+
+        # type checks
+        if not isinstance(ingredient, str):
+            raise ValueError("Ingredient is not a string.")
+
+        if not isinstance(qty, int):
+            raise ValueError("Quantity is not an integer.")
+
+        # check if ingredient found in dictionary
+        if ingredient not in self.machine.ingredient_ids:
+            raise ValueError("Ingredient not in coffee machine.")
+
+        self.inventory.add(self.machine.ingredient_ids[ingredient], qty)
+
+
+    def start(self):
+        """Starts the outlet processes. Orders made while started all run
+        on these processes.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+
+        """
+
+        if self.processes:
+            raise ValueError("Outlet processes are already started.")
+
+        if self.inventory.array is None:
+            raise ValueError("Outlet processes are closed.")
+
+        self.tasks = self.context.Queue()
+        self.results = self.context.Queue()
+
+        for i in range(self.num_processes):
+            process = self.context.Process(target=outletProcess,
+                args=(self.inventory, self.recipes,
+                self.machine.refill_policy == "auto", self.tasks,
+                self.results), name="outlet-" + str(i), daemon=True)
+            self.processes.append(process)
+            process.start()
+
+
+    def shutdown(self):
+        """Stops the outlet processes, once they are done with the drinks
+        handed to them, and copies the shared levels back to the machine.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+
+        """
+
+        for process in self.processes:
+            self.tasks.put(None)
+
+        for process in self.processes:
+            process.join()
+
+        self.processes = []
+
+        # publish the levels on the machine, as refills, so its snapshot
+        # and menu index follow them too
+        if self.inventory.array is not None:
+            for ingredient, level, shared in zip(self.machine.ingredients,
+                self.machine.snapshots.read()[1], self.inventory.levels()):
+                if shared != level:
+                    self.machine.refill(ingredient, shared - level)
+
+
+    def close(self):
+        """Stops the outlet processes, copies the shared levels back to
+        the machine and frees the shared inventory. The class cannot make
+        orders afterwards.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+
+        """
+
+        self.shutdown()
+        self.inventory.unlink()
+
+
+    def makeOrder(self, orders=[]):
+        """Class method exposed to the user. Makes 'n' drinks on the outlet
+        processes. If the processes were not started, they are started for
+        this order and shut down after.
+
+        Parameters
+        ----------
+        orders : iterable
+            User requested drinks, as names or as Order.
+
+        Returns
+        -------
+        results : list
+            Result of every drink, as an OrderResult, in order.
+
+        """
+
+        with self.lock:
+            queued_at = time.monotonic()
+            drinks = [order.drink_name for order in iterOrders(orders,
+                self.machine.beverages)]
+
+            results = [None] * len(drinks)
+            chunks = []
+
+            # drinks the machine lacks an ingredient of never reach an
+            # outlet
+            for position in range(len(drinks)):
+                drink_name = drinks[position]
+
+                if drink_name not in self.recipes:
+                    results[position] = OrderResult(position, drink_name, -1,
+                        {}, {}, list(self.machine.missing_ingredients[
+                        drink_name]), 0.0, 0.0)
+                    continue
+
+                if not chunks or len(chunks[-1]) == self.__chunkSize(
+                    len(drinks)):
+                    chunks.append([])
+
+                chunks[-1].append((position, drink_name))
+
+            if not chunks:
+                return results
+
+            started = not self.processes
+            if started:
+                self.start()
+
+            try:
+                for chunk in chunks:
+                    self.tasks.put(chunk)
+
+                # every chunk is waited on, even after an error, so none
+                # is left on the queue for the next order
+                errors = []
+                for i in range(len(chunks)):
+                    outcomes = self.__nextOutcomes()
+
+                    if isinstance(outcomes, Exception):
+                        errors.append(outcomes)
+                        continue
+
+                    for outcome in outcomes:
+                        position = outcome[0]
+                        results[position] = self.__buildResult(position,
+                            drinks[position], outcome, queued_at)
+
+                if errors:
+                    raise errors[0]
+            finally:
+                if started:
+                    self.shutdown()
+
+            return results
+
+
+    def __nextOutcomes(self):
+        """Method to wait for the outcome of the next chunk, checking every
+        so often that no outlet process has exited meanwhile, since the
+        chunk of a process that exits never comes back.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        outcomes : object
+            Outcome of the chunk, as put on the result queue.
+
+        """
+
+        while True:
+            try:
+                return self.results.get(timeout=self.POLL_INTERVAL)
+            except queue.Empty:
+                pass
+
+            exited = [process.name for process in self.processes
+                if not process.is_alive()]
+
+            if exited:
+                # the others are stopped too, once done with their
+                # chunks, so the next order starts on fresh processes
+                self.shutdown()
+                raise ValueError("Outlet process " + exited[0] + " exited "+
+                    "before its drinks were done.")
+
+
+    def __chunkSize(self, num_drinks):
+        """Method to work out how many drinks to hand to an outlet at once,
+        so a short order is still spread across every outlet.
+
+        Parameters
+        ----------
+        num_drinks : int
+            Number of drinks of the order.
+
+        Returns
+        -------
+        chunk_size : int
+            Number of drinks per chunk.
+
+        """
+
+        return max(1, min(self.chunk_size, num_drinks // self.num_processes))
+
+
+    def __buildResult(self, position, drink_name, outcome, queued_at):
+        """Method to build the result of a drink from its outcome on an
+        outlet process.
+
+        Parameters
+        ----------
+        position : int
+            Position of the drink in the order list.
+
+        drink_name : str
+            String of drink name.
+
+        outcome : tuple
+            Position, whether the drink was made, shortfall by ingredient
+            ID, and the times the drink started and finished.
+
+        queued_at : float
+            Time the order was given.
+
+        Returns
+        -------
+        result : OrderResult
+            Result of the drink.
+
+        """
+
+        position, taken, shortfall, started_at, finished_at = outcome
+        ingredients = self.machine.ingredients
+
+        shortfall = {ingredients[i]: shortfall[i]
+            for i in self.machine.recipe_ids[drink_name] if i in shortfall}
+
+        # short ingredients are refilled by what is missing, if the drink
+        # was made
+        if taken:
+            refilled = dict(shortfall)
+        else:
+            refilled = {}
+
+        if shortfall:
+            status = 0
+        else:
+            status = 1
+
+        return OrderResult(position, drink_name, status, shortfall, refilled,
+            [], started_at - queued_at, finished_at - started_at)
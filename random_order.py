@@ -1,27 +1,54 @@
 import json
 import random
 
-random.seed(696969)
+# Seed the orders are generated with, so runs can be repeated
+SEED = 696969
 
-# load data from the sample JSON file
-input_file = open("test_data/standard_input.json")
-data = json.load(input_file)
+def generateOrders(menu, num_orders, seed=SEED):
+    """Generates a list of orders, picking drinks from the menu at random.
 
-# assign data to lists and dicts pass to coffee machine
-beverages = data['machine']['beverages']
-menu = list(beverages.keys())
+    Parameters
+    ----------
+    menu : list
+        Names of the drinks to pick from.
 
-# Number ot orders to be generated
-NUM_ORDERS = 100
-n = len(menu) - 1
+    num_orders : int
+        Number of orders to be generated.
 
-# write to file
-filename = "test_data/temp_orders.txt"
-f = open(filename, "a")
+    seed : int
+        Seed of the random number generator.
 
-for i in range(NUM_ORDERS):
-	idx = random.randint(0, n)
-	f.write(menu[idx])
-	f.write("\n")
+    Returns
+    -------
+    orders : list
+        List of drink names.
 
-f.close()
+    """
+
+    rng = random.Random(seed)
+    n = len(menu) - 1
+
+    return [menu[rng.randint(0, n)] for i in range(num_orders)]
+
+
+if __name__ == "__main__":
+    # load data from the sample JSON file
+    input_file = open("test_data/standard_input.json")
+    data = json.load(input_file)
+
+    # assign data to lists and dicts pass to coffee machine
+    beverages = data['machine']['beverages']
+    menu = list(beverages.keys())
+
+    # Number ot orders to be generated
+    NUM_ORDERS = 100
+
+    # write to file
+    filename = "test_data/temp_orders.txt"
+    f = open(filename, "a")
+
+    for drink in generateOrders(menu, NUM_ORDERS):
+        f.write(drink)
+        f.write("\n")
+
+    f.close()
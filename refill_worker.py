@@ -0,0 +1,352 @@
+# Refill worker for the Coffee Machine. Refills are asked for by the outlets
+# and carried out one after another by a worker of their own, each taking
+# the time the latency model gives it, so an outlet never waits on a refill
+# and keeps serving other drinks meanwhile.
+#
+# On a real clock the worker is a background thread. On a virtual clock the
+# refills are scheduled on the clock instead, and land as it moves past them.
+
+import queue
+import threading
+
+from clock import RealClock
+
+class RefillWorker:
+    """ Class for refilling the ingredients of a coffee machine away from
+    the outlets. Each refill takes delay seconds, plus a second for every
+    rate units refilled if a rate is given, and starts once the refill
+    before it is done.
+
+    Attributes
+    ----------
+
+    refill : callable
+        Called with an ingredient and a quantity to add it to the machine.
+
+    delay : float
+        Seconds every refill takes, however much it adds.
+
+    rate : float
+        Units refilled per second on top of the delay, or None if the
+        amount makes no difference.
+
+    clock : object
+        Clock the refills wait on.
+
+    queue : queue.Queue
+        Refills asked for but not yet started, on a real clock.
+
+    thread : threading.Thread
+        Background thread carrying out refills, started on the first one.
+
+    free_at : float
+        Time the last refill asked for is done, on a virtual clock.
+
+    requested : int
+        Number of refills asked for so far.
+
+    delivered : int
+        Number of refills done so far.
+
+    pending : int
+        Number of refills asked for but not yet done.
+
+    failed : int
+        Number of refills that raised an error. Their actions still run,
+        so nothing is left waiting on them.
+
+    quantities : dict
+        Total quantity refilled so far of each ingredient.
+
+    """
+
+
+    def __init__(self, refill, delay=0, rate=None, clock=None):
+        """Initializes the RefillWorker class.
+
+        Parameters
+        ----------
+
+        refill : callable
+            Called with an ingredient and a quantity to add it to the
+            machine, such as the refill method of a CoffeeMachine.
+
+        delay : float
+            Seconds every refill takes. Defaults to 0.
+
+        rate : float
+            Units refilled per second on top of the delay. Defaults to
+            None, for refills that take the same time whatever they add.
+
+        clock : object
+            Clock to wait on. Defaults to real time.
+
+        Returns
+        -------
+
+        """
+
+        if not callable(refill):
+            raise ValueError("Refill is not callable.")
+
+        if not isinstance(delay, (int, float)) or delay < 0:
+            raise ValueError("Refill delay is not a number of at least 0.")
+
+        if rate is not None and (not isinstance(rate, (int, float)) or
+            rate <= 0):
+            raise ValueError("Refill rate must be a number more than 0.")
+
+        if clock is None:
+            clock = RealClock()
+
+        self.refill = refill
+        self.delay = delay
+        self.rate = rate
+        self.clock = clock
+
+        self.queue = queue.Queue()
+        self.thread = None
+        self.thread_lock = threading.Lock()
+        self.free_at = clock.now()
+
+        # lock guarding every counter below
+        self.lock = threading.Lock()
+
+        self.requested = 0
+        self.delivered = 0
+        self.pending = 0
+        self.failed = 0
+        self.quantities = {}
+
+
+    def latency(self, quantities):
+        """Returns the time a refill takes, by the latency model.
+
+        Parameters
+        ----------
+        quantities : dict
+            Quantity to refill of each ingredient.
+
+        Returns
+        -------
+        seconds : float
+            Seconds the refill takes.
+
+        """
+
+        if self.rate is None:
+            return self.delay
+
+        return self.delay + sum(quantities.values()) / self.rate
+
+
+    def request(self, quantities, action=None, *args, on_error=None):
+        """Asks for a refill. Never waits on it.
+
+        Parameters
+        ----------
+        quantities : dict
+            Quantity to refill of each ingredient.
+
+        action : callable
+            Called with args once the refill is done, or has failed, if
+            given.
+
+        args : tuple
+            Arguments of the action.
+
+        on_error : callable
+            Called with the error if the refill fails, before the action,
+            if given.
+
+        Returns
+        -------
+
+        """
+
+        if not isinstance(quantities, dict):
+            raise ValueError("Refill quantities are not a dict.")
+
+        with self.lock:
+            self.requested += 1
+            self.pending += 1
+
+        # refills land one after another, as the clock passes them
+        if self.clock.virtual:
+            with self.lock:
+                started_at = max(self.clock.now(), self.free_at)
+                self.free_at = started_at + self.latency(quantities)
+
+            self.clock.schedule(self.free_at, self.__deliver, quantities,
+                action, args, on_error)
+            return
+
+        if self.thread is None:
+            self.__startThread()
+
+        self.queue.put((quantities, action, args, on_error))
+
+
+    def __startThread(self):
+        """Method to start the background thread, if no other caller has
+        started it already.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+
+        """
+
+        with self.thread_lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.__drain,
+                    name="refill-worker", daemon=True)
+                self.thread.start()
+
+
+    def __drain(self):
+        """Method run by the background thread. Carries out refills in the
+        order they were asked for, until it gets None.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+
+        """
+
+        while True:
+            request = self.queue.get()
+
+            try:
+                if request is None:
+                    return
+
+                quantities, action, args, on_error = request
+
+                self.clock.sleep(self.latency(quantities))
+                self.__deliver(quantities, action, args, on_error)
+            finally:
+                self.queue.task_done()
+
+
+    def __deliver(self, quantities, action, args, on_error):
+        """Method to add a refill to the machine once it is done, and run
+        its action.
+
+        Parameters
+        ----------
+        quantities : dict
+            Quantity to refill of each ingredient.
+
+        action : callable
+            Called with args once the refill is added or has failed, if
+            given.
+
+        args : tuple
+            Arguments of the action.
+
+        on_error : callable
+            Called with the error if the refill fails, if given.
+
+        Returns
+        -------
+
+        """
+
+        try:
+            for ingredient in quantities:
+                self.refill(ingredient, quantities[ingredient])
+
+            with self.lock:
+                self.delivered += 1
+                for ingredient in quantities:
+                    self.quantities[ingredient] = (self.quantities.get(
+                        ingredient, 0) + quantities[ingredient])
+        except Exception as error:
+            # a broken refill must not stop the worker, or flush would hang
+            with self.lock:
+                self.failed += 1
+
+            if on_error is not None:
+                on_error(error)
+
+        # whatever waits on the refill is handed back either way, so it is
+        # never left waiting
+        try:
+            if action is not None:
+                action(*args)
+        except Exception:
+            with self.lock:
+                self.failed += 1
+        finally:
+            with self.lock:
+                self.pending -= 1
+
+
+    def flush(self):
+        """Blocks until every refill asked for so far is done, on a real
+        clock. On a virtual clock refills are only done as the clock moves
+        past them.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+
+        """
+
+        self.queue.join()
+
+
+    def close(self):
+        """Carries out every waiting refill and stops the background
+        thread. It is started again if another refill is asked for.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+
+        """
+
+        with self.thread_lock:
+            if self.thread is None:
+                return
+
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+
+
+    def stats(self):
+        """Returns a consistent copy of the refill counters.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        stats : dict
+            Dict with the counters listed in the class attributes.
+
+        """
+
+        with self.lock:
+            return {
+                "requested": self.requested,
+                "delivered": self.delivered,
+                "pending": self.pending,
+                "failed": self.failed,
+                "quantities": dict(self.quantities),
+            }
@@ -1,29 +1,17 @@
-from coffee_machine import CoffeeMachine
-import json
+from machine_config import cachedConfig
 
-# load data from the sample JSON file
-input_file = open("test_data/standard_input.json")
-data = json.load(input_file)
-
-# assign data to lists and dicts pass to coffee machine
-num_outlets = data['machine']['outlets']['count_n']
-beverages = data['machine']['beverages']
-total_items_qty = data['machine']['total_items_quantity']
+# load data from the sample JSON file, checked and compiled on the first
+# run, and from test_data/standard_input.cmcf until the file changes
+config = cachedConfig("test_data/standard_input.json")
 
 # orders = ['hot_tea', 'black_tea', 'green_tea', 'hot_coffee']
 # orders = ['hot_tea', 'hot_tea','hot_tea', 'hot_tea']
 
-# Read orders from file
+# Orders are read from file one line at a time, as the outlets take them
 filename = "test_data/temp_orders.txt"
-f = open(filename, "r")
-orders = f.readlines()
-
-# Remove line breaks from orders
-for i in range(len(orders)):
-    orders[i] = orders[i][:-1]
 
 # Instantiate the Coffee Machine
-CM = CoffeeMachine(num_outlets, beverages, total_items_qty)
+CM = config.machine()
 
 # Check the menu of the coffee machine
 menu = CM.menu
@@ -41,7 +29,8 @@ print("-------------------------------------------------")
 # for element in menu:
 #   CM.makeDrink(element)
 
-CM.makeOrder(orders)
+with open(filename, "r") as orders:
+    CM.makeOrder(orders)
 
 print("-------------------------------------------------")
 print()
\ No newline at end of file
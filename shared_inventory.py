@@ -0,0 +1,256 @@
+# Shared inventory for the Coffee Machine. Ingredient levels are kept in a
+# block of shared memory as an array of integers, with one lock per
+# ingredient that works across processes, so outlets running as separate
+# processes take drinks out of the same stock.
+
+import multiprocessing
+from multiprocessing import resource_tracker, shared_memory
+
+class SharedInventory:
+    """ Class for ingredient levels shared between processes. Each level is
+    a signed 64-bit integer in shared memory, indexed by ingredient ID. A
+    drink locks the ingredients it uses, in ingredient ID order so two
+    processes never end up waiting on each other in a cycle, and is checked
+    and taken out while they are held.
+
+    The inventory is handed to a process as an argument of the process,
+    which attaches to the same block of memory and the same locks. The
+    process that created it frees the memory with unlink, once every
+    process is done with it.
+
+    Attributes
+    ----------
+
+    size : int
+        Number of ingredients.
+
+    memory : shared_memory.SharedMemory
+        Block of shared memory the levels are kept in.
+
+    array : memoryview
+        Levels, as a view of the memory indexed by ingredient ID.
+
+    locks : list
+        Lock of each ingredient, indexed by ingredient ID.
+
+    owner : bool
+        Whether this process created the memory, and frees it.
+
+    """
+
+
+    def __init__(self, levels=(), context=None):
+        """Initializes the SharedInventory class.
+
+        Parameters
+        ----------
+
+        levels : tuple
+            Starting quantity of each ingredient.
+
+        context : object
+            Multiprocessing context the locks are made for. Defaults to
+            the default context.
+
+        Returns
+        -------
+
+        """
+
+        if not isinstance(levels, tuple):
+            raise ValueError("Levels are not a tuple.")
+
+        for amount in levels:
+            if not isinstance(amount, int):
+                raise ValueError("Level is not an integer.")
+
+        if context is None:
+            context = multiprocessing.get_context()
+
+        self.size = len(levels)
+
+        # shared memory cannot be empty, so a machine with no ingredients
+        # still gets one unused slot
+        self.memory = shared_memory.SharedMemory(create=True,
+            size=8 * max(self.size, 1))
+        self.array = self.memory.buf.cast("q")
+        for i in range(self.size):
+            self.array[i] = levels[i]
+
+        self.locks = [context.Lock() for i in range(self.size)]
+        self.owner = True
+
+
+    def __getstate__(self):
+        """Method to pass the inventory to another process, by the name of
+        its memory and its locks.
+        """
+
+        return (self.memory.name, self.size, self.locks)
+
+
+    def __setstate__(self, state):
+        """Method to attach to the inventory in another process.
+        """
+
+        name, self.size, self.locks = state
+
+        self.memory = shared_memory.SharedMemory(name=name)
+        self.array = self.memory.buf.cast("q")
+        self.owner = False
+
+        # only the process that created the memory frees it, so the
+        # tracker of this process must not free it when it exits
+        resource_tracker.unregister(self.memory._name, "shared_memory")
+
+
+    def levels(self):
+        """Returns the current levels of all ingredients. Takes no lock, so
+        levels being changed by a drink meanwhile may show part of it.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        levels : tuple
+            Quantity of each ingredient, indexed by ingredient ID.
+
+        """
+
+        return tuple(self.array[:self.size])
+
+
+    def take(self, ids, vector, refill=False):
+        """Takes the ingredients of a drink out of the levels, while their
+        locks are held. Ingredients that are not sufficient are refilled by
+        the missing amount first if refill is set, and the drink is not
+        taken otherwise.
+
+        Parameters
+        ----------
+        ids : tuple
+            Ingredient IDs the drink uses, in ingredient ID order.
+
+        vector : tuple
+            Quantity of each ingredient the drink uses, indexed by
+            ingredient ID.
+
+        refill : bool
+            Whether to refill the ingredients that are not sufficient.
+            Defaults to False.
+
+        Returns
+        -------
+        taken : bool
+            Whether the drink was taken out of the levels.
+
+        shortfall : dict
+            Amount each ingredient that was not sufficient was short by,
+            with ingredient ID as key.
+
+        """
+
+        array = self.array
+
+        for i in ids:
+            self.locks[i].acquire()
+
+        try:
+            shortfall = {}
+            for i in ids:
+                if array[i] < vector[i]:
+                    shortfall[i] = vector[i] - array[i]
+
+            if shortfall and not refill:
+                return False, shortfall
+
+            # refilled ingredients are left empty by the drink
+            for i in ids:
+                array[i] = max(array[i], vector[i]) - vector[i]
+
+            return True, shortfall
+        finally:
+            for i in reversed(ids):
+                self.locks[i].release()
+
+
+    def add(self, i, qty):
+        """Adds to the level of an ingredient, while its lock is held.
+
+        Parameters
+        ----------
+        i : int
+            Ingredient ID.
+
+        qty : int
+            Quantity to add.
+
+        Returns
+        -------
+        level : int
+            Level of the ingredient after the change.
+
+        """
+
+        with self.locks[i]:
+            # refilling should not leave the ingredient negative
+            if self.array[i] + qty < 0:
+                raise ValueError("Cannot add because final quantity of "+
+                    "ingredient after refilling becomes negative")
+
+            self.array[i] += qty
+            return self.array[i]
+
+
+    def close(self):
+        """Detaches this process from the memory. The inventory cannot be
+        used in this process afterwards.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+
+        """
+
+        if self.array is None:
+            return
+
+        # the memory cannot be closed while a view of it is still open
+        self.array.release()
+        self.array = None
+        self.memory.close()
+
+
+    def __del__(self):
+        """Method to detach from the memory once the inventory is no
+        longer used, as the memory cannot be closed while the view of it is
+        open.
+        """
+
+        if getattr(self, "array", None) is not None:
+            self.close()
+
+
+    def unlink(self):
+        """Detaches this process from the memory and frees it, in the
+        process that created it. Other processes must be done with it.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+
+        """
+
+        self.close()
+
+        if self.owner:
+            self.memory.unlink()
+            self.owner = False
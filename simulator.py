@@ -0,0 +1,582 @@
+# Capacity simulator for the Coffee Machine. Answers how many outlets and
+# how much inventory an order mix needs, without making any drink. Orders
+# arrive over time, wait in line for the first free outlet, and take their
+# ingredients out of the levels when they start, as on the real machine.
+# The simulation runs on a virtual clock, so a day of orders takes
+# milliseconds.
+#
+# Run it on the sample config with :
+#     python3 simulator.py --rate 0.05 --duration 28800 --num-outlets 1 2 3
+# See --help for the other settings.
+
+import argparse
+import heapq
+import json
+import math
+import operator
+import random
+import sys
+
+from benchmark import percentile
+from clock import VirtualClock
+from coffee_machine import CoffeeMachine
+from event_log import NullSink
+from random_order import SEED
+
+def poissonArrivals(rate, duration, mix, seed=SEED):
+    """Generates arrivals of a Poisson process, picking each drink at
+    random from a mix.
+
+    Parameters
+    ----------
+    rate : float
+        Mean number of orders per second.
+
+    duration : float
+        Seconds to generate arrivals for.
+
+    mix : dict or list
+        Weight of each drink, or a list of drinks picked from evenly.
+
+    seed : int
+        Seed of the random number generator.
+
+    Returns
+    -------
+    arrivals : list
+        List of (time, drink name) pairs, in time order.
+
+    """
+
+    if not isinstance(rate, (int, float)) or rate <= 0:
+        raise ValueError("Arrival rate must be a number more than 0.")
+
+    if not isinstance(mix, dict):
+        mix = dict.fromkeys(mix, 1)
+
+    if not mix:
+        raise ValueError("Order mix is empty.")
+
+    for weight in mix.values():
+        if not isinstance(weight, (int, float)) or weight < 0:
+            raise ValueError("Weight of drink in order mix is not a number "+
+                "of at least 0.")
+
+    rng = random.Random(seed)
+    drinks = list(mix.keys())
+    weights = list(mix.values())
+
+    arrivals = []
+    now = rng.expovariate(rate)
+
+    while now < duration:
+        arrivals.append((now, rng.choices(drinks, weights)[0]))
+        now += rng.expovariate(rate)
+
+    return arrivals
+
+
+def loadArrivals(path):
+    """Loads recorded arrivals from a file, with the time in seconds and
+    the drink name on every line, such as "12.5 hot_tea". Blank lines are
+    skipped.
+
+    Parameters
+    ----------
+    path : str
+        Path of the file.
+
+    Returns
+    -------
+    arrivals : list
+        List of (time, drink name) pairs, in time order.
+
+    """
+
+    arrivals = []
+
+    with open(path, "r") as f:
+        for line in f:
+            fields = line.split()
+
+            if not fields:
+                continue
+
+            if len(fields) != 2:
+                raise ValueError("Arrival is not a time and a drink name.")
+
+            arrivals.append((float(fields[0]), fields[1]))
+
+    arrivals.sort(key=operator.itemgetter(0))
+
+    return arrivals
+
+
+def periodicRefills(quantities, every, duration):
+    """Builds a refill schedule that tops the machine up at fixed times.
+
+    Parameters
+    ----------
+    quantities : dict
+        Level each ingredient is topped up to.
+
+    every : float
+        Seconds between refills.
+
+    duration : float
+        Seconds to schedule refills for.
+
+    Returns
+    -------
+    refills : list
+        List of (time, quantities) pairs, as taken by simulate.
+
+    """
+
+    if not isinstance(every, (int, float)) or every <= 0:
+        raise ValueError("Refill interval must be a number more than 0.")
+
+    return [(every * k, quantities)
+        for k in range(1, int(duration // every) + 1)]
+
+
+class CapacitySimulator:
+    """ Class for simulating a coffee machine of a given size against a
+    stream of orders. Orders are served first come first served by the
+    first outlet to free up, as the outlet workers do.
+
+    A drink that finds an ingredient short is turned away and counted as a
+    stockout, instead of being refilled on the spot as the machine does,
+    since how often that happens is what a refill schedule is sized by.
+
+    Attributes
+    ----------
+
+    machine : CoffeeMachine
+        Machine built from the config, which checks it and compiles the
+        recipes. No drink is ever made on it.
+
+    num_outlets : int
+        Number of outlets of the machine.
+
+    """
+
+
+    def __init__(self, num_outlets=1, beverages={}, raw_material_qty={},
+        pour_time=0, pour_times=None):
+        """Initializes the CapacitySimulator class.
+
+        Parameters
+        ----------
+
+        num_outlets : int
+            Number of outlets in the coffee machine.
+
+        beverages : dict
+            Recipes for the various drinks the machine makes, as given to
+            CoffeeMachine.
+
+        raw_material_qty : dict
+            Starting quantity of each ingredient.
+
+        pour_time : float
+            Seconds an outlet spends pouring a drink.
+
+        pour_times : dict
+            Seconds an outlet spends pouring each drink, for drinks that
+            do not take pour_time.
+
+        Returns
+        -------
+
+        """
+
+        self.machine = CoffeeMachine(num_outlets, beverages,
+            raw_material_qty, pour_time=pour_time, event_sink=NullSink(),
+            pour_times=pour_times, clock=VirtualClock())
+        self.num_outlets = num_outlets
+
+
+    def simulate(self, arrivals, refills=(), interval=60):
+        """Simulates the machine serving a stream of orders.
+
+        Parameters
+        ----------
+        arrivals : list
+            List of (time, drink name) pairs, in time order.
+
+        refills : list
+            List of (time, quantities) pairs. At each time, every
+            ingredient in quantities is topped up to the given level.
+
+        interval : float
+            Seconds covered by each point of the curves.
+
+        Returns
+        -------
+        report : dict
+            Dict with a summary of the whole run, and curves of the queue
+            length, wait time, stockouts and levels, with one point per
+            interval.
+
+        """
+
+        if not isinstance(interval, (int, float)) or interval <= 0:
+            raise ValueError("Curve interval must be a number more than 0.")
+
+        machine = self.machine
+        ingredients = machine.ingredients
+        levels = list(machine.levels)
+
+        # (time, levels) after every change of the levels, in time order
+        level_marks = [(0.0, tuple(levels))]
+
+        # refills run on the clock, as the line reaches their time
+        clock = VirtualClock()
+        for when, quantities in refills:
+            clock.schedule(when, self.__topUp, clock, levels, quantities,
+                level_marks)
+
+        # time each outlet is free from, the first to free up on top
+        outlets = [0.0] * self.num_outlets
+
+        # (arrived, started, finished, status) of every order, where
+        # status is 1 if served, 0 if stocked out, and -1 if unavailable
+        orders = []
+        first_stockout = {}
+        busy = 0.0
+
+        for arrived_at, drink in arrivals:
+            if drink not in machine.beverages:
+                raise ValueError("Drink recipe for ordered drink is not known.")
+
+            free_at = heapq.heappop(outlets)
+            started_at = max(free_at, arrived_at)
+            clock.advanceTo(started_at)
+
+            vector = machine.recipe_vectors.get(drink)
+
+            if vector is None:
+                status = -1
+            elif all(map(operator.ge, levels, vector)):
+                status = 1
+            else:
+                status = 0
+                for i in machine.recipe_ids[drink]:
+                    if levels[i] < vector[i]:
+                        first_stockout.setdefault(ingredients[i], started_at)
+
+            # only a served drink keeps its outlet busy
+            if status == 1:
+                levels[:] = map(operator.sub, levels, vector)
+                finished_at = started_at + machine.pour_times.get(drink,
+                    machine.pour_time)
+                busy += finished_at - started_at
+                heapq.heappush(outlets, finished_at)
+                level_marks.append((started_at, tuple(levels)))
+            else:
+                finished_at = started_at
+                heapq.heappush(outlets, free_at)
+
+            orders.append((arrived_at, started_at, finished_at, status))
+
+        # the run lasts until the last order and the last refill are done
+        end = max([0.0] + [order[2] for order in orders] +
+            [when for when, quantities in refills])
+        clock.advanceTo(end)
+
+        waits = sorted(order[1] - order[0] for order in orders)
+        served = sum(1 for order in orders if order[3] == 1)
+
+        summary = {
+            "num_outlets": self.num_outlets,
+            "orders": len(orders),
+            "served": served,
+            "stockouts": sum(1 for order in orders if order[3] == 0),
+            "unavailable": sum(1 for order in orders if order[3] == -1),
+            "mean_wait": sum(waits) / len(waits) if waits else 0.0,
+            "p99_wait": percentile(waits, 0.99),
+            "max_wait": waits[-1] if waits else 0.0,
+            "max_queue_length": 0,
+            "utilization": busy / (end * self.num_outlets) if end else 0.0,
+            "first_stockout": first_stockout,
+            "end": end,
+        }
+
+        curves = self.__buildCurves(orders, level_marks, end, interval)
+        summary["max_queue_length"] = max(curves["queue_length"] + [0])
+
+        return {"summary": summary, "curves": curves}
+
+
+    def __topUp(self, clock, levels, quantities, level_marks):
+        """Method run by the clock at the time of a refill. Tops every
+        ingredient in quantities up to the given level.
+
+        Parameters
+        ----------
+        clock : VirtualClock
+            Clock of the run.
+
+        levels : list
+            Levels of the simulated machine, indexed by ingredient ID.
+
+        quantities : dict
+            Level each ingredient is topped up to.
+
+        level_marks : list
+            (time, levels) after every change of the levels, which the
+            refill is added to.
+
+        Returns
+        -------
+
+        """
+
+        for ingredient, qty in quantities.items():
+            if ingredient not in self.machine.ingredient_ids:
+                raise ValueError("Ingredient not in coffee machine.")
+
+            i = self.machine.ingredient_ids[ingredient]
+            levels[i] = max(levels[i], qty)
+
+        level_marks.append((clock.now(), tuple(levels)))
+
+
+    def __buildCurves(self, orders, level_marks, end, interval):
+        """Method to turn the orders of a run into curves with one point
+        per interval.
+
+        Parameters
+        ----------
+        orders : list
+            (arrived, started, finished, status) of every order.
+
+        level_marks : list
+            (time, levels) after every change of the levels, in time order.
+
+        end : float
+            Time the run ends at.
+
+        interval : float
+            Seconds covered by each point.
+
+        Returns
+        -------
+        curves : dict
+            Start time of each interval, with the longest line, the mean
+            and p99 wait of the orders arriving, the stockouts so far, and
+            the level of each ingredient at the end of each interval.
+
+        """
+
+        num_points = max(int(math.ceil(end / interval)), 1)
+
+        # the line grows when an order arrives, and shrinks when it
+        # reaches an outlet
+        changes = [(order[0], 1) for order in orders]
+        changes += [(order[1], -1) for order in orders]
+        changes.sort(key=operator.itemgetter(0))
+
+        queue_length = []
+        length = 0
+        i = 0
+        for point in range(num_points):
+            # the line carries over from the interval before, unless it
+            # changes right as the interval starts
+            longest = length
+            if i < len(changes) and changes[i][0] <= point * interval:
+                longest = 0
+
+            point_end = (point + 1) * interval
+
+            while i < len(changes) and (changes[i][0] < point_end or
+                point == num_points - 1):
+                # apply every change at the same time before reading
+                when = changes[i][0]
+                while i < len(changes) and changes[i][0] == when:
+                    length += changes[i][1]
+                    i += 1
+
+                longest = max(longest, length)
+
+            queue_length.append(longest)
+
+        waits = [[] for point in range(num_points)]
+        stockouts = [0] * num_points
+        for arrived_at, started_at, finished_at, status in orders:
+            waits[min(int(arrived_at // interval), num_points - 1)].append(
+                started_at - arrived_at)
+
+            if status == 0:
+                stockouts[min(int(started_at // interval),
+                    num_points - 1)] += 1
+
+        for point in range(1, num_points):
+            stockouts[point] += stockouts[point - 1]
+
+        levels = []
+        mark = 0
+        for point in range(num_points):
+            while (mark + 1 < len(level_marks) and
+                level_marks[mark + 1][0] < (point + 1) * interval):
+                mark += 1
+            levels.append(level_marks[mark][1])
+
+        for point in range(num_points):
+            waits[point].sort()
+
+        return {
+            "time": [point * interval for point in range(num_points)],
+            "queue_length": queue_length,
+            "mean_wait": [sum(w) / len(w) if w else 0.0 for w in waits],
+            "p99_wait": [percentile(w, 0.99) for w in waits],
+            "stockouts": stockouts,
+            "levels": {self.machine.ingredients[i]:
+                [point_levels[i] for point_levels in levels]
+                for i in range(len(self.machine.ingredients))},
+        }
+
+
+def sweep(beverages, raw_material_qty, arrivals, outlet_counts,
+    stock_scales=(1,), refill_intervals=(None,), pour_time=0,
+    pour_times=None, interval=60):
+    """Simulates every combination of outlet count, stock and refill
+    interval against the same arrivals.
+
+    Parameters
+    ----------
+    beverages : dict
+        Recipes for the various drinks the machine makes.
+
+    raw_material_qty : dict
+        Starting quantity of each ingredient, before scaling.
+
+    arrivals : list
+        List of (time, drink name) pairs, in time order.
+
+    outlet_counts : list
+        Numbers of outlets to try.
+
+    stock_scales : list
+        Factors to scale the starting quantities by. The machine is
+        topped up to the scaled quantities at every refill.
+
+    refill_intervals : list
+        Seconds between refills to try, None for no refills.
+
+    pour_time : float
+        Seconds an outlet spends pouring a drink.
+
+    pour_times : dict
+        Seconds an outlet spends pouring each drink.
+
+    interval : float
+        Seconds covered by each point of the curves.
+
+    Returns
+    -------
+    reports : list
+        Report of every run, as returned by simulate, with the stock scale
+        and refill interval added to its summary.
+
+    """
+
+    if arrivals:
+        duration = arrivals[-1][0]
+    else:
+        duration = 0
+
+    reports = []
+
+    for num_outlets in outlet_counts:
+        for scale in stock_scales:
+            stock = {ingredient: int(qty * scale)
+                for ingredient, qty in raw_material_qty.items()}
+            simulator = CapacitySimulator(num_outlets, beverages, stock,
+                pour_time, pour_times)
+
+            for every in refill_intervals:
+                refills = []
+                if every is not None:
+                    refills = periodicRefills(stock, every, duration)
+
+                report = simulator.simulate(arrivals, refills, interval)
+                report["summary"]["stock_scale"] = scale
+                report["summary"]["refill_interval"] = every
+                reports.append(report)
+
+    return reports
+
+
+def main(argv=None):
+    """Runs the simulator from the command line, and prints the report.
+
+    Parameters
+    ----------
+    argv : list
+        Command line arguments, defaults to those of the script.
+
+    Returns
+    -------
+    code : int
+        Always 0.
+
+    """
+
+    parser = argparse.ArgumentParser(description="Simulate the coffee "+
+        "machine against a stream of orders, to size outlets and refills.")
+    parser.add_argument("--config", default="test_data/standard_input.json",
+        help="machine config, as loaded by sample_usage.py")
+    parser.add_argument("--arrivals", help="file of recorded arrivals, "+
+        "instead of Poisson arrivals")
+    parser.add_argument("--rate", type=float, default=0.05,
+        help="Poisson orders per second")
+    parser.add_argument("--duration", type=float, default=8 * 3600,
+        help="seconds of Poisson arrivals")
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--num-outlets", type=int, nargs="+")
+    parser.add_argument("--stock-scale", type=float, nargs="+",
+        default=[1])
+    parser.add_argument("--refill-every", type=float, nargs="+")
+    parser.add_argument("--pour-time", type=float, default=30)
+    parser.add_argument("--interval", type=float, default=600,
+        help="seconds covered by each point of the curves")
+    parser.add_argument("--curves", action="store_true",
+        help="print the curves along with the summaries")
+    args = parser.parse_args(argv)
+
+    with open(args.config, "r") as f:
+        data = json.load(f)
+
+    beverages = data['machine']['beverages']
+    total_items_qty = data['machine']['total_items_quantity']
+
+    if args.arrivals is not None:
+        arrivals = loadArrivals(args.arrivals)
+    else:
+        arrivals = poissonArrivals(args.rate, args.duration,
+            list(beverages.keys()), args.seed)
+
+    outlet_counts = args.num_outlets
+    if outlet_counts is None:
+        outlet_counts = [data['machine']['outlets']['count_n']]
+
+    refill_intervals = args.refill_every
+    if refill_intervals is None:
+        refill_intervals = [None]
+
+    reports = sweep(beverages, total_items_qty, arrivals, outlet_counts,
+        args.stock_scale, refill_intervals, args.pour_time,
+        interval=args.interval)
+
+    if not args.curves:
+        reports = [{"summary": report["summary"]} for report in reports]
+
+    print(json.dumps(reports, indent=2))
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
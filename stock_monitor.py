@@ -0,0 +1,233 @@
+# Stock monitor for the Coffee Machine. Keeps the ingredients used by the
+# last few pours, works out how fast each ingredient is going from them, and
+# forecasts when it runs out, so a refill can be on its way before a
+# customer finds the machine empty.
+
+import collections
+import math
+import threading
+
+class StockMonitor:
+    """ Class for forecasting when the ingredients of a coffee machine run
+    out. The rate an ingredient is used at is what the last window pours
+    used of it after the first of them, over the time since the first. An
+    ingredient is low once it is forecast to run out within the horizon,
+    and is only reported again after its forecast goes back beyond the
+    horizon, such as after a refill.
+
+    Attributes
+    ----------
+
+    ingredients : list
+        Names of the ingredients, indexed by ingredient ID.
+
+    window : int
+        Number of pours the rates are worked out from.
+
+    horizon : float
+        Seconds ahead an ingredient running out is reported.
+
+    pours : collections.deque
+        Time and ingredients used, indexed by ingredient ID, of each of
+        the last window pours.
+
+    used : list
+        Quantity of each ingredient the pours in the window used.
+
+    low : set
+        Ingredient IDs reported low and not yet back beyond the horizon.
+
+    """
+
+
+    def __init__(self, ingredients, window=20, horizon=300):
+        """Initializes the StockMonitor class.
+
+        Parameters
+        ----------
+
+        ingredients : list
+            Names of the ingredients, indexed by ingredient ID.
+
+        window : int
+            Number of pours the rates are worked out from. Defaults to 20.
+
+        horizon : float
+            Seconds ahead an ingredient running out is reported. Defaults
+            to 300.
+
+        Returns
+        -------
+
+        """
+
+        if not isinstance(window, int) or window <= 0:
+            raise ValueError("Stock window is not an integer more than 0.")
+
+        if not isinstance(horizon, (int, float)) or horizon <= 0:
+            raise ValueError("Stock horizon must be a number more than 0.")
+
+        self.ingredients = list(ingredients)
+        self.window = window
+        self.horizon = horizon
+
+        self.pours = collections.deque()
+        self.used = [0] * len(self.ingredients)
+        self.low = set()
+
+        # outlets record pours from several threads at once
+        self.lock = threading.Lock()
+
+
+    def record(self, now, used, levels):
+        """Records a pour, and returns the ingredients that are now
+        forecast to run out within the horizon.
+
+        Parameters
+        ----------
+        now : float
+            Time of the pour.
+
+        used : tuple
+            Quantity of each ingredient the pour used, indexed by
+            ingredient ID.
+
+        levels : list
+            Quantity of each ingredient left after the pour.
+
+        Returns
+        -------
+        low : list
+            Tuples of the name, level and seconds left of every ingredient
+            newly forecast to run out within the horizon.
+
+        """
+
+        with self.lock:
+            self.pours.append((now, used))
+            for i in range(len(used)):
+                self.used[i] += used[i]
+
+            # the running totals drop the pour that leaves the window
+            if len(self.pours) > self.window:
+                oldest, dropped = self.pours.popleft()
+                for i in range(len(dropped)):
+                    self.used[i] -= dropped[i]
+
+            seconds = self.__secondsLeft(now, levels)
+
+            low = []
+            for i in range(len(seconds)):
+                if seconds[i] > self.horizon:
+                    self.low.discard(i)
+
+                elif used[i] > 0 and i not in self.low:
+                    self.low.add(i)
+                    low.append((self.ingredients[i], levels[i], seconds[i]))
+
+            return low
+
+
+    def rates(self, now):
+        """Returns the rate each ingredient is used at.
+
+        Parameters
+        ----------
+        now : float
+            Time to work the rates out at.
+
+        Returns
+        -------
+        rates : dict
+            Units per second of each ingredient.
+
+        """
+
+        with self.lock:
+            return dict(zip(self.ingredients, self.__rates(now)))
+
+
+    def forecast(self, now, levels):
+        """Returns the time each ingredient is forecast to run out in.
+
+        Parameters
+        ----------
+        now : float
+            Time to forecast from.
+
+        levels : list
+            Quantity of each ingredient, indexed by ingredient ID.
+
+        Returns
+        -------
+        seconds : dict
+            Seconds left of each ingredient, infinite for ingredients that
+            are not being used.
+
+        """
+
+        with self.lock:
+            return dict(zip(self.ingredients, self.__secondsLeft(now,
+                levels)))
+
+
+    def __rates(self, now):
+        """Method to work out the rate each ingredient is used at, once the
+        lock is held.
+
+        Parameters
+        ----------
+        now : float
+            Time to work the rates out at.
+
+        Returns
+        -------
+        rates : list
+            Units per second of each ingredient, indexed by ingredient ID.
+
+        """
+
+        # a single pour, or pours all at once, give no rate yet
+        if not self.pours or now <= self.pours[0][0]:
+            return [0.0] * len(self.ingredients)
+
+        # the first pour only marks the start of the span
+        start, first = self.pours[0]
+        span = now - start
+
+        return [(self.used[i] - first[i]) / span
+            for i in range(len(self.used))]
+
+
+    def __secondsLeft(self, now, levels):
+        """Method to forecast the time each ingredient runs out in, once
+        the lock is held.
+
+        Parameters
+        ----------
+        now : float
+            Time to forecast from.
+
+        levels : list
+            Quantity of each ingredient, indexed by ingredient ID.
+
+        Returns
+        -------
+        seconds : list
+            Seconds left of each ingredient, indexed by ingredient ID, 0
+            for ingredients already out.
+
+        """
+
+        rates = self.__rates(now)
+
+        seconds = []
+        for i in range(len(rates)):
+            if levels[i] <= 0:
+                seconds.append(0.0)
+            elif rates[i] > 0:
+                seconds.append(levels[i] / rates[i])
+            else:
+                seconds.append(math.inf)
+
+        return seconds
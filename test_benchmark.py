@@ -0,0 +1,163 @@
+# Test functionality of the benchmark suite, function by function
+
+from benchmark import RECIPE_SIZE, buildMenu, compareToBaseline
+from benchmark import percentile, runBatchBenchmark, runBenchmark
+from benchmark import runFleetBenchmark, runPriorityBenchmark
+from benchmark import runProcessBenchmark, runWalBenchmark
+from random_order import generateOrders
+import pytest
+
+def test_generateOrders_seeded():
+    """ Test to check if the same seed gives the same orders.
+    """
+
+    # assign data to pass to coffee machine
+    menu = ["hot_tea", "hot_coffee", "black_tea"]
+
+    orders = generateOrders(menu, 50, 7)
+
+    assert orders == generateOrders(menu, 50, 7)
+    assert len(orders) == 50
+    assert set(orders) <= set(menu)
+
+
+def test_buildMenu_overlap():
+    """ Test to check if recipes share as many ingredients as asked.
+    """
+
+    # assign data to pass to coffee machine
+    beverages, total_items_qty = buildMenu(3, 0.0, 10)
+
+    assert len(total_items_qty) == 3 * RECIPE_SIZE
+
+    beverages, total_items_qty = buildMenu(3, 1.0, 10)
+
+    assert len(total_items_qty) == RECIPE_SIZE
+    assert beverages["drink_0"] == beverages["drink_2"]
+
+    beverages, total_items_qty = buildMenu(3, 0.5, 10)
+
+    assert len(total_items_qty) == RECIPE_SIZE // 2 + 3 * RECIPE_SIZE // 2
+    assert set(total_items_qty.values()) == {10}
+
+
+def test_buildMenu_overlap_range():
+    """ Test to check if an overlap outside 0 to 1 is refused.
+    """
+
+    with pytest.raises(ValueError, match="Overlap must be between 0 and 1."):
+        buildMenu(3, 1.5, 10)
+
+
+def test_percentile():
+    """ Test to check if percentiles are taken by the nearest rank.
+    """
+
+    # assign data to pass to coffee machine
+    values = list(range(1, 101))
+
+    assert percentile(values, 0.50) == 50
+    assert percentile(values, 0.99) == 99
+    assert percentile(values, 0.0) == 1
+    assert percentile([], 0.5) == 0.0
+
+
+def test_runBenchmark_report():
+    """ Test to check if a run makes every drink and reports on it.
+    """
+
+    result = runBenchmark(200, 2, 4, 0.5, "ingredient")
+
+    assert result["made"] == 200
+    assert result["throughput"] > 0
+    assert 0 < result["utilization"] <= 1
+    assert result["p50"] <= result["p99"]
+
+
+def test_compareToBaseline():
+    """ Test to check if a drop in throughput is flagged as a regression.
+    """
+
+    # assign data to pass to coffee machine
+    settings = {"num_orders": 10, "num_outlets": 1, "menu_size": 4,
+        "overlap": 0.0, "locking": "global", "pour_time": 0}
+    old = dict(settings, throughput=100.0, p99=0.01)
+    new = dict(settings, throughput=50.0, p99=0.02)
+    other = dict(settings, num_outlets=2, throughput=50.0, p99=0.02)
+
+    comparison = compareToBaseline([new, other], [old])
+
+    assert len(comparison) == 1
+    assert comparison[0]["throughput_ratio"] == 0.5
+    assert comparison[0]["p99_ratio"] == 2.0
+    assert comparison[0]["regressed"] == True
+
+    comparison = compareToBaseline([old], [old])
+
+    assert comparison[0]["regressed"] == False
+
+
+def test_runPriorityBenchmark():
+    """ Test to check if the priority policy cuts the latency of express
+    drinks at peak.
+    """
+
+    fifo = runPriorityBenchmark(200, 2, "fifo")
+    priority = runPriorityBenchmark(200, 2, "priority")
+
+    assert priority["express_p99"] < fifo["express_p99"] / 2
+    assert priority["complex_p99"] <= fifo["complex_p99"] * 1.1
+
+
+def test_runBatchBenchmark_report():
+    """ Test to check if a batched run on the sample menu reports on it.
+    """
+
+    result = runBatchBenchmark(200, 3, 8)
+
+    assert result["batch"] == 8
+    assert result["throughput"] > 0
+
+    result = runBatchBenchmark(60, 3, 8, pour_time=0.001)
+
+    assert result["pour_time"] == 0.001
+    assert result["throughput"] > 0
+
+
+def test_runFleetBenchmark_report():
+    """ Test to check if a fleet run spreads the orders over the machines
+    and reports on it.
+    """
+
+    result = runFleetBenchmark(100, 2, 2, pour_time=0)
+
+    assert result["made"] == 100
+    assert sum(result["routed"]) == 100
+    assert result["throughput"] > 0
+
+
+def test_runProcessBenchmark_report():
+    """ Test to check if a run on outlet processes makes every drink, as a
+    run on outlet threads does.
+    """
+
+    for backend in ["threads", "processes"]:
+        result = runProcessBenchmark(100, 2, backend, pour_time=0)
+
+        assert result["backend"] == backend
+        assert result["locking"] == "optimistic"
+        assert result["made"] == 100
+        assert result["throughput"] > 0
+
+
+def test_runWalBenchmark_report():
+    """ Test to check if a run with a write-ahead log makes every drink,
+    and reports the commit latency and the recovery of every change.
+    """
+
+    result = runWalBenchmark(100, 2, True, pour_time=0)
+
+    assert result["made"] == 100
+    assert result["wal_stats"]["commit_p99"] > 0
+    assert result["recovery"]["seconds"] > 0
+    assert runWalBenchmark(100, 2, False, pour_time=0)["made"] == 100
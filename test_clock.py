@@ -0,0 +1,107 @@
+# Test functionality of the RealClock and VirtualClock classes, method by
+# method
+
+from clock import RealClock, VirtualClock
+import pytest
+
+def test_RealClock_sleep():
+    """ Test to check if the real clock moves on while sleeping.
+    """
+
+    clock = RealClock()
+    start = clock.now()
+    clock.sleep(0.01)
+
+    assert clock.now() - start >= 0.01
+    assert clock.virtual == False
+
+
+def test_VirtualClock_start_type():
+    """ Test to check if a non number start time is handled correctly.
+    """
+
+    with pytest.raises(ValueError, match="Start time is not a number."):
+        clock = VirtualClock("hello")
+
+
+def test_VirtualClock_sleep():
+    """ Test to check if sleeping moves the virtual clock right away.
+    """
+
+    clock = VirtualClock(10)
+    clock.sleep(3600)
+
+    assert clock.now() == 3610
+    assert clock.virtual == True
+
+    with pytest.raises(ValueError, match="Cannot move the clock back in time."):
+        clock.sleep(-1)
+
+
+def test_VirtualClock_schedule_order():
+    """ Test to check if actions run in time order, at their own time.
+    """
+
+    clock = VirtualClock()
+    ran = []
+
+    def action(name):
+        ran.append((name, clock.now()))
+
+    clock.schedule(5, action, "late")
+    clock.schedule(2, action, "early")
+    clock.schedule(2, action, "early_too")
+    clock.advanceTo(4)
+
+    assert ran == [("early", 2), ("early_too", 2)]
+    assert clock.now() == 4
+
+    clock.run()
+
+    assert ran[-1] == ("late", 5)
+    assert clock.now() == 5
+
+
+def test_VirtualClock_schedule_past():
+    """ Test to check if actions cannot be scheduled in the past.
+    """
+
+    clock = VirtualClock(10)
+
+    with pytest.raises(ValueError, match="Cannot schedule an action in the past."):
+        clock.schedule(5, print)
+
+    with pytest.raises(ValueError, match="Cannot move the clock back in time."):
+        clock.advanceTo(5)
+
+
+def test_VirtualClock_run_chained():
+    """ Test to check if actions scheduled by actions are run as well.
+    """
+
+    clock = VirtualClock()
+    ran = []
+
+    def tick(left):
+        ran.append(clock.now())
+        if left > 0:
+            clock.schedule(clock.now() + 1, tick, left - 1)
+
+    clock.schedule(0, tick, 3)
+    clock.run()
+
+    assert ran == [0, 1, 2, 3]
+
+
+def test_VirtualClock_nextTime():
+    """ Test to see if the time of the next scheduled action is given.
+    """
+
+    clock = VirtualClock()
+
+    assert clock.nextTime() is None
+
+    clock.schedule(5, print)
+    clock.schedule(2, print)
+
+    assert clock.nextTime() == 2
@@ -1,8 +1,37 @@
 # Test basic functionality of the Coffee Machine Class, method by method
 
-from coffee_machine import CoffeeMachine
+from clock import RealClock, VirtualClock
+from coffee_machine import CoffeeMachine, Order
+from event_log import MemorySink
+from write_ahead_log import WriteAheadLog
+import asyncio
 import json
 import pytest
+import threading
+import time
+
+class OverlapClock(RealClock):
+    """ Real clock that counts how many drinks pour at once. A pour lasts
+    until as many pours as expected are under way together, or until the
+    timeout, so the count does not hang on how fast the threads run.
+    """
+
+    def __init__(self, expected, timeout=2):
+        self.expected = expected
+        self.timeout = timeout
+        self.pouring = 0
+        self.most_pouring = 0
+        self.condition = threading.Condition()
+
+    def sleep(self, seconds):
+        with self.condition:
+            self.pouring += 1
+            self.most_pouring = max(self.most_pouring, self.pouring)
+            self.condition.notify_all()
+            self.condition.wait_for(lambda: self.most_pouring >=
+                self.expected, self.timeout)
+            self.pouring -= 1
+
 
 def test_basic_CoffeeMachine():
     """Test to check basic input functionality of the class for simple
@@ -346,12 +375,13 @@ def test_pourDrink_functionality():
     # assign data to pass to coffee machine
     num_outlets = 1
     beverages = {"hot_tea":{"milk":1}}
-    total_items_qty = {"milk":2}
+    total_items_qty = {"water":5, "milk":2}
 
     CM = CoffeeMachine(num_outlets, beverages, total_items_qty)
-    CM._CoffeeMachine__pourDrink("hot_tea")
+    new_levels = CM._CoffeeMachine__pourDrink("hot_tea", CM.levels)
     
-    assert CM.raw_material_qty["milk"] == 1
+    assert new_levels == (5, 1)
+    assert CM.raw_material_qty["milk"] == 2
 
 
 def test_makeDrink_drink_type():
@@ -379,7 +409,6 @@ def test_makeDrink_recipe_unkown():
     total_items_qty = {}
 
     CM = CoffeeMachine(num_outlets, beverages, total_items_qty)
-    CM.running_threads = [1]
 
     with pytest.raises(ValueError, match="Drink recipe is not known."):
         CM._CoffeeMachine__makeDrink("hot_tea", 1)
@@ -395,7 +424,6 @@ def test_makeDrink_functionality_possible():
     total_items_qty = {"milk":2}
 
     CM = CoffeeMachine(num_outlets, beverages, total_items_qty)
-    CM.running_threads = [1]
     CM._CoffeeMachine__makeDrink("hot_tea", 1)
 
     assert CM.raw_material_qty["milk"] == 1
@@ -412,7 +440,6 @@ def test_makeDrink_functionality_insufficient():
     total_items_qty = {"milk":1}
 
     CM = CoffeeMachine(num_outlets, beverages, total_items_qty)
-    CM.running_threads = [1]
     CM._CoffeeMachine__makeDrink("hot_tea", 1)
 
     assert CM.raw_material_qty["milk"] == 0
@@ -429,7 +456,6 @@ def test_makeDrink_functionality_impossible():
     total_items_qty = {"milk":1}
 
     CM = CoffeeMachine(num_outlets, beverages, total_items_qty)
-    CM.running_threads = [1]
     CM._CoffeeMachine__makeDrink("hot_tea", 1)
 
     assert CM.raw_material_qty["milk"] == 1
@@ -578,3 +604,2166 @@ def test_returnIngredientLevel():
     assert CM.returnIngredientLevel() == total_items_qty
 
 
+def test_makeOrder_scheduler_stats():
+    """ Test to see if makeOrder hands out every order through the
+    scheduler, and gives every outlet back.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 2
+    beverages = {"hot_tea":{"milk":1}}
+    total_items_qty = {"milk":6}
+    orders = ["hot_tea"] * 6
+
+    CM = CoffeeMachine(num_outlets, beverages, total_items_qty)
+    CM.makeOrder(orders)
+    stats = CM.scheduler.stats()
+
+    assert stats["admitted"] == 6
+    assert stats["max_queue_depth"] <= 4
+    assert stats["queue_depth"] == 0
+    assert stats["busy"] == 0
+
+
+def test_start_shutdown_workers():
+    """ Test to see if a started machine runs several orders on the same
+    fixed set of outlet workers.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 2
+    beverages = {"hot_tea":{"milk":1}}
+    total_items_qty = {"milk":10}
+
+    CM = CoffeeMachine(num_outlets, beverages, total_items_qty)
+    CM.start()
+    workers = list(CM.workers)
+
+    assert len(workers) == 2
+
+    CM.makeOrder(["hot_tea"] * 4)
+    CM.makeOrder(["hot_tea"] * 4)
+
+    assert CM.workers == workers
+    assert all(worker.is_alive() for worker in workers)
+    assert CM.scheduler.stats()["admitted"] == 8
+
+    CM.shutdown(wait=True)
+
+    assert CM.workers == []
+    assert not any(worker.is_alive() for worker in workers)
+    assert CM.raw_material_qty["milk"] == 2
+
+
+def test_start_twice():
+    """ Test to see if starting an already started machine is caught.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 1
+    beverages = {}
+    total_items_qty = {}
+
+    CM = CoffeeMachine(num_outlets, beverages, total_items_qty)
+    CM.start()
+
+    with pytest.raises(ValueError, match="already started"):
+        CM.start()
+
+    CM.shutdown()
+
+
+def test_restart_after_shutdown():
+    """ Test to see if a machine can be started again after a shutdown.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 1
+    beverages = {"hot_tea":{"milk":1}}
+    total_items_qty = {"milk":2}
+
+    CM = CoffeeMachine(num_outlets, beverages, total_items_qty)
+    CM.start()
+    CM.shutdown()
+    CM.start()
+    CM.makeOrder("hot_tea")
+    CM.shutdown()
+
+    assert CM.raw_material_qty["milk"] == 1
+
+
+def test_restart_without_waiting():
+    """ Test to see if workers of a shutdown that was not waited for keep
+    to their own line once the machine is started again.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 2
+    beverages = {"hot_tea":{"milk":1}}
+    total_items_qty = {"milk":20}
+
+    CM = CoffeeMachine(num_outlets, beverages, total_items_qty,
+        pour_time=0.01, event_sink=MemorySink())
+    CM.start()
+    CM.makeOrder(["hot_tea"] * 4)
+    CM.shutdown(wait=False)
+    CM.start()
+    results = CM.makeOrder(["hot_tea"] * 6)
+    CM.shutdown()
+
+    assert [result.status for result in results] == [1] * 6
+    assert CM.raw_material_qty["milk"] == 10
+
+
+def test_makeOrder_concurrent_unstarted():
+    """ Test to see if orders made at once on a machine that is not
+    started share the workers started for them.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 2
+    beverages = {"hot_tea":{"milk":1}}
+    total_items_qty = {"milk":200}
+
+    CM = CoffeeMachine(num_outlets, beverages, total_items_qty,
+        pour_time=0.001, event_sink=MemorySink())
+    results = []
+
+    def order():
+        results.append(CM.makeOrder(["hot_tea"] * 10))
+
+    threads = [threading.Thread(target=order) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert [len(result) for result in results] == [10] * 4
+    assert CM.workers == []
+    assert CM.raw_material_qty["milk"] == 160
+
+
+def test_makeOrder_worker_error():
+    """ Test to see if an error raised on an outlet worker is passed on
+    to the caller of makeOrder.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 1
+    beverages = {"hot_tea":{"milk":1}}
+    total_items_qty = {"milk":2}
+
+    CM = CoffeeMachine(num_outlets, beverages, total_items_qty)
+
+    # recipe that no longer makes sense by the time it is poured
+    CM.recipe_vectors["hot_tea"] = ("broken",)
+
+    with pytest.raises(TypeError):
+        CM.makeOrder("hot_tea")
+
+
+def test_checkOptions_locking():
+    """ Test to check if an unknown locking mode is handled correctly.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 1
+    beverages = {}
+    total_items_qty = {}
+
+    with pytest.raises(ValueError, match="Locking mode is not known."):
+        CM = CoffeeMachine(num_outlets, beverages, total_items_qty,
+            locking="hello")
+
+
+def test_checkOptions_pour_time_type():
+    """ Test to check if non number pour time is handled correctly.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 1
+    beverages = {}
+    total_items_qty = {}
+
+    with pytest.raises(ValueError, match="Pour time is not a number."):
+        CM = CoffeeMachine(num_outlets, beverages, total_items_qty,
+            pour_time="hello")
+
+
+def test_checkOptions_pour_time_negative():
+    """ Test to check if pour time supplied makes semantic sense.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 1
+    beverages = {}
+    total_items_qty = {}
+
+    with pytest.raises(ValueError, match="Pour time cannot be less than 0."):
+        CM = CoffeeMachine(num_outlets, beverages, total_items_qty,
+            pour_time=-1)
+
+
+def test_recipe_locks_sorted():
+    """ Test to see if the locks of a recipe are taken in sorted
+    ingredient order, leaving out ingredients the machine does not have.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 1
+    beverages = {"hot_tea":{"water":1, "milk":1, "cocoa":1}}
+    total_items_qty = {"water":1, "milk":1}
+
+    CM = CoffeeMachine(num_outlets, beverages, total_items_qty,
+        locking="ingredient")
+
+    assert CM.recipe_locks["hot_tea"] == [CM.ingredient_locks["milk"],
+        CM.ingredient_locks["water"]]
+
+
+def test_makeOrder_ingredient_locking():
+    """ Test to see if makeOrder keeps the stock right in ingredient
+    locking mode, with drinks that share some ingredients.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 4
+    beverages = {"hot_tea":{"milk":1, "water":2}, "black_tea":{"water":1},
+        "latte":{"milk":2}}
+    total_items_qty = {"milk":30, "water":30}
+    orders = ["hot_tea", "black_tea", "latte"] * 10
+
+    CM = CoffeeMachine(num_outlets, beverages, total_items_qty,
+        locking="ingredient")
+    CM.makeOrder(orders)
+
+    assert CM.raw_material_qty["milk"] == 0
+    assert CM.raw_material_qty["water"] == 0
+
+
+def test_makeOrder_ingredient_locking_insufficient():
+    """ Test to see if drinks short on ingredients are refilled and made
+    in ingredient locking mode.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 2
+    beverages = {"hot_tea":{"milk":2}}
+    total_items_qty = {"milk":3}
+    orders = ["hot_tea"] * 3
+
+    CM = CoffeeMachine(num_outlets, beverages, total_items_qty,
+        locking="ingredient")
+    CM.makeOrder(orders)
+
+    assert CM.raw_material_qty["milk"] == 0
+
+
+def test_locking_pours_concurrent():
+    """ Test to see if drinks pour at the same time in every locking mode,
+    even drinks sharing an ingredient, since locks are only held while the
+    ingredients are taken out.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 2
+    beverages = {"green_tea":{"green_mixture":1, "milk":1},
+        "black_tea":{"tea":1, "milk":1}}
+    total_items_qty = {"green_mixture":1, "tea":1, "milk":2}
+    orders = ["green_tea", "black_tea"]
+
+    for locking in ["global", "ingredient", "optimistic"]:
+        clock = OverlapClock(2)
+        CM = CoffeeMachine(num_outlets, beverages, dict(total_items_qty),
+            locking=locking, pour_time=0.2, clock=clock)
+        CM.makeOrder(orders)
+
+        assert clock.most_pouring == 2
+        assert CM.raw_material_qty["milk"] == 0
+
+
+def test_makeOrder_virtual_makespan():
+    """ Test to see if an order takes as long on outlet threads as the
+    virtual clock says it does, in every locking mode.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 2
+    beverages = {"hot_tea":{"milk":1}}
+    total_items_qty = {"milk":4}
+    orders = ["hot_tea"] * 4
+
+    for locking in ["global", "ingredient", "optimistic"]:
+        makespans = []
+
+        for clock in [VirtualClock(), RealClock()]:
+            CM = CoffeeMachine(num_outlets, beverages, dict(total_items_qty),
+                locking=locking, pour_time=0.2, clock=clock,
+                event_sink=MemorySink())
+            makespans.append(max(result.wait + result.service
+                for result in CM.makeOrder(orders)))
+
+        # two rounds of pours on two outlets, where pours holding a lock
+        # would take four
+        virtual, real = makespans
+        assert virtual == pytest.approx(0.4)
+        assert virtual <= real < virtual + 0.2
+
+
+def test_refill_ingredient_locking():
+    """ Test if the refill function works in ingredient locking mode.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 1
+    beverages = {}
+    total_items_qty = {"milk":1}
+
+    CM = CoffeeMachine(num_outlets, beverages, total_items_qty,
+        locking="ingredient")
+    CM.refill("milk", 1)
+
+    assert CM.raw_material_qty["milk"] == 2
+
+
+def test_makeOrder_optimistic_locking():
+    """ Test to see if makeOrder keeps the stock right in optimistic
+    locking mode, and counts a commit per drink.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 4
+    beverages = {"hot_tea":{"milk":1, "water":2}, "black_tea":{"water":1},
+        "latte":{"milk":2}}
+    total_items_qty = {"milk":30, "water":30}
+    orders = ["hot_tea", "black_tea", "latte"] * 10
+
+    CM = CoffeeMachine(num_outlets, beverages, total_items_qty,
+        locking="optimistic")
+    CM.makeOrder(orders)
+    stats = CM.inventory.stats()
+
+    assert CM.raw_material_qty == {"milk":0, "water":0}
+    assert stats["commits"] == 30
+    assert stats["version"] == 30
+
+
+def test_makeDrink_optimistic_insufficient():
+    """ Test to see if makeDrink refills and makes a drink short on
+    ingredients in optimistic locking mode.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 1
+    beverages = {"hot_tea":{"milk":2}}
+    total_items_qty = {"milk":1}
+
+    CM = CoffeeMachine(num_outlets, beverages, total_items_qty,
+        locking="optimistic")
+    CM._CoffeeMachine__makeDrink("hot_tea", 1)
+
+    assert CM.raw_material_qty["milk"] == 0
+
+
+def test_makeDrink_optimistic_impossible():
+    """ Test to see if makeDrink commits nothing in optimistic locking
+    mode when an ingredient does not exist.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 1
+    beverages = {"hot_tea":{"cocoa":2}}
+    total_items_qty = {"milk":1}
+
+    CM = CoffeeMachine(num_outlets, beverages, total_items_qty,
+        locking="optimistic")
+    CM._CoffeeMachine__makeDrink("hot_tea", 1)
+
+    assert CM.raw_material_qty["milk"] == 1
+    assert CM.inventory.stats()["commits"] == 0
+
+
+def test_refill_optimistic_locking():
+    """ Test if the refill function works in optimistic locking mode,
+    without changing the dict the machine was given.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 1
+    beverages = {}
+    total_items_qty = {"milk":1}
+
+    CM = CoffeeMachine(num_outlets, beverages, total_items_qty,
+        locking="optimistic")
+    CM.refill("milk", 1)
+
+    assert CM.raw_material_qty["milk"] == 2
+    assert total_items_qty["milk"] == 1
+
+    with pytest.raises(ValueError, match="Cannot add because final quantity"):
+        CM.refill("milk", -3)
+
+
+def test_makeDrink_events_possible():
+    """ Test to see if makeDrink emits the events of a drink that can be
+    made.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 1
+    beverages = {"hot_tea":{"milk":1}}
+    total_items_qty = {"milk":2}
+    sink = MemorySink()
+
+    CM = CoffeeMachine(num_outlets, beverages, total_items_qty,
+        event_sink=sink)
+    CM._CoffeeMachine__makeDrink("hot_tea", 1)
+    CM.events.flush()
+
+    assert sink.kinds() == ["prepared", "poured"]
+    assert sink.events[0].details == {"status":1}
+
+
+def test_makeDrink_events_insufficient():
+    """ Test to see if makeDrink emits the events of a drink that had to
+    be refilled.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 1
+    beverages = {"hot_tea":{"milk":2, "water":1}}
+    total_items_qty = {"milk":1, "water":1}
+    sink = MemorySink()
+
+    CM = CoffeeMachine(num_outlets, beverages, total_items_qty,
+        event_sink=sink)
+    CM._CoffeeMachine__makeDrink("hot_tea", 1)
+    CM.events.flush()
+
+    assert sink.kinds() == ["prepared", "insufficient", "refilled", "poured"]
+    assert sink.events[1].details == {"ingredients":["milk"], "amounts":[1]}
+
+
+def test_makeDrink_events_impossible():
+    """ Test to see if makeDrink emits the events of a drink that cannot
+    be made.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 1
+    beverages = {"hot_tea":{"cocoa":2}}
+    total_items_qty = {"milk":1}
+    sink = MemorySink()
+
+    CM = CoffeeMachine(num_outlets, beverages, total_items_qty,
+        event_sink=sink)
+    CM._CoffeeMachine__makeDrink("hot_tea", 1)
+    CM.events.flush()
+
+    assert sink.kinds() == ["prepared", "unavailable"]
+    assert sink.events[1].details == {"ingredients":["cocoa"]}
+
+
+def test_makeOrder_events_flushed():
+    """ Test to see if every event of an order is written by the time
+    makeOrder returns.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 3
+    beverages = {"hot_tea":{"milk":1}}
+    total_items_qty = {"milk":10}
+    orders = ["hot_tea"] * 10
+    sink = MemorySink()
+
+    CM = CoffeeMachine(num_outlets, beverages, total_items_qty,
+        event_sink=sink)
+    CM.makeOrder(orders)
+
+    assert len(sink.events) == 20
+
+    for i in range(10):
+        assert sink.kinds(i) == ["prepared", "poured"]
+
+
+def test_compileRecipes():
+    """ Test to see if recipes are compiled to vectors indexed by
+    ingredient ID, and drinks missing an ingredient are picked out.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 1
+    beverages = {"hot_tea":{"water":2, "milk":1}, "cocoa":{"cocoa":1,
+        "milk":1}}
+    total_items_qty = {"milk":2, "sugar":1, "water":3}
+
+    CM = CoffeeMachine(num_outlets, beverages, total_items_qty)
+
+    assert CM.ingredients == ["milk", "sugar", "water"]
+    assert CM.levels == [2, 1, 3]
+    assert CM.recipe_vectors == {"hot_tea":(1, 0, 2)}
+    assert CM.recipe_ids == {"hot_tea":(2, 0)}
+    assert CM.missing_ingredients == {"hot_tea":[], "cocoa":["cocoa"]}
+
+
+def test_raw_material_qty_read_only():
+    """ Test to see if the raw material view cannot be written to, and is
+    left out of sync with the dict given to the machine.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 1
+    beverages = {"hot_tea":{"milk":1}}
+    total_items_qty = {"milk":2}
+
+    CM = CoffeeMachine(num_outlets, beverages, total_items_qty)
+    CM.makeOrder("hot_tea")
+
+    assert total_items_qty["milk"] == 2
+
+    with pytest.raises(TypeError):
+        CM.raw_material_qty["milk"] = 5
+
+
+def test_takeIngredients_insufficient_order():
+    """ Test to see if insufficient ingredients are reported in recipe
+    order, and refilled by just what is missing.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 1
+    beverages = {"hot_tea":{"water":4, "milk":3, "sugar":1}}
+    total_items_qty = {"milk":1, "sugar":1, "water":2}
+
+    CM = CoffeeMachine(num_outlets, beverages, total_items_qty)
+    new_levels, outcome = CM._CoffeeMachine__takeIngredients("hot_tea",
+        CM.levels)
+
+    assert new_levels == (0, 0, 0)
+    assert outcome == (0, ["water", "milk"], [2, 2], [])
+
+
+def test_planOrder_all_makeable():
+    """ Test to see if planOrder finds every order makeable when there is
+    enough of everything, without changing the levels.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 1
+    beverages = {"hot_tea":{"milk":1, "water":2}, "black_tea":{"water":1}}
+    total_items_qty = {"milk":5, "water":10}
+    orders = ["hot_tea", "black_tea", "hot_tea"]
+
+    CM = CoffeeMachine(num_outlets, beverages, total_items_qty)
+    plan = CM.planOrder(orders)
+
+    assert plan.prefix == 3
+    assert plan.makeable == [0, 1, 2]
+    assert plan.short == []
+    assert plan.unavailable == []
+    assert plan.shortfall == {}
+    assert plan.remaining == {"milk":3, "water":5}
+    assert CM.raw_material_qty == {"milk":5, "water":10}
+
+
+def test_planOrder_short():
+    """ Test to see if planOrder skips orders that no longer fit, keeps
+    making the ones that still do, and adds up the total shortfall.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 1
+    beverages = {"hot_tea":{"milk":2, "water":1}, "black_tea":{"water":1}}
+    total_items_qty = {"milk":3, "water":3}
+    orders = ["hot_tea", "hot_tea", "black_tea", "hot_tea", "black_tea"]
+
+    CM = CoffeeMachine(num_outlets, beverages, total_items_qty)
+    plan = CM.planOrder(orders)
+
+    assert plan.prefix == 1
+    assert plan.makeable == [0, 2, 4]
+    assert plan.short == [1, 3]
+    assert plan.shortfall == {"milk":3, "water":2}
+    assert plan.remaining == {"milk":1, "water":0}
+
+
+def test_planOrder_unavailable():
+    """ Test to see if planOrder picks out orders needing an ingredient
+    the machine does not have, and ends the makeable prefix there.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 1
+    beverages = {"hot_tea":{"milk":1}, "cocoa":{"cocoa":1}}
+    total_items_qty = {"milk":5}
+    orders = ["hot_tea", "cocoa", "hot_tea"]
+
+    CM = CoffeeMachine(num_outlets, beverages, total_items_qty)
+    plan = CM.planOrder(orders)
+
+    assert plan.prefix == 1
+    assert plan.makeable == [0, 2]
+    assert plan.unavailable == [1]
+    assert plan.shortfall == {}
+
+
+def test_planOrder_order_type():
+    """ Test to see if planOrder checks the orders like makeOrder.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 1
+    beverages = {"hot_tea":{"milk":1}}
+    total_items_qty = {"milk":2}
+
+    CM = CoffeeMachine(num_outlets, beverages, total_items_qty)
+
+    with pytest.raises(ValueError, match="Orders were expected in a list."):
+        CM.planOrder({})
+
+    assert CM.planOrder("hot_tea").makeable == [0]
+
+
+def test_planOrder_large_batch():
+    """ Test to see if planOrder handles a large batch in one pass.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 1
+    beverages = {"hot_tea":{"milk":1}, "black_tea":{"water":1}}
+    total_items_qty = {"milk":100, "water":10000}
+    orders = ["hot_tea", "black_tea"] * 5000
+
+    CM = CoffeeMachine(num_outlets, beverages, total_items_qty)
+    plan = CM.planOrder(orders)
+
+    assert plan.prefix == 200
+    assert len(plan.makeable) == 5100
+    assert len(plan.short) == 4900
+    assert plan.shortfall == {"milk":4900}
+
+
+def test_makeOrder_plan_skips_unavailable():
+    """ Test to see if makeOrder with a plan reports unavailable orders
+    without handing them to an outlet.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 1
+    beverages = {"hot_tea":{"milk":1}, "cocoa":{"cocoa":1}}
+    total_items_qty = {"milk":5}
+    orders = ["hot_tea", "cocoa", "hot_tea"]
+    sink = MemorySink()
+
+    CM = CoffeeMachine(num_outlets, beverages, total_items_qty,
+        event_sink=sink)
+    CM.makeOrder(orders, plan=True)
+
+    assert CM.plan.unavailable == [1]
+    assert CM.scheduler.stats()["admitted"] == 2
+    assert sink.kinds(1) == ["prepared", "unavailable"]
+    assert CM.raw_material_qty["milk"] == 3
+
+
+def test_makeDrinkAsync_functionality():
+    """ Test to see if a drink can be made from a coroutine.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 1
+    beverages = {"hot_tea":{"milk":2}, "cocoa":{"cocoa":1}}
+    total_items_qty = {"milk":3}
+    sink = MemorySink()
+
+    CM = CoffeeMachine(num_outlets, beverages, total_items_qty,
+        event_sink=sink)
+
+    assert asyncio.run(CM.makeDrinkAsync("hot_tea", 1)).status == 1
+
+    result = asyncio.run(CM.makeDrinkAsync("hot_tea", 2))
+
+    assert result.drink_ID == 2
+    assert result.status == 0
+    assert result.refilled == {"milk":1}
+
+    assert asyncio.run(CM.makeDrinkAsync("cocoa", 3)).missing == ["cocoa"]
+
+    CM.events.flush()
+
+    assert CM.raw_material_qty["milk"] == 0
+    assert sink.kinds(2) == ["prepared", "insufficient", "refilled", "poured"]
+    assert sink.kinds(3) == ["prepared", "unavailable"]
+
+
+def test_makeDrinkAsync_recipe_unknown():
+    """ Test to see if makeDrinkAsync works when drink recipe is not known.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 1
+    beverages = {}
+    total_items_qty = {}
+
+    CM = CoffeeMachine(num_outlets, beverages, total_items_qty)
+
+    with pytest.raises(ValueError, match="Drink recipe is not known."):
+        asyncio.run(CM.makeDrinkAsync("hot_tea"))
+
+    with pytest.raises(ValueError, match="Drink name is not a string."):
+        asyncio.run(CM.makeDrinkAsync(1))
+
+
+def test_makeOrderAsync_functionality():
+    """ Test to see if makeOrderAsync yields every drink of an order, in
+    the order they are done.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 2
+    beverages = {"hot_tea":{"milk":1}}
+    total_items_qty = {"milk":1000}
+    orders = ["hot_tea"] * 1000
+
+    CM = CoffeeMachine(num_outlets, beverages, total_items_qty,
+        locking="optimistic", event_sink=MemorySink())
+
+    async def collect():
+        return [result async for result in CM.makeOrderAsync(orders)]
+
+    results = asyncio.run(collect())
+
+    assert sorted(result.drink_ID for result in results) == list(range(1000))
+    assert all(result.status == 1 for result in results)
+    assert CM.raw_material_qty["milk"] == 0
+
+
+def test_makeOrderAsync_outlets_bounded():
+    """ Test to see if no more drinks pour at once than there are outlets.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 2
+    beverages = {"hot_tea":{"milk":1}}
+    total_items_qty = {"milk":4}
+    orders = ["hot_tea"] * 4
+
+    CM = CoffeeMachine(num_outlets, beverages, total_items_qty,
+        pour_time=0.1, event_sink=MemorySink())
+
+    async def collect():
+        return [result async for result in CM.makeOrderAsync(orders)]
+
+    results = asyncio.run(collect())
+    CM.events.flush()
+
+    # drinks pouring at once, from the events in the order they were
+    # emitted on the event loop
+    pouring = 0
+    most_pouring = 0
+    for kind in CM.events.sink.kinds():
+        if kind == "prepared":
+            pouring += 1
+        elif kind == "poured":
+            pouring -= 1
+        most_pouring = max(most_pouring, pouring)
+
+    assert len(results) == 4
+    assert most_pouring == 2
+
+
+def test_makeOrderAsync_makespan():
+    """ Test to see if an order takes as long on the event loop as on the
+    virtual clock, and so on outlet threads, in every locking mode.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 2
+    beverages = {"hot_tea":{"milk":1}}
+    total_items_qty = {"milk":4}
+    orders = ["hot_tea"] * 4
+
+    async def collect(CM):
+        return [result async for result in CM.makeOrderAsync(orders)]
+
+    for locking in ["global", "ingredient", "optimistic"]:
+        virtual = CoffeeMachine(num_outlets, beverages,
+            dict(total_items_qty), locking=locking, pour_time=0.2,
+            clock=VirtualClock(), event_sink=MemorySink())
+        CM = CoffeeMachine(num_outlets, beverages, dict(total_items_qty),
+            locking=locking, pour_time=0.2, event_sink=MemorySink())
+
+        expected = max(result.wait + result.service
+            for result in virtual.makeOrder(orders))
+        makespan = max(result.wait + result.service
+            for result in asyncio.run(collect(CM)))
+
+        assert expected <= makespan < expected + 0.2
+
+
+def test_makeOrderAsync_stop_early():
+    """ Test to see if drinks not yet done are called off when the caller
+    stops reading results.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 1
+    beverages = {"hot_tea":{"milk":1}}
+    total_items_qty = {"milk":10}
+    orders = ["hot_tea"] * 10
+
+    CM = CoffeeMachine(num_outlets, beverages, total_items_qty,
+        pour_time=0.01, event_sink=MemorySink())
+
+    async def first():
+        results = CM.makeOrderAsync(orders)
+        result = await results.__anext__()
+        await results.aclose()
+        await asyncio.sleep(0.05)
+        return result
+
+    assert asyncio.run(first()).status == 1
+    assert CM.raw_material_qty["milk"] > 5
+
+
+def test_makeOrder_file_input():
+    """ Test to see if makeOrder takes an open file with one drink per
+    line, skipping blank lines.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 3
+    beverages = {"hot_tea":{"milk":1}, "black_tea":{"water":1}}
+    total_items_qty = {"milk":200, "water":200}
+
+    CM = CoffeeMachine(num_outlets, beverages, total_items_qty,
+        event_sink=MemorySink())
+
+    with open("test_data/stream_orders.txt") as orders:
+        CM.makeOrder(orders)
+
+    assert CM.raw_material_qty == {"milk":198, "water":199}
+    assert CM.scheduler.stats()["admitted"] == 3
+
+
+def test_makeOrder_generator_lazy():
+    """ Test to see if makeOrder takes drinks from a generator only as
+    fast as the outlets pick them up, keeping few drinks in memory.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 1
+    beverages = {"hot_tea":{"milk":1}}
+    total_items_qty = {"milk":100}
+    taken = []
+
+    def feed():
+        for i in range(20):
+            taken.append(i)
+            yield "hot_tea"
+
+    CM = CoffeeMachine(num_outlets, beverages, total_items_qty,
+        queue_size=2, pour_time=0.01, event_sink=MemorySink())
+    CM.start()
+
+    thread = threading.Thread(target=CM.makeOrder, args=(feed(),))
+    thread.start()
+    time.sleep(0.05)
+
+    # the outlet is only a few drinks in, so the feed must be too
+    assert len(taken) < 12
+    assert CM.scheduler.stats()["max_queue_depth"] <= 2
+
+    thread.join()
+    CM.shutdown()
+
+    assert len(taken) == 20
+    assert CM.raw_material_qty["milk"] == 80
+
+
+def test_makeOrder_stream_checked_per_item():
+    """ Test to see if a bad drink in a stream is caught when it comes
+    up, after the drinks before it are made.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 1
+    beverages = {"hot_tea":{"milk":1}}
+    total_items_qty = {"milk":5}
+    orders = iter(["hot_tea", "hot_tea", "coffee", "hot_tea"])
+
+    CM = CoffeeMachine(num_outlets, beverages, total_items_qty,
+        event_sink=MemorySink())
+
+    with pytest.raises(ValueError, match="for ordered drink is not known."):
+        CM.makeOrder(orders)
+
+    assert CM.raw_material_qty["milk"] == 3
+    assert next(orders) == "hot_tea"
+
+
+def test_makeOrder_not_iterable():
+    """ Test to see if makeOrder refuses orders that cannot be gone
+    through in order.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 1
+    beverages = {"hot_tea":{"milk":1}}
+    total_items_qty = {"milk":2}
+
+    CM = CoffeeMachine(num_outlets, beverages, total_items_qty)
+
+    with pytest.raises(ValueError, match="list or other iterable"):
+        CM.makeOrder(5)
+
+    with pytest.raises(ValueError, match="list or other iterable"):
+        CM.makeOrder({"hot_tea"})
+
+
+def test_makeOrder_plan_stream():
+    """ Test to see if makeOrder can plan orders given as a generator.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 1
+    beverages = {"hot_tea":{"milk":1}}
+    total_items_qty = {"milk":5}
+
+    CM = CoffeeMachine(num_outlets, beverages, total_items_qty,
+        event_sink=MemorySink())
+    CM.makeOrder(("hot_tea" for i in range(3)), plan=True)
+
+    assert CM.plan.makeable == [0, 1, 2]
+    assert CM.raw_material_qty["milk"] == 2
+
+
+def test_makeOrder_results():
+    """ Test to see if makeOrder returns the result of every drink, in
+    order.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 2
+    beverages = {"hot_tea":{"milk":2, "water":1}, "cocoa":{"cocoa":1}}
+    total_items_qty = {"milk":3, "water":5}
+    orders = ["hot_tea", "cocoa", "hot_tea"]
+
+    CM = CoffeeMachine(num_outlets, beverages, total_items_qty,
+        event_sink=MemorySink())
+    results = CM.makeOrder(orders)
+
+    assert [result.drink_ID for result in results] == [0, 1, 2]
+    assert [result.drink_name for result in results] == orders
+    assert results[1].status == -1
+    assert results[1].missing == ["cocoa"]
+    assert results[1].shortfall == {}
+
+    # one of the hot teas finds the milk short
+    statuses = sorted([results[0].status, results[2].status])
+    short = [result for result in results if result.status == 0][0]
+
+    assert statuses == [0, 1]
+    assert short.shortfall == {"milk":1}
+    assert short.refilled == {"milk":1}
+
+
+def test_makeOrder_results_timings():
+    """ Test to see if the results of makeOrder time the wait for an
+    outlet and the time spent on it.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 1
+    beverages = {"hot_tea":{"milk":1}}
+    total_items_qty = {"milk":5}
+    orders = ["hot_tea", "hot_tea"]
+
+    CM = CoffeeMachine(num_outlets, beverages, total_items_qty,
+        pour_time=30, event_sink=MemorySink(), clock=VirtualClock())
+    results = CM.makeOrder(orders)
+
+    assert [result.service for result in results] == [30, 30]
+    assert [result.wait for result in results] == [0, 30]
+
+
+def test_makeOrder_zero_len_results():
+    """ Test to see if makeOrder returns no results for no orders.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 1
+    beverages = {"hot_tea":{"milk":1}}
+    total_items_qty = {"milk":2}
+
+    CM = CoffeeMachine(num_outlets, beverages, total_items_qty)
+
+    assert CM.makeOrder([]) == []
+
+
+def test_makeOrder_plan_results():
+    """ Test to see if orders skipped by the plan still get a result.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 1
+    beverages = {"hot_tea":{"milk":1}, "cocoa":{"cocoa":1}}
+    total_items_qty = {"milk":5}
+    orders = ["cocoa", "hot_tea"]
+
+    CM = CoffeeMachine(num_outlets, beverages, total_items_qty,
+        event_sink=MemorySink())
+    results = CM.makeOrder(orders, plan=True)
+
+    assert [result.status for result in results] == [-1, 1]
+    assert results[0].service == 0
+
+
+def test_streamOrder_in_order():
+    """ Test to see if streamOrder yields results in order, from an
+    endless feed, for as long as they are read.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 3
+    beverages = {"hot_tea":{"milk":1}}
+    total_items_qty = {"milk":1000}
+
+    def feed():
+        while True:
+            yield "hot_tea"
+
+    CM = CoffeeMachine(num_outlets, beverages, total_items_qty,
+        event_sink=MemorySink())
+    results = CM.streamOrder(feed())
+
+    for i in range(50):
+        assert next(results).drink_ID == i
+
+    results.close()
+
+    assert CM.workers == []
+    assert CM.scheduler.stats()["busy"] == 0
+
+
+def test_streamOrder_virtual_stop_early():
+    """ Test to see if drinks left in the line of an order simulated on a
+    virtual clock, when the caller stops early, are never made by the next
+    order.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 1
+    beverages = {"a":{"m":1}, "b":{"m":1}}
+    total_items_qty = {"m":100}
+
+    CM = CoffeeMachine(num_outlets, beverages, total_items_qty,
+        event_sink=MemorySink(), clock=VirtualClock(), pour_time=1)
+
+    stream = CM.streamOrder(["a"] * 3)
+    assert next(stream).drink_name == "a"
+    stream.close()
+
+    results = CM.makeOrder(["b", "b"])
+
+    assert [result.drink_name for result in results] == ["b", "b"]
+    assert [result.drink_ID for result in results] == [0, 1]
+    assert CM.raw_material_qty["m"] == 97
+
+
+def test_streamOrder_slow_feed():
+    """ Test to see if a drink is yielded as soon as it is done, without
+    waiting for the next order to come.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 1
+    beverages = {"hot_tea":{"milk":1}}
+    total_items_qty = {"milk":10}
+
+    # the second order only comes once the first drink is handed back
+    handed_back = threading.Event()
+    waited = []
+
+    def feed():
+        yield "hot_tea"
+        waited.append(handed_back.wait(5))
+        yield "hot_tea"
+
+    CM = CoffeeMachine(num_outlets, beverages, total_items_qty,
+        event_sink=MemorySink())
+    results = CM.streamOrder(feed())
+
+    assert next(results).drink_ID == 0
+    handed_back.set()
+
+    assert next(results).drink_ID == 1
+    assert list(results) == []
+    assert waited == [True]
+
+
+def test_streamOrder_bad_order():
+    """ Test to see if drinks read before an unknown drink are handed back
+    before its error is raised.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 2
+    beverages = {"hot_tea":{"milk":1}}
+    total_items_qty = {"milk":10}
+
+    CM = CoffeeMachine(num_outlets, beverages, total_items_qty,
+        event_sink=MemorySink())
+    results = CM.streamOrder(["hot_tea", "hot_tea", "mocha"])
+
+    assert [next(results).drink_ID for i in range(2)] == [0, 1]
+
+    with pytest.raises(ValueError, match="Drink recipe for ordered"):
+        next(results)
+
+    assert CM.workers == []
+
+
+def test_checkOptions_pour_times_type():
+    """ Test to check if pour times not in a dict are handled correctly.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 1
+    beverages = {"hot_tea":{"milk":1}}
+    total_items_qty = {"milk":2}
+
+    with pytest.raises(ValueError, match="Pour times are not a dict."):
+        CM = CoffeeMachine(num_outlets, beverages, total_items_qty,
+            pour_times=[1])
+
+
+def test_checkOptions_pour_times_drink():
+    """ Test to check if pour times of unknown drinks are handled correctly.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 1
+    beverages = {"hot_tea":{"milk":1}}
+    total_items_qty = {"milk":2}
+
+    with pytest.raises(ValueError, match="Drink in pour times is not known."):
+        CM = CoffeeMachine(num_outlets, beverages, total_items_qty,
+            pour_times={"cocoa":1})
+
+
+def test_checkOptions_pour_times_negative():
+    """ Test to check if pour times of drinks make semantic sense.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 1
+    beverages = {"hot_tea":{"milk":1}}
+    total_items_qty = {"milk":2}
+
+    with pytest.raises(ValueError, match="Pour time cannot be less than 0."):
+        CM = CoffeeMachine(num_outlets, beverages, total_items_qty,
+            pour_times={"hot_tea":-1})
+
+
+def test_checkOptions_clock_type():
+    """ Test to check if a clock without now, sleep or virtual is handled
+    correctly.
+    """
+
+    class PlainClock:
+        """ Clock with now and sleep, but no virtual attribute. """
+
+        def now(self):
+            return 0
+
+        def sleep(self, seconds):
+            pass
+
+    # assign data to pass to coffee machine
+    num_outlets = 1
+    beverages = {"hot_tea":{"milk":1}}
+    total_items_qty = {"milk":2}
+
+    with pytest.raises(ValueError, match="Clock has no now or sleep method."):
+        CM = CoffeeMachine(num_outlets, beverages, total_items_qty,
+            clock="hello")
+
+    with pytest.raises(ValueError, match="Clock does not say if it is"):
+        CM = CoffeeMachine(num_outlets, beverages, total_items_qty,
+            clock=PlainClock())
+
+
+def test_makeOrder_pour_times():
+    """ Test to see if each drink pours for its own pour time.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 2
+    beverages = {"hot_tea":{"milk":1}, "espresso":{"beans":1}}
+    total_items_qty = {"milk":5, "beans":5}
+    orders = ["hot_tea", "espresso"]
+
+    CM = CoffeeMachine(num_outlets, beverages, total_items_qty,
+        pour_time=10, event_sink=MemorySink(), pour_times={"espresso":200},
+        clock=VirtualClock())
+    results = CM.makeOrder(orders)
+
+    assert [result.service for result in results] == [10, 200]
+
+
+def test_makeOrder_virtual_clock():
+    """ Test to see if an order on a virtual clock gets exact timings
+    without taking any real time.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 2
+    beverages = {"hot_tea":{"milk":1}, "espresso":{"beans":1},
+        "cocoa":{"cocoa":1}}
+    total_items_qty = {"milk":5, "beans":5}
+    orders = ["espresso", "hot_tea", "cocoa", "hot_tea", "hot_tea"]
+
+    clock = VirtualClock()
+    CM = CoffeeMachine(num_outlets, beverages, total_items_qty,
+        pour_time=30, event_sink=MemorySink(), clock=clock,
+        pour_times={"espresso":90})
+
+    start = time.monotonic()
+    results = CM.makeOrder(orders)
+
+    assert time.monotonic() - start < 1
+    assert [result.wait for result in results] == [0, 0, 30, 30, 60]
+    assert [result.service for result in results] == [90, 30, 0, 30, 30]
+    assert clock.now() == 90
+    assert CM.events.sink.kinds(2) == ["prepared", "unavailable"]
+    assert CM.returnIngredientLevel() == {"milk":2, "beans":4}
+
+
+def test_makeOrder_virtual_clock_day():
+    """ Test to see if a day of drinks at real pour times is simulated
+    quickly, giving exact outlet utilization.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 4
+    beverages = {"hot_tea":{"milk":1}, "espresso":{"beans":1}}
+    total_items_qty = {"milk":10000, "beans":10000}
+    orders = (["espresso"] * 4 + ["hot_tea"] * 8) * 500
+
+    clock = VirtualClock()
+    CM = CoffeeMachine(num_outlets, beverages, total_items_qty,
+        event_sink=MemorySink(), clock=clock,
+        pour_times={"hot_tea":20, "espresso":40})
+
+    results = CM.makeOrder(orders)
+    busy = sum(result.service for result in results)
+
+    # every outlet ends up pouring the same mix of drinks
+    assert clock.now() == 500 * (40 + 2 * 20)
+    assert busy / (clock.now() * num_outlets) == 1.0
+    assert all(result.status == 1 for result in results)
+
+
+def test_start_virtual_clock():
+    """ Test to see if outlet threads are refused on a virtual clock.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 1
+    beverages = {"hot_tea":{"milk":1}}
+    total_items_qty = {"milk":2}
+
+    CM = CoffeeMachine(num_outlets, beverages, total_items_qty,
+        clock=VirtualClock())
+
+    with pytest.raises(ValueError,
+        match="Outlet threads cannot run on a virtual clock."):
+        CM.start()
+
+
+def test_makeOrder_order_checks():
+    """ Test to see if orders with a bad priority or deadline are handled
+    correctly.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 1
+    beverages = {"hot_tea":{"milk":1}}
+    total_items_qty = {"milk":5}
+
+    CM = CoffeeMachine(num_outlets, beverages, total_items_qty,
+        event_sink=MemorySink())
+
+    with pytest.raises(ValueError, match="Priority of order is not an integer."):
+        CM.makeOrder([Order("hot_tea", "high")])
+
+    with pytest.raises(ValueError,
+        match="Deadline of order is not a number of at least 0."):
+        CM.makeOrder([Order("hot_tea", deadline="soon")])
+
+
+def test_makeOrder_priority_threads():
+    """ Test to see if orders with a priority are made on the outlet
+    threads, mixed with plain drink names.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 2
+    beverages = {"hot_tea":{"milk":1}, "hot_water":{"water":1}}
+    total_items_qty = {"milk":5, "water":5}
+    orders = ["hot_tea", Order(" hot_water ", 1, 10), "hot_tea"]
+
+    CM = CoffeeMachine(num_outlets, beverages, total_items_qty,
+        event_sink=MemorySink(), scheduling="priority")
+    results = CM.makeOrder(orders)
+
+    assert [result.drink_name for result in results] == ["hot_tea",
+        "hot_water", "hot_tea"]
+    assert all(result.status == 1 for result in results)
+
+
+def test_makeOrder_priority_virtual_clock():
+    """ Test to see if an express drink skips the line of complex drinks
+    with the priority policy, and waits its turn without.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 1
+    beverages = {"latte":{"milk":1}, "hot_water":{"water":1}}
+    total_items_qty = {"milk":10, "water":10}
+    orders = ["latte"] * 5 + [Order("hot_water", priority=1)]
+
+    waits = {}
+    for scheduling in ["fifo", "priority"]:
+        CM = CoffeeMachine(num_outlets, beverages, dict(total_items_qty),
+            queue_size=10, event_sink=MemorySink(), clock=VirtualClock(),
+            pour_times={"latte":60, "hot_water":5}, scheduling=scheduling)
+        results = CM.makeOrder(orders)
+
+        # results stay in the order they were given
+        assert [result.drink_ID for result in results] == list(range(6))
+        waits[scheduling] = [result.wait for result in results]
+
+    assert waits["fifo"] == [0, 60, 120, 180, 240, 300]
+    assert waits["priority"] == [5, 65, 125, 185, 245, 0]
+
+
+def test_makeOrder_batch_type():
+    """ Test to see if a bad batch size is handled correctly.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 1
+    beverages = {"hot_tea":{"milk":1}}
+    total_items_qty = {"milk":5}
+
+    CM = CoffeeMachine(num_outlets, beverages, total_items_qty,
+        event_sink=MemorySink())
+
+    with pytest.raises(ValueError,
+        match="Batch size is not an integer more than 0."):
+        CM.makeOrder(["hot_tea"], batch=0)
+
+
+def test_makeOrder_batch_coalesced():
+    """ Test to see if identical drinks are handed to the outlets in
+    batches, with every result still in order.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 2
+    beverages = {"hot_tea":{"milk":1, "water":1}, "coffee":{"beans":1}}
+    total_items_qty = {"milk":10, "water":10, "beans":10}
+    orders = ["hot_tea", "coffee", "hot_tea", "hot_tea", "hot_tea"]
+
+    for locking in CoffeeMachine.LOCKING_MODES:
+        CM = CoffeeMachine(num_outlets, beverages, dict(total_items_qty),
+            locking=locking, event_sink=MemorySink())
+        results = CM.makeOrder(orders, batch=3)
+
+        assert [result.drink_name for result in results] == orders
+        assert [result.drink_ID for result in results] == list(range(5))
+        assert all(result.status == 1 for result in results)
+        assert CM.scheduler.stats()["admitted"] == 3
+        assert CM.returnIngredientLevel() == {"milk":6, "water":6, "beans":9}
+        assert CM.events.sink.kinds().count("poured") == 5
+
+
+def test_makeOrder_batch_spread():
+    """ Test to see if a drink ordered many times is batched no more than
+    its share of the outlets, so batching never keeps outlets idle.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 4
+    beverages = {"hot_tea":{"milk":1}, "coffee":{"beans":1}}
+    total_items_qty = {"milk":8, "beans":2}
+    orders = ["hot_tea"] * 8 + ["coffee"] * 2
+
+    for batch in [None, 2, 8]:
+        CM = CoffeeMachine(num_outlets, beverages, dict(total_items_qty),
+            event_sink=MemorySink(), clock=VirtualClock(), pour_time=1)
+        results = CM.makeOrder(orders, batch=batch)
+
+        assert max(result.wait + result.service for result in results) == 3
+        assert all(result.status == 1 for result in results)
+
+
+def test_makeOrder_batch_short():
+    """ Test to see if a batch the levels cannot hold is made drink by
+    drink, as the drinks would be made one after another.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 1
+    beverages = {"hot_tea":{"milk":2, "water":1}, "cocoa":{"cocoa":1}}
+    total_items_qty = {"milk":3, "water":5}
+    orders = ["hot_tea", "cocoa", "hot_tea", "cocoa"]
+
+    CM = CoffeeMachine(num_outlets, beverages, total_items_qty,
+        locking="optimistic", event_sink=MemorySink())
+    results = CM.makeOrder(orders, batch=4)
+
+    assert [result.status for result in results] == [1, -1, 0, -1]
+    assert results[2].shortfall == {"milk":1}
+    assert results[3].missing == ["cocoa"]
+    assert CM.returnIngredientLevel() == {"milk":0, "water":3}
+
+
+def test_makeOrder_batch_shortest_first():
+    """ Test to see if batches that are quickest to pour are made first.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 1
+    beverages = {"latte":{"milk":1}, "hot_water":{"water":1}}
+    total_items_qty = {"milk":10, "water":10}
+    orders = ["latte", "hot_water", "latte", "hot_water"]
+
+    CM = CoffeeMachine(num_outlets, beverages, total_items_qty,
+        event_sink=MemorySink(), clock=VirtualClock(),
+        pour_times={"latte":60, "hot_water":5})
+    results = CM.makeOrder(orders, batch=2)
+
+    assert [result.wait for result in results] == [10, 0, 10, 0]
+    assert [result.service for result in results] == [120, 10, 120, 10]
+
+
+def test_makeOrder_batch_plan():
+    """ Test to see if orders skipped by the plan are left out of the
+    batches.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 1
+    beverages = {"hot_tea":{"milk":1}, "cocoa":{"cocoa":1}}
+    total_items_qty = {"milk":5}
+    orders = ["cocoa", "hot_tea", "cocoa", "hot_tea"]
+
+    CM = CoffeeMachine(num_outlets, beverages, total_items_qty,
+        event_sink=MemorySink())
+    results = CM.makeOrder(orders, plan=True, batch=2)
+
+    assert [result.status for result in results] == [-1, 1, -1, 1]
+    assert CM.scheduler.stats()["admitted"] == 1
+
+
+def test_reserve_held():
+    """ Test to see if reserve takes the ingredients of the whole group
+    out of the levels at once, in every locking mode.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 2
+    beverages = {"hot_tea":{"milk":1, "water":2}, "latte":{"milk":2}}
+    total_items_qty = {"milk":5, "water":5, "sugar":1}
+    orders = ["hot_tea", "latte", "hot_tea"]
+
+    for locking in ["global", "ingredient", "optimistic"]:
+        CM = CoffeeMachine(num_outlets, beverages, dict(total_items_qty),
+            locking=locking, event_sink=MemorySink())
+        reservation = CM.reserve(orders)
+
+        assert reservation.status == "held"
+        assert reservation.amounts == {"milk":4, "water":4}
+        assert CM.returnIngredientLevel() == {"milk":1, "water":1,
+            "sugar":1}
+
+
+def test_reserve_rejected():
+    """ Test to see if a group the levels cannot hold is rejected whole,
+    leaving the levels as they were.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 2
+    beverages = {"hot_tea":{"milk":1, "water":2}, "cocoa":{"cocoa":1}}
+    total_items_qty = {"milk":5, "water":5}
+
+    CM = CoffeeMachine(num_outlets, beverages, total_items_qty,
+        event_sink=MemorySink())
+    short = CM.reserve(["hot_tea"] * 3)
+    missing = CM.reserve(["hot_tea", "cocoa"])
+
+    assert short.status == "rejected"
+    assert short.shortfall == {"water":1}
+    assert missing.status == "rejected"
+    assert missing.missing == ["cocoa"]
+    assert CM.returnIngredientLevel() == {"milk":5, "water":5}
+
+    with pytest.raises(ValueError, match="Cannot reserve an empty group"):
+        CM.reserve([])
+
+
+def test_commitReservation_parallel():
+    """ Test to see if the drinks of a committed reservation pour on
+    several outlets at the same time, without touching the levels again.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 3
+    beverages = {"hot_tea":{"milk":1}}
+    total_items_qty = {"milk":3}
+
+    clock = OverlapClock(3)
+    CM = CoffeeMachine(num_outlets, beverages, total_items_qty,
+        event_sink=MemorySink(), pour_time=0.2, clock=clock)
+    reservation = CM.reserve(["hot_tea"] * 3)
+    CM.refill("milk", 2)
+
+    results = CM.commitReservation(reservation)
+
+    assert [result.status for result in results] == [1, 1, 1]
+    assert clock.most_pouring == 3
+    assert reservation.status == "committed"
+    assert CM.returnIngredientLevel() == {"milk":2}
+
+
+def test_commitReservation_virtual_clock():
+    """ Test to see if a committed reservation is simulated on a virtual
+    clock, as an order would be.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 2
+    beverages = {"hot_tea":{"milk":1}}
+    total_items_qty = {"milk":3}
+
+    CM = CoffeeMachine(num_outlets, beverages, total_items_qty,
+        event_sink=MemorySink(), clock=VirtualClock(), pour_time=10)
+    results = CM.commitReservation(CM.reserve(["hot_tea"] * 3))
+
+    assert [result.wait for result in results] == [0, 0, 10]
+    assert CM.clock.now() == 20
+    assert CM.returnIngredientLevel() == {"milk":0}
+
+
+def test_releaseReservation():
+    """ Test to see if releasing a reservation hands the ingredients
+    back, and a reservation is closed only once.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 1
+    beverages = {"hot_tea":{"milk":1, "water":2}}
+    total_items_qty = {"milk":5, "water":5}
+
+    for locking in ["global", "ingredient", "optimistic"]:
+        CM = CoffeeMachine(num_outlets, beverages, dict(total_items_qty),
+            locking=locking, event_sink=MemorySink())
+        reservation = CM.reserve(["hot_tea", "hot_tea"])
+        CM.releaseReservation(reservation)
+
+        assert reservation.status == "released"
+        assert CM.returnIngredientLevel() == {"milk":5, "water":5}
+
+        with pytest.raises(ValueError, match="Reservation is not held."):
+            CM.releaseReservation(reservation)
+
+        with pytest.raises(ValueError, match="Reservation is not held."):
+            CM.commitReservation(CM.reserve(["hot_tea"] * 3))
+
+    with pytest.raises(ValueError, match="Reservation is not a"):
+        CM.commitReservation("hot_tea")
+
+
+def test_reserve_concurrent():
+    """ Test to see if groups reserved from many threads at once never
+    take more than the levels hold.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 1
+    beverages = {"hot_tea":{"milk":1, "water":2}, "latte":{"milk":2}}
+    total_items_qty = {"milk":100, "water":100}
+
+    for locking in ["global", "ingredient", "optimistic"]:
+        CM = CoffeeMachine(num_outlets, beverages, dict(total_items_qty),
+            locking=locking, event_sink=MemorySink())
+        reservations = []
+
+        def reserveGroups():
+            for i in range(20):
+                reservations.append(CM.reserve(["hot_tea", "latte"]))
+
+        threads = [threading.Thread(target=reserveGroups)
+            for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        held = [reservation for reservation in reservations
+            if reservation.status == "held"]
+
+        assert len(held) == 33
+        assert CM.returnIngredientLevel() == {"milk":1, "water":34}
+
+
+def test_checkOptions_refill_policy():
+    """ Test to check if an unknown refill policy is handled correctly.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 1
+    beverages = {"hot_tea":{"milk":1}}
+    total_items_qty = {"milk":1}
+
+    with pytest.raises(ValueError, match="Refill policy is not known."):
+        CM = CoffeeMachine(num_outlets, beverages, total_items_qty,
+            refill_policy="hello")
+
+
+def test_makeOrder_refill_reject():
+    """ Test to see if drinks short on ingredients are not made with the
+    "reject" refill policy, in every locking mode.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 1
+    beverages = {"hot_tea":{"milk":2, "water":1}}
+    total_items_qty = {"milk":3, "water":5}
+    orders = ["hot_tea", "hot_tea"]
+
+    for locking in ["global", "ingredient", "optimistic"]:
+        CM = CoffeeMachine(num_outlets, beverages, dict(total_items_qty),
+            locking=locking, event_sink=MemorySink(),
+            refill_policy="reject")
+        results = CM.makeOrder(orders)
+
+        assert [result.status for result in results] == [1, 0]
+        assert results[1].shortfall == {"milk":1}
+        assert results[1].refilled == {}
+        assert CM.returnIngredientLevel() == {"milk":1, "water":4}
+        assert CM.events.sink.kinds(1) == ["prepared", "insufficient"]
+
+
+def test_makeOrder_refill_reject_batch():
+    """ Test to see if a batch short on ingredients makes the drinks the
+    levels hold and rejects the rest, with the "reject" refill policy.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 1
+    beverages = {"hot_tea":{"milk":2}}
+    total_items_qty = {"milk":5}
+    orders = ["hot_tea"] * 3
+
+    CM = CoffeeMachine(num_outlets, beverages, total_items_qty,
+        event_sink=MemorySink(), refill_policy="reject")
+    results = CM.makeOrder(orders, batch=3)
+
+    assert [result.status for result in results] == [1, 1, 0]
+    assert CM.returnIngredientLevel() == {"milk":1}
+    assert CM.events.sink.kinds().count("poured") == 2
+
+
+def test_makeOrder_refill_wait():
+    """ Test to see if a drink short on ingredients waits for its refill
+    while the outlet serves other drinks, with the "wait" refill policy.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 1
+    beverages = {"latte":{"milk":2}, "hot_water":{"water":1}}
+    total_items_qty = {"milk":1, "water":5}
+    orders = ["latte", "hot_water", "hot_water"]
+
+    for locking in ["global", "ingredient", "optimistic"]:
+        CM = CoffeeMachine(num_outlets, beverages, dict(total_items_qty),
+            locking=locking, event_sink=MemorySink(), pour_time=0.05,
+            refill_policy="wait", refill_delay=0.2)
+        results = CM.makeOrder(orders)
+
+        assert [result.status for result in results] == [0, 1, 1]
+        assert results[0].refilled == {"milk":1}
+        assert CM.returnIngredientLevel() == {"milk":0, "water":3}
+        assert CM.events.sink.kinds(0) == ["insufficient", "refilled",
+            "prepared", "poured"]
+        assert CM.refills.stats()["delivered"] == 1
+
+
+def test_makeOrder_refill_wait_virtual_clock():
+    """ Test to see if a drink waiting for a refill is simulated on a
+    virtual clock, with refills done one after another.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 2
+    beverages = {"latte":{"milk":2}, "hot_water":{"water":1}}
+    total_items_qty = {"milk":0, "water":5}
+    orders = ["latte", "latte", "hot_water"]
+
+    CM = CoffeeMachine(num_outlets, beverages, total_items_qty,
+        event_sink=MemorySink(), clock=VirtualClock(), pour_time=10,
+        refill_policy="wait", refill_delay=60, refill_rate=1)
+    results = CM.makeOrder(orders)
+
+    assert [result.status for result in results] == [0, 0, 1]
+    # the hot water is served while the lattes wait for their refills
+    assert [result.wait for result in results] == [62, 124, 0]
+    assert CM.clock.now() == 134
+    assert CM.returnIngredientLevel() == {"milk":0, "water":4}
+
+
+def test_makeOrder_refill_wait_failed():
+    """ Test to see if a drink waiting for a refill that fails is failed
+    with the error, instead of being left waiting, on outlet threads, on a
+    virtual clock, and on the event loop.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 1
+    beverages = {"latte":{"milk":2}}
+    total_items_qty = {"milk":1}
+
+    def refill(ingredient, qty):
+        raise ValueError("Refill broke.")
+
+    for clock in [None, VirtualClock()]:
+        CM = CoffeeMachine(num_outlets, beverages, dict(total_items_qty),
+            event_sink=MemorySink(), clock=clock, refill_policy="wait")
+        CM.refills.refill = refill
+
+        with pytest.raises(ValueError, match="Refill broke."):
+            CM.makeOrder(["latte"])
+
+        assert CM.refills.stats()["failed"] == 1
+        assert "refilled" not in CM.events.sink.kinds()
+
+    CM = CoffeeMachine(num_outlets, beverages, dict(total_items_qty),
+        event_sink=MemorySink(), refill_policy="wait")
+    CM.refills.refill = refill
+
+    with pytest.raises(ValueError, match="Refill broke."):
+        asyncio.run(CM.makeDrinkAsync("latte"))
+
+
+def test_makeOrder_refill_wait_batch():
+    """ Test to see if a batch short on ingredients waits whole for what
+    the whole batch is short by.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 1
+    beverages = {"latte":{"milk":2}}
+    total_items_qty = {"milk":3}
+    orders = ["latte"] * 3
+
+    CM = CoffeeMachine(num_outlets, beverages, total_items_qty,
+        event_sink=MemorySink(), clock=VirtualClock(),
+        refill_policy="wait", refill_delay=5)
+    results = CM.makeOrder(orders, batch=3)
+
+    assert [result.status for result in results] == [0, 0, 0]
+    assert results[0].refilled == {"milk":3}
+    assert CM.refills.stats()["quantities"] == {"milk":3}
+    assert CM.returnIngredientLevel() == {"milk":0}
+
+
+def test_makeOrderAsync_refill_wait():
+    """ Test to see if a coroutine waiting for a refill frees its outlet
+    for other drinks meanwhile.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 1
+    beverages = {"latte":{"milk":2}, "hot_water":{"water":1}}
+    total_items_qty = {"milk":1, "water":5}
+    orders = ["latte", "hot_water"]
+
+    CM = CoffeeMachine(num_outlets, beverages, total_items_qty,
+        event_sink=MemorySink(), refill_policy="wait", refill_delay=0.2)
+
+    async def collect():
+        return [result async for result in CM.makeOrderAsync(orders)]
+
+    results = asyncio.run(collect())
+
+    assert [result.drink_name for result in results] == ["hot_water",
+        "latte"]
+    assert results[1].status == 0
+    assert results[1].refilled == {"milk":1}
+
+
+def test_checkOptions_stock():
+    """ Test to check if the low stock callback and restock quantities are
+    checked.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 1
+    beverages = {"hot_tea":{"milk":1}}
+    total_items_qty = {"milk":1}
+
+    with pytest.raises(ValueError, match="Low stock callback is not"):
+        CM = CoffeeMachine(num_outlets, beverages, total_items_qty,
+            on_low_stock="hello")
+
+    with pytest.raises(ValueError, match="Restock quantities are not"):
+        CM = CoffeeMachine(num_outlets, beverages, total_items_qty,
+            restock=["milk"])
+
+    with pytest.raises(ValueError, match="Ingredient in restock is not"):
+        CM = CoffeeMachine(num_outlets, beverages, total_items_qty,
+            restock={"water":5})
+
+    with pytest.raises(ValueError, match="Restock quantity is not"):
+        CM = CoffeeMachine(num_outlets, beverages, total_items_qty,
+            restock={"milk":0})
+
+
+def test_makeOrder_low_stock():
+    """ Test to see if an ingredient forecast to run out within the
+    horizon is reported once, with an event and the callback.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 1
+    beverages = {"latte":{"milk":2, "water":1}}
+    total_items_qty = {"milk":10, "water":100}
+    orders = ["latte"] * 4
+    low = []
+
+    CM = CoffeeMachine(num_outlets, beverages, total_items_qty,
+        event_sink=MemorySink(), clock=VirtualClock(), pour_time=10,
+        stock_window=5, stock_horizon=30,
+        on_low_stock=lambda *args: low.append(args))
+    CM.makeOrder(orders)
+
+    # two units of milk go every 10 seconds, so 6 left last 30 seconds
+    assert low == [("milk", 6, 30.0)]
+    events = [event for event in CM.events.sink.events
+        if event.kind == "low_stock"]
+    assert [event.details["ingredient"] for event in events] == ["milk"]
+
+    # the clock is 10 seconds past the last pour, so the rate has dropped
+    assert CM.stockForecast() == {"milk":pytest.approx(40 / 3),
+        "water":1280.0}
+
+
+def test_makeOrder_low_stock_restock():
+    """ Test to see if an ingredient reported low is refilled in the
+    background, so no drink is ever found short.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 1
+    beverages = {"latte":{"milk":2}}
+    total_items_qty = {"milk":10}
+    orders = ["latte"] * 20
+
+    for locking in ["global", "ingredient", "optimistic"]:
+        CM = CoffeeMachine(num_outlets, beverages, dict(total_items_qty),
+            locking=locking, event_sink=MemorySink(), clock=VirtualClock(),
+            pour_time=10, stock_window=5, stock_horizon=40,
+            restock={"milk":20}, refill_delay=15)
+        results = CM.makeOrder(orders)
+
+        assert [result.status for result in results] == [1] * 20
+        assert CM.refills.stats()["delivered"] >= 2
+
+
+def test_stockForecast_not_tracked():
+    """ Test to see if a forecast is refused when stock is not tracked.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 1
+    beverages = {"latte":{"milk":2}}
+    total_items_qty = {"milk":10}
+
+    CM = CoffeeMachine(num_outlets, beverages, total_items_qty)
+
+    with pytest.raises(ValueError, match="Stock is not tracked"):
+        CM.stockForecast()
+
+
+def test_availableMenu():
+    """ Test to see if the menu follows the levels as drinks are made and
+    ingredients refilled, in every locking mode.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 2
+    beverages = {"latte":{"milk":2}, "hot_tea":{"milk":1, "water":1},
+        "cocoa":{"cocoa":1}}
+    total_items_qty = {"milk":5, "water":1}
+
+    for locking in ["global", "ingredient", "optimistic"]:
+        CM = CoffeeMachine(num_outlets, beverages, dict(total_items_qty),
+            locking=locking, event_sink=MemorySink())
+
+        assert CM.availableMenu() == ("latte", "hot_tea")
+        assert CM.servingsLeft("latte") == 2
+        assert CM.servingsLeft("cocoa") == 0
+
+        CM.makeOrder(["hot_tea", "latte"])
+
+        assert CM.availableMenu() == ("latte",)
+        assert CM.servingsLeft("latte") == 1
+
+        CM.refill("water", 3)
+
+        assert CM.availableMenu() == ("latte", "hot_tea")
+        assert CM.servingsLeft("hot_tea") == 2
+
+
+def test_availableMenu_reservation():
+    """ Test to see if the menu follows reservations and their release.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 1
+    beverages = {"latte":{"milk":2}}
+    total_items_qty = {"milk":4}
+
+    CM = CoffeeMachine(num_outlets, beverages, total_items_qty,
+        event_sink=MemorySink())
+    reservation = CM.reserve(["latte", "latte"])
+
+    assert CM.availableMenu() == ()
+
+    CM.releaseReservation(reservation)
+
+    assert CM.servingsLeft("latte") == 2
+
+
+def test_servingsLeft_checks():
+    """ Test to check if servingsLeft refuses drinks that are not known.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 1
+    beverages = {"latte":{"milk":2}}
+    total_items_qty = {"milk":4}
+
+    CM = CoffeeMachine(num_outlets, beverages, total_items_qty)
+
+    with pytest.raises(ValueError, match="Drink name is not a string."):
+        CM.servingsLeft(5)
+
+    with pytest.raises(ValueError, match="Drink recipe is not known."):
+        CM.servingsLeft("tea")
+
+
+def test_snapshot():
+    """ Test to see if a snapshot holds the levels and counts the changes
+    committed, in every locking mode.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 2
+    beverages = {"hot_tea":{"milk":1, "water":2}}
+    total_items_qty = {"milk":5, "water":10, "sugar":1}
+
+    for locking in ["global", "ingredient", "optimistic"]:
+        CM = CoffeeMachine(num_outlets, beverages, dict(total_items_qty),
+            locking=locking, event_sink=MemorySink())
+        before = CM.snapshot()
+        CM.makeOrder(["hot_tea", "hot_tea"])
+        CM.refill("sugar", 2)
+        after = CM.snapshot()
+
+        assert before.version == 0
+        assert before.levels == total_items_qty
+        assert after.version == 3
+        assert after.levels == {"milk":3, "water":6, "sugar":3}
+
+        with pytest.raises(TypeError):
+            after.levels["milk"] = 10
+
+
+def test_snapshot_consistent():
+    """ Test to see if snapshots read while drinks are made never show
+    part of a drink, in every locking mode.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 4
+    beverages = {"hot_tea":{"milk":1, "water":1}}
+    total_items_qty = {"milk":400, "water":1400}
+    orders = ["hot_tea"] * 400
+
+    for locking in ["global", "ingredient", "optimistic"]:
+        CM = CoffeeMachine(num_outlets, beverages, dict(total_items_qty),
+            locking=locking, event_sink=MemorySink())
+        seen = []
+        done = threading.Event()
+
+        def watch():
+            while not done.is_set():
+                seen.append(CM.snapshot())
+                time.sleep(0)
+
+        watcher = threading.Thread(target=watch)
+        watcher.start()
+        CM.makeOrder(orders)
+        done.set()
+        watcher.join()
+
+        assert all(snapshot.levels["water"] - snapshot.levels["milk"] ==
+            1000 for snapshot in seen)
+        assert [snapshot.version for snapshot in seen] == sorted(
+            snapshot.version for snapshot in seen)
+
+
+def test_checkOptions_wal():
+    """ Test to check if a write-ahead log that is not a WriteAheadLog is
+    handled correctly.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 1
+    beverages = {"hot_tea":{"milk":1, "water":2}}
+    total_items_qty = {"milk":5, "water":5}
+
+    with pytest.raises(ValueError, match="Write-ahead log is not a"):
+        CM = CoffeeMachine(num_outlets, beverages, total_items_qty,
+            wal="stock.wal")
+
+
+def test_wal_recovery(tmp_path):
+    """ Test to see if a machine opened on the write-ahead log of another
+    picks up its levels, after pours, refills and reservations, in every
+    locking mode.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 2
+    beverages = {"hot_tea":{"milk":1, "water":2}, "latte":{"milk":4}}
+    total_items_qty = {"milk":5, "water":10}
+
+    for locking in ["global", "ingredient", "optimistic"]:
+        path = str(tmp_path / (locking + ".wal"))
+
+        CM = CoffeeMachine(num_outlets, beverages, dict(total_items_qty),
+            locking=locking, event_sink=MemorySink(),
+            wal=WriteAheadLog(path, sync=False))
+        CM.makeOrder(["hot_tea", "latte", "latte"])
+        CM.refill("milk", 5)
+        CM.refill("water", 3)
+        CM.releaseReservation(CM.reserve(["hot_tea"]))
+        CM.commitReservation(CM.reserve(["hot_tea"]))
+        levels = CM.returnIngredientLevel()
+
+        # the latte short of milk was refilled by what it lacked, and
+        # left the milk empty
+        assert levels == {"milk":4, "water":9}
+
+        # as after a crash, the log of the first machine is not closed
+        recovered = CoffeeMachine(num_outlets, beverages,
+            dict(total_items_qty), locking=locking, event_sink=MemorySink(),
+            wal=WriteAheadLog(path, sync=False))
+
+        assert recovered.returnIngredientLevel() == levels
+        assert recovered.wal.recovery["changes"] == 8
+
+
+def test_makeDrinkAsync_wal(tmp_path):
+    """ Test to see if a drink made on the event loop waits for its change
+    to be on disk off the loop, so other coroutines keep running meanwhile.
+    """
+
+    class HeldLog(WriteAheadLog):
+        """ Log whose commits wait until the loop lets them go. """
+
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.release = threading.Event()
+
+        def commit(self, lsn):
+            assert self.release.wait(2)
+            super().commit(lsn)
+
+    # assign data to pass to coffee machine
+    beverages = {"hot_tea":{"milk":1}}
+    path = str(tmp_path / "async.wal")
+    CM = CoffeeMachine(1, beverages, {"milk":2}, event_sink=MemorySink(),
+        wal=HeldLog(path, sync=False))
+
+    async def order():
+        drink = asyncio.ensure_future(CM.makeDrinkAsync("hot_tea", 1))
+
+        # the commit only goes through if the loop runs this meanwhile
+        await asyncio.sleep(0)
+        CM.wal.release.set()
+
+        return await drink
+
+    assert asyncio.run(order()).status == 1
+    assert CM.wal.durable == CM.wal.lsn
+    assert CM.wal.levels["milk"] == 1
+
+
+def test_metrics():
+    """ Test to see if the metrics count the drinks done by status, the
+    seconds they took, and the seconds the outlets were busy.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 2
+    beverages = {"hot_tea":{"milk":1}, "mocha":{"cocoa":1}}
+    total_items_qty = {"milk":3}
+    orders = ["hot_tea"] * 4 + ["mocha"]
+
+    clock = VirtualClock()
+    CM = CoffeeMachine(num_outlets, beverages, total_items_qty,
+        event_sink=MemorySink(), clock=clock, pour_time=10)
+    CM.makeOrder(orders)
+
+    metrics = CM.metrics.metrics
+
+    assert metrics["coffee_drinks_total"].values() == {("hot_tea", 1):3,
+        ("hot_tea", 0):1, ("mocha", -1):1}
+    assert metrics["coffee_outlet_busy_seconds_total"].values() == {():40}
+    assert metrics["coffee_drink_service_seconds"].values()[
+        ("hot_tea",)][-1] == 40
+
+    text = CM.metrics.export()
+
+    assert "coffee_drink_wait_seconds_count{drink=\"hot_tea\"} 4\n" in text
+    assert "coffee_ingredient_level{ingredient=\"milk\"} 0\n" in text
+    assert "coffee_outlets 2\n" in text
+
+
+def test_metrics_threads():
+    """ Test to see if the metrics of drinks made on outlet threads add
+    up to the order, in every locking mode.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 4
+    beverages = {"hot_tea":{"milk":1, "water":1}}
+    total_items_qty = {"milk":100, "water":100}
+    orders = ["hot_tea"] * 100
+
+    for locking in ["global", "ingredient", "optimistic"]:
+        CM = CoffeeMachine(num_outlets, beverages, dict(total_items_qty),
+            locking=locking, event_sink=MemorySink())
+        results = CM.makeOrder(orders)
+        metrics = CM.metrics.metrics
+
+        assert metrics["coffee_drinks_total"].values() == {("hot_tea", 1):100}
+        assert metrics["coffee_outlet_busy_seconds_total"].values()[()] == (
+            pytest.approx(sum(result.service for result in results)))
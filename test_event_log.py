@@ -0,0 +1,170 @@
+# Test functionality of the EventLog class and its sinks, method by method
+
+from event_log import Event, EventLog, JsonlSink, MemorySink, NullSink
+from event_log import StdoutSink
+import json
+import pytest
+
+def test_EventLog_sink_type():
+    """ Test to check if a sink without a write method is handled correctly.
+    """
+
+    with pytest.raises(ValueError, match="Event sink has no write method."):
+        log = EventLog("hello")
+
+
+def test_EventLog_default_sink():
+    """ Test to check if events are printed when no sink is given.
+    """
+
+    log = EventLog()
+
+    assert isinstance(log.sink, StdoutSink)
+
+
+def test_emit_unknown_kind():
+    """ Test to check if an unknown kind of event is refused.
+    """
+
+    log = EventLog(MemorySink())
+
+    with pytest.raises(ValueError, match="Event kind is not known."):
+        log.emit("spilled", 1, "hot_tea")
+
+
+def test_emit_flush():
+    """ Test to see if emitted events reach the sink in order once
+    flushed.
+    """
+
+    sink = MemorySink()
+    log = EventLog(sink)
+    log.emit("prepared", 1, "hot_tea", status=1)
+    log.emit("poured", 1, "hot_tea")
+    log.flush()
+
+    assert sink.kinds() == ["prepared", "poured"]
+    assert sink.events[0].details == {"status":1}
+    assert sink.events[0].drink_name == "hot_tea"
+
+
+def test_close_restart():
+    """ Test to see if closing stops the background thread, and the next
+    event starts it again.
+    """
+
+    sink = MemorySink()
+    log = EventLog(sink)
+    log.emit("poured", 1, "hot_tea")
+    log.close()
+
+    assert log.thread is None
+    assert sink.kinds() == ["poured"]
+
+    log.emit("poured", 2, "hot_tea")
+    log.flush()
+
+    assert sink.kinds() == ["poured", "poured"]
+
+    log.close()
+    log.close()
+
+
+def test_broken_sink():
+    """ Test to see if a sink raising an error drops the event, without
+    stopping the log.
+    """
+
+    class BrokenSink:
+        def write(self, event):
+            if event.drink_ID == 1:
+                raise OSError("disk full")
+
+    log = EventLog(BrokenSink())
+    log.emit("poured", 1, "hot_tea")
+    log.emit("poured", 2, "hot_tea")
+    log.flush()
+
+    assert log.failed == 1
+
+
+def test_MemorySink_kinds_by_drink():
+    """ Test to see if the kinds of events can be picked out per drink.
+    """
+
+    sink = MemorySink()
+    sink.write(Event("prepared", 1, "hot_tea", {"status":1}, 0.0))
+    sink.write(Event("prepared", 2, "green_tea", {"status":-1}, 0.0))
+    sink.write(Event("poured", 1, "hot_tea", {}, 0.0))
+
+    assert sink.kinds(1) == ["prepared", "poured"]
+
+
+def test_StdoutSink_words(capsys):
+    """ Test to see if events are printed in the words of the machine.
+    """
+
+    sink = StdoutSink()
+    sink.write(Event("prepared", 3, "hot_tea", {"status":0}, 0.0))
+    sink.write(Event("insufficient", 3, "hot_tea",
+        {"ingredients":["milk"], "amounts":[1]}, 0.0))
+    sink.write(Event("refilled", 3, "hot_tea",
+        {"ingredients":["milk"], "amounts":[1]}, 0.0))
+    sink.write(Event("poured", 3, "hot_tea", {}, 0.0))
+    sink.write(Event("prepared", 4, "green_tea", {"status":-1}, 0.0))
+    sink.write(Event("unavailable", 4, "green_tea",
+        {"ingredients":["green_mixture"]}, 0.0))
+    sink.write(Event("low_stock", None, "hot_tea",
+        {"ingredient":"milk", "level":4, "seconds_left":59.6}, 0.0))
+    sink.flush()
+
+    out = capsys.readouterr().out
+
+    assert "Currently preparing drink number 3." in out
+    assert "hot_tea will not be made because some ingredients" in out
+    assert "['milk']\nExtra amount of these ingredients required is :\n[1]" \
+        in out
+    assert "Refilled the ingredients" in out
+    assert "Now pouring the ingredients ...\nDone!" in out
+    assert "green_tea cannot be made because" in out
+    assert "['green_mixture']" in out
+    assert "milk is running low, and will run out in about 60 seconds." \
+        in out
+
+
+def test_JsonlSink_path_type():
+    """ Test to check if a non string path is handled correctly.
+    """
+
+    with pytest.raises(ValueError, match="Path of event file is not"):
+        sink = JsonlSink(1)
+
+
+def test_JsonlSink_lines(tmp_path):
+    """ Test to see if events are written as one JSON object per line.
+    """
+
+    path = str(tmp_path / "events.jsonl")
+    sink = JsonlSink(path)
+    log = EventLog(sink)
+    log.emit("prepared", 1, "hot_tea", status=1)
+    log.emit("poured", 1, "hot_tea")
+    log.close()
+    sink.close()
+
+    records = [json.loads(line) for line in open(path)]
+
+    assert [record["kind"] for record in records] == ["prepared", "poured"]
+    assert records[0]["status"] == 1
+    assert records[0]["drink_ID"] == 1
+
+
+def test_NullSink_drops_events():
+    """ Test to check if events given to a NullSink are dropped quietly.
+    """
+
+    log = EventLog(NullSink())
+    log.emit("poured", 0, "hot_tea")
+    log.flush()
+
+    assert log.failed == 0
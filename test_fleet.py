@@ -0,0 +1,207 @@
+# Test functionality of the Fleet class, method by method
+
+from clock import RealClock
+from coffee_machine import CoffeeMachine, Order
+from event_log import MemorySink
+from fleet import Fleet
+import pytest
+import threading
+import time
+
+def test_Fleet_machines_type():
+    """ Test to check if machines that are not a list of coffee machines
+    are handled correctly.
+    """
+
+    with pytest.raises(ValueError, match="Machines of fleet are not a"):
+        fleet = Fleet("hello")
+
+    with pytest.raises(ValueError, match="Fleet has no machines."):
+        fleet = Fleet([])
+
+    with pytest.raises(ValueError, match="Machine of fleet is not a"):
+        fleet = Fleet(["hello"])
+
+
+def test_makeOrder_lowest_wait():
+    """ Test to see if drinks go to the machine with the lowest expected
+    wait per outlet, so a machine with more outlets takes more drinks.
+    """
+
+    # assign data to pass to coffee machines
+    beverages = {"hot_tea":{"milk":1}}
+    big = CoffeeMachine(3, beverages, {"milk":100}, pour_time=0.05,
+        event_sink=MemorySink())
+    small = CoffeeMachine(1, beverages, {"milk":100}, pour_time=0.05,
+        event_sink=MemorySink())
+
+    fleet = Fleet([big, small])
+    results = fleet.makeOrder(["hot_tea"] * 8)
+
+    assert [routed.result.drink_ID for routed in results] == list(range(8))
+    assert fleet.stats()["routed"] == [6, 2]
+    assert all(routed.result.status == 1 for routed in results)
+
+
+def test_makeOrder_fallback():
+    """ Test to see if a machine short on stock is passed over for another
+    machine, instead of being refilled.
+    """
+
+    # assign data to pass to coffee machines
+    beverages = {"latte":{"milk":2}, "hot_water":{"water":1}}
+    first = CoffeeMachine(1, beverages, {"milk":2, "water":10},
+        event_sink=MemorySink())
+    second = CoffeeMachine(1, beverages, {"milk":10, "water":10},
+        event_sink=MemorySink())
+
+    fleet = Fleet([first, second])
+
+    # with both machines idle, the first has the lowest expected wait
+    results = [fleet.makeOrder(["latte"])[0] for i in range(3)]
+
+    assert [routed.machine for routed in results] == [0, 1, 1]
+    assert [routed.result.status for routed in results] == [1, 1, 1]
+    assert first.returnIngredientLevel()["milk"] == 0
+    assert second.returnIngredientLevel()["milk"] == 6
+    assert fleet.stats()["fallbacks"] == 2
+
+
+def test_makeOrder_concurrent():
+    """ Test to see if orders going on at the same time route against the
+    same stock, so the last of the stock of a machine is not handed out
+    twice while another machine has some.
+    """
+
+    class HeldClock(RealClock):
+        """ Clock whose pours wait until the test lets them go. """
+
+        def __init__(self):
+            self.pouring = threading.Event()
+            self.release = threading.Event()
+
+        def sleep(self, seconds):
+            self.pouring.set()
+            assert self.release.wait(2)
+
+    # assign data to pass to coffee machines
+    clock = HeldClock()
+    first = CoffeeMachine(1, {"latte":{"milk":1}, "hold":{"water":1}},
+        {"milk":1, "water":1}, refill_policy="reject", clock=clock,
+        event_sink=MemorySink())
+    second = CoffeeMachine(1, {"latte":{"milk":1}}, {"milk":1},
+        refill_policy="reject", event_sink=MemorySink())
+
+    fleet = Fleet([first, second])
+
+    # the outlet of the first machine is kept busy, so the latte routed to
+    # it waits in its line without taking the milk yet
+    holding = threading.Thread(target=first.makeOrder, args=(["hold"],))
+    holding.start()
+    assert clock.pouring.wait(2)
+
+    results = []
+    ordering = threading.Thread(target=lambda: results.append(
+        fleet.makeOrder(["latte"])[0]))
+    ordering.start()
+
+    while fleet.stats()["routed"] == [0, 0]:
+        time.sleep(0.001)
+
+    other = fleet.makeOrder(["latte"])[0]
+
+    clock.release.set()
+    ordering.join()
+    holding.join()
+
+    assert (results[0].machine, other.machine) == (0, 1)
+    assert results[0].result.status == other.result.status == 1
+    assert fleet.stats()["unavailable"] == 0
+
+    # refills are seen once no order is going on
+    second.refill("milk", 1)
+    assert fleet.makeOrder(["latte"])[0].machine == 1
+
+
+def test_makeOrder_unavailable():
+    """ Test to see if a drink no machine can make is reported without
+    going to any machine, as short or as missing ingredients.
+    """
+
+    # assign data to pass to coffee machines
+    beverages = {"latte":{"milk":2}, "cocoa":{"cocoa":1}}
+    first = CoffeeMachine(1, beverages, {"milk":1}, event_sink=MemorySink())
+    second = CoffeeMachine(1, beverages, {"milk":0}, event_sink=MemorySink())
+
+    fleet = Fleet([first, second])
+    results = fleet.makeOrder(["latte", Order("cocoa", 1)])
+
+    assert [routed.machine for routed in results] == [None, None]
+    assert results[0].result.status == 0
+    assert results[0].result.shortfall == {"milk":1}
+    assert results[1].result.status == -1
+    assert results[1].result.missing == ["cocoa"]
+    assert fleet.stats()["unavailable"] == 2
+    assert first.scheduler.stats()["admitted"] == 0
+
+
+def test_makeOrder_menus():
+    """ Test to see if drinks only go to machines that know them, and
+    unknown drinks are refused.
+    """
+
+    # assign data to pass to coffee machines
+    tea = CoffeeMachine(1, {"hot_tea":{"water":1}}, {"water":10},
+        event_sink=MemorySink())
+    coffee = CoffeeMachine(1, {"espresso":{"beans":1}}, {"beans":10},
+        event_sink=MemorySink())
+
+    fleet = Fleet([tea, coffee])
+    results = fleet.makeOrder([" espresso", "hot_tea", "", "espresso"])
+
+    assert [routed.machine for routed in results] == [1, 0, 1]
+
+    with pytest.raises(ValueError, match="Drink recipe for ordered"):
+        fleet.makeOrder(["mocha"])
+
+    with pytest.raises(ValueError, match="Drink name in order is not a"):
+        fleet.makeOrder([5])
+
+    with pytest.raises(ValueError, match="Priority of order is not an"):
+        fleet.makeOrder([Order("espresso", "high")])
+
+    with pytest.raises(ValueError, match="Orders were expected in a list"):
+        fleet.makeOrder({"espresso":1})
+
+
+def test_streamOrder_slow_feed():
+    """ Test to see if a drink is yielded as soon as it is done, without
+    waiting for the next order to come, and drinks before an unknown
+    drink are yielded before its error is raised.
+    """
+
+    # assign data to pass to coffee machines
+    machines = [CoffeeMachine(1, {"hot_tea":{"milk":1}}, {"milk":10},
+        event_sink=MemorySink()) for i in range(2)]
+
+    # the second order only comes once the first drink is handed back
+    handed_back = threading.Event()
+    waited = []
+
+    def feed():
+        yield "hot_tea"
+        waited.append(handed_back.wait(5))
+        yield "hot_tea"
+        yield "mocha"
+
+    fleet = Fleet(machines)
+    results = fleet.streamOrder(feed())
+
+    assert next(results).result.drink_ID == 0
+    handed_back.set()
+
+    assert next(results).result.drink_ID == 1
+    assert waited == [True]
+
+    with pytest.raises(ValueError, match="Drink recipe for ordered"):
+        next(results)
@@ -0,0 +1,177 @@
+# Test functionality of the compiled config, function by function
+
+from clock import VirtualClock
+from coffee_machine import CoffeeMachine
+from event_log import MemorySink
+from machine_config import cachedConfig, compileConfig, contentHash
+from machine_config import loadConfig, readConfig
+import json
+import pytest
+
+def sampleConfig():
+    """ Builds a small config, with a drink missing an ingredient and
+    names that are not ASCII.
+    """
+
+    beverages = {"hot_tea":{"hot_water":200, "hot_milk":100},
+        "crème":{"hot_milk":50, "sucre":5},
+        "green_tea":{"hot_water":100, "green_mixture":30}}
+    raw_material_qty = {"hot_milk":500, "hot_water":300, "sucre":10}
+
+    return 3, beverages, raw_material_qty
+
+
+def test_compileConfig_checks():
+    """ Test to check if a config that is not well formed is rejected as
+    the machine rejects it.
+    """
+
+    with pytest.raises(ValueError, match="Number of outlets must be more"):
+        config = compileConfig(0, {}, {})
+
+    with pytest.raises(ValueError, match="Quantity of a raw material"):
+        config = compileConfig(1, {}, {"milk":-1})
+
+
+def test_compileConfig():
+    """ Test to see if a config is compiled as the machine compiles it.
+    """
+
+    num_outlets, beverages, raw_material_qty = sampleConfig()
+    config = compileConfig(num_outlets, beverages, raw_material_qty)
+    machine = CoffeeMachine(num_outlets, beverages, raw_material_qty,
+        event_sink=MemorySink())
+
+    assert config.ingredients == machine.ingredients
+    assert config.ingredient_ids == machine.ingredient_ids
+    assert config.levels == (500, 300, 10)
+    assert config.recipe_vectors == machine.recipe_vectors
+    assert config.recipe_ids == machine.recipe_ids
+    assert config.missing_ingredients == machine.missing_ingredients
+
+    # the same config always hashes the same
+    assert config.content_hash == compileConfig(num_outlets, beverages,
+        raw_material_qty).content_hash
+
+
+def test_loadConfig(tmp_path):
+    """ Test to see if a compiled config file loads back the same config,
+    with recipes in the same order.
+    """
+
+    path = str(tmp_path / "config.cmcf")
+    config = compileConfig(*sampleConfig())
+    config.write(path)
+
+    loaded = loadConfig(path)
+
+    assert loaded.num_outlets == 3
+    assert list(loaded.beverages.items()) == list(config.beverages.items())
+    assert (list(loaded.raw_material_qty.items()) ==
+        list(config.raw_material_qty.items()))
+    assert loaded.recipe_vectors == config.recipe_vectors
+    assert loaded.recipe_ids == config.recipe_ids
+    assert loaded.missing_ingredients == {"hot_tea":[], "crème":[],
+        "green_tea":["green_mixture"]}
+    assert loaded.content_hash == config.content_hash
+
+
+def test_loadConfig_empty(tmp_path):
+    """ Test to see if a config with no ingredients or drinks compiles.
+    """
+
+    path = str(tmp_path / "config.cmcf")
+    compileConfig(1, {"water_glass":{}}, {}).write(path)
+
+    loaded = loadConfig(path)
+
+    assert loaded.beverages == {"water_glass":{}}
+    assert loaded.recipe_vectors == {"water_glass":()}
+
+
+def test_loadConfig_errors(tmp_path):
+    """ Test to check if files that are not compiled configs of the config
+    asked for are handled correctly.
+    """
+
+    path = str(tmp_path / "config.cmcf")
+    config = compileConfig(*sampleConfig())
+    config.write(path)
+
+    with open(path, "rb") as f:
+        content = f.read()
+
+    with pytest.raises(ValueError, match="File is not a compiled config."):
+        readConfig(b"hello")
+
+    with pytest.raises(ValueError, match="format is not supported."):
+        readConfig(content[:4] + b"\x09" + content[5:])
+
+    with pytest.raises(ValueError, match="Compiled config is truncated."):
+        readConfig(content[:-3])
+
+    with pytest.raises(ValueError, match="Compiled config is out of date."):
+        loadConfig(path, content_hash=contentHash(b"other"))
+
+    assert loadConfig(path,
+        content_hash=config.content_hash).content_hash == config.content_hash
+
+
+def test_machine():
+    """ Test to see if a machine made from a compiled config makes drinks
+    as one made from the config itself, and only takes its own config.
+    """
+
+    num_outlets, beverages, raw_material_qty = sampleConfig()
+    config = compileConfig(num_outlets, beverages, raw_material_qty)
+
+    # on a virtual clock, the outlets take the drinks in the same order
+    machine = config.machine(event_sink=MemorySink(), locking="ingredient",
+        clock=VirtualClock())
+    plain = CoffeeMachine(num_outlets, beverages, raw_material_qty,
+        event_sink=MemorySink(), locking="ingredient", clock=VirtualClock())
+
+    orders = ["hot_tea", "crème", "green_tea", "crème", "crème"]
+    assert ([result[:6] for result in machine.makeOrder(orders)] ==
+        [result[:6] for result in plain.makeOrder(orders)])
+    assert machine.raw_material_qty == plain.raw_material_qty
+
+    with pytest.raises(ValueError, match="Compiled config is not of this"):
+        machine = CoffeeMachine(num_outlets, dict(beverages),
+            raw_material_qty, compiled=config)
+
+
+def test_cachedConfig(tmp_path):
+    """ Test to see if a config file is only compiled again once its
+    content changes.
+    """
+
+    num_outlets, beverages, raw_material_qty = sampleConfig()
+    config_path = str(tmp_path / "input.json")
+    cache_path = str(tmp_path / "input.cmcf")
+
+    data = {"machine":{"outlets":{"count_n":num_outlets},
+        "beverages":beverages, "total_items_quantity":raw_material_qty}}
+    with open(config_path, "w") as f:
+        json.dump(data, f)
+
+    config = cachedConfig(config_path)
+
+    with open(config_path, "rb") as f:
+        assert config.content_hash == contentHash(f.read())
+
+    # the compiled file is loaded as long as the config is the same
+    with open(cache_path, "r+b") as f:
+        f.seek(-1, 2)
+        f.write(b"X")
+
+    assert list(cachedConfig(config_path).beverages)[-1] == "green_teX"
+
+    data["machine"]["outlets"]["count_n"] = 5
+    with open(config_path, "w") as f:
+        json.dump(data, f)
+
+    config = cachedConfig(config_path)
+
+    assert config.num_outlets == 5
+    assert list(config.beverages)[-1] == "green_tea"
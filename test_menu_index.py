@@ -0,0 +1,74 @@
+# Test functionality of the MenuIndex class, method by method
+
+from menu_index import MenuIndex
+import math
+
+def buildIndex(levels):
+    """ Builds an index over a small menu, reading the levels given.
+    Ingredients are milk, water and sugar, in that order.
+    """
+
+    menu = ["latte", "tea", "sweet_tea", "cocoa", "water_glass"]
+    recipe_vectors = {"latte":(2, 0, 0), "tea":(0, 1, 0),
+        "sweet_tea":(0, 1, 1), "water_glass":(0, 0, 0)}
+    recipe_ids = {"latte":(0,), "tea":(1,), "sweet_tea":(1, 2),
+        "water_glass":()}
+
+    return MenuIndex(menu, recipe_vectors, recipe_ids, lambda: levels)
+
+
+def test_servingsLeft():
+    """ Test to see if the servings of every drink are worked out from the
+    levels, with drinks missing an ingredient at 0.
+    """
+
+    index = buildIndex([5, 3, 1])
+
+    assert index.servingsLeft("latte") == 2
+    assert index.servingsLeft("tea") == 3
+    assert index.servingsLeft("sweet_tea") == 1
+    assert index.servingsLeft("cocoa") == 0
+    assert index.servingsLeft("water_glass") == math.inf
+    assert index.availableMenu() == ("latte", "tea", "sweet_tea",
+        "water_glass")
+
+
+def test_update_affected_only():
+    """ Test to see if a change only works out the drinks using the
+    ingredients that changed, once the index is asked.
+    """
+
+    levels = [5, 3, 1]
+    index = buildIndex(levels)
+
+    levels[0] = 1
+    levels[2] = 0
+
+    # only the milk change is noted, so sweet_tea is not worked out again
+    index.update([0])
+
+    assert index.changed == {0}
+    assert index.availableMenu() == ("tea", "sweet_tea", "water_glass")
+    assert index.changed == set()
+    assert index.servingsLeft("sweet_tea") == 1
+
+    index.update([2])
+
+    assert index.availableMenu() == ("tea", "water_glass")
+
+
+def test_update_comes_back():
+    """ Test to see if a drink comes back on the menu once its levels are
+    refilled.
+    """
+
+    levels = [0, 3, 1]
+    index = buildIndex(levels)
+
+    assert "latte" not in index.availableMenu()
+
+    levels[0] = 4
+    index.update([0])
+
+    assert index.availableMenu()[0] == "latte"
+    assert index.servingsLeft("latte") == 2
@@ -0,0 +1,133 @@
+# Test functionality of the metrics registry, class by class
+
+from metrics import Counter, Histogram, Metric, MetricsRegistry
+from metrics import formatLabels
+import threading
+import urllib.request
+import urllib.error
+import pytest
+
+def test_formatLabels():
+    """ Test to see if label values are quoted and escaped.
+    """
+
+    assert formatLabels((), ()) == ""
+    assert formatLabels(("drink", "status"), ("latte", 1)) == (
+        "{drink=\"latte\",status=\"1\"}")
+    assert formatLabels(("drink",), ("a\"b\\c\nd",), "le=\"1\"") == (
+        "{drink=\"a\\\"b\\\\c\\nd\",le=\"1\"}")
+
+
+def test_Metric_abstract():
+    """ Test to see if the base class of metrics cannot be used without
+    merging and sampling of its own.
+    """
+
+    with pytest.raises(TypeError):
+        metric = Metric("drinks_total", "Drinks.")
+
+
+def test_Counter_threads():
+    """ Test to see if counts recorded by many threads at once are all
+    added up, including those of threads that are gone.
+    """
+
+    counter = Counter("drinks_total", "Drinks.", ("drink",))
+
+    def record():
+        for i in range(1000):
+            counter.inc(("latte",))
+            counter.inc(("mocha",), 2)
+
+    for round in range(3):
+        threads = [threading.Thread(target=record) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    assert counter.values() == {("latte",):12000, ("mocha",):24000}
+
+    # shards of threads that are gone are folded into one
+    assert counter.shards == []
+
+
+def test_Histogram_checks():
+    """ Test to check if buckets that make no sense are handled correctly.
+    """
+
+    with pytest.raises(ValueError, match="Histogram has no buckets."):
+        histogram = Histogram("wait_seconds", "Wait.", buckets=())
+
+    with pytest.raises(ValueError, match="Bucket bound is not a number."):
+        histogram = Histogram("wait_seconds", "Wait.", buckets=(1, "2"))
+
+    with pytest.raises(ValueError, match="Bucket bounds are not"):
+        histogram = Histogram("wait_seconds", "Wait.", buckets=(2, 1))
+
+
+def test_Histogram_samples():
+    """ Test to see if values are counted into the buckets up to their
+    bound, with the count and sum.
+    """
+
+    histogram = Histogram("wait_seconds", "Wait.", ("drink",), (0.1, 1))
+
+    for value in [0.05, 0.1, 0.5, 3]:
+        histogram.observe(value, ("latte",))
+
+    assert histogram.samples() == [
+        "wait_seconds_bucket{drink=\"latte\",le=\"0.1\"} 2",
+        "wait_seconds_bucket{drink=\"latte\",le=\"1\"} 3",
+        "wait_seconds_bucket{drink=\"latte\",le=\"+Inf\"} 4",
+        "wait_seconds_count{drink=\"latte\"} 4",
+        "wait_seconds_sum{drink=\"latte\"} 3.65",
+    ]
+
+
+def test_MetricsRegistry_export():
+    """ Test to see if every metric is exported with its HELP and TYPE
+    lines, and a metric added again by name is the same one.
+    """
+
+    registry = MetricsRegistry()
+    counter = registry.counter("drinks_total", "Drinks.", ("drink",))
+    registry.gauge("outlets", "Outlets.", lambda: {(): 2})
+    counter.inc(("latte",))
+
+    assert registry.counter("drinks_total", "Drinks.", ("drink",)) is counter
+    assert registry.export() == ("# HELP drinks_total Drinks.\n"+
+        "# TYPE drinks_total counter\n"+
+        "drinks_total{drink=\"latte\"} 1\n"+
+        "# HELP outlets Outlets.\n"+
+        "# TYPE outlets gauge\n"+
+        "outlets 2\n")
+
+    with pytest.raises(ValueError, match="already registered."):
+        registry.histogram("drinks_total", "Drinks.", ("drink",))
+
+    with pytest.raises(ValueError, match="Gauge function is not"):
+        registry.gauge("levels", "Levels.", 5)
+
+
+def test_MetricsRegistry_serve():
+    """ Test to see if the metrics are served at /metrics, and nothing
+    else is.
+    """
+
+    registry = MetricsRegistry()
+    registry.counter("drinks_total", "Drinks.").inc()
+    server = registry.serve()
+
+    try:
+        url = "http://127.0.0.1:" + str(server.server_address[1])
+
+        with urllib.request.urlopen(url + "/metrics") as response:
+            assert response.headers["Content-Type"].startswith("text/plain")
+            assert response.read().decode("utf-8") == registry.export()
+
+        with pytest.raises(urllib.error.HTTPError):
+            urllib.request.urlopen(url + "/")
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,296 @@
+# Test functionality of the OutletScheduler class, method by method
+
+from clock import VirtualClock
+from outlet_scheduler import OutletScheduler
+import threading
+import time
+import pytest
+
+def test_OutletScheduler_num_type():
+    """ Test to check if non integer num outlets is handled correctly.
+    """
+
+    with pytest.raises(ValueError, match="Number of outlets is not"):
+        scheduler = OutletScheduler("hello")
+
+
+def test_OutletScheduler_num_outlets():
+    """ Test to check if number of outlets supplied makes semantic sense.
+    """
+
+    with pytest.raises(ValueError, match="outlets must be more than 0"):
+        scheduler = OutletScheduler(0)
+
+
+def test_release_without_acquire():
+    """ Test to check if releasing an outlet that is not in use is caught.
+    """
+
+    scheduler = OutletScheduler(1)
+
+    with pytest.raises(ValueError, match="No outlet is in use"):
+        scheduler.release()
+
+
+def test_OutletScheduler_max_queued_type():
+    """ Test to check if non integer queue size is handled correctly.
+    """
+
+    with pytest.raises(ValueError, match="Maximum queue size is not"):
+        scheduler = OutletScheduler(1, "hello")
+
+
+def test_OutletScheduler_max_queued():
+    """ Test to check if queue size supplied makes semantic sense.
+    """
+
+    with pytest.raises(ValueError, match="queue size must be more than 0"):
+        scheduler = OutletScheduler(1, 0)
+
+
+def test_put_empty_order():
+    """ Test to check if None is refused as an order, since it marks a
+    closed scheduler.
+    """
+
+    scheduler = OutletScheduler(1)
+
+    with pytest.raises(ValueError, match="Cannot schedule an empty order."):
+        scheduler.put(None)
+
+
+def test_put_closed():
+    """ Test to check if orders cannot be added after closing.
+    """
+
+    scheduler = OutletScheduler(1)
+    scheduler.close()
+
+    with pytest.raises(ValueError, match="Scheduler is closed"):
+        scheduler.put("hot_tea")
+
+
+def test_put_get_counters():
+    """ Test to see if counters are kept correctly over put, get and
+    release.
+    """
+
+    scheduler = OutletScheduler(2)
+    scheduler.put("hot_tea")
+    scheduler.put("black_tea")
+
+    assert scheduler.queue_depth == 2
+
+    assert scheduler.get() == "hot_tea"
+    assert scheduler.get() == "black_tea"
+    stats = scheduler.stats()
+
+    assert stats["busy"] == 2
+    assert stats["queue_depth"] == 0
+    assert stats["max_queue_depth"] == 2
+    assert stats["admitted"] == 2
+
+    scheduler.release()
+    scheduler.release()
+
+    assert scheduler.stats()["busy"] == 0
+
+
+def test_get_wakes_on_put():
+    """ Test to see if a waiting outlet gets an order as soon as it is put
+    in line.
+    """
+
+    scheduler = OutletScheduler(1)
+    orders = []
+
+    thread = threading.Thread(target=lambda: orders.append(scheduler.get()))
+    thread.start()
+
+    time.sleep(0.1)
+    scheduler.put("hot_tea")
+    thread.join(timeout=1)
+
+    assert not thread.is_alive()
+    assert orders == ["hot_tea"]
+
+
+def test_put_blocks_when_full():
+    """ Test to see if adding to a full line waits for an outlet to take
+    an order, and that the wait is counted.
+    """
+
+    scheduler = OutletScheduler(1, 1)
+    scheduler.put("hot_tea")
+
+    thread = threading.Thread(target=scheduler.put, args=("black_tea",))
+    thread.start()
+
+    time.sleep(0.1)
+    assert thread.is_alive()
+    assert scheduler.queue_depth == 1
+
+    assert scheduler.get() == "hot_tea"
+    thread.join(timeout=1)
+
+    assert not thread.is_alive()
+    assert scheduler.get() == "black_tea"
+    assert scheduler.max_wait >= 0.1
+    assert scheduler.stats()["mean_wait"] == scheduler.total_wait / 2
+
+
+def test_close_drains_line():
+    """ Test to see if orders waiting when closing are still handed out,
+    after which outlets are told to stop.
+    """
+
+    scheduler = OutletScheduler(1)
+    scheduler.put("hot_tea")
+    scheduler.close()
+
+    assert scheduler.get() == "hot_tea"
+    assert scheduler.get() is None
+
+
+def test_stats_empty():
+    """ Test to see if stats work before any order is admitted.
+    """
+
+    scheduler = OutletScheduler(1)
+
+    assert scheduler.stats()["mean_wait"] == 0.0
+
+
+def test_OutletScheduler_policy():
+    """ Test to see if an unknown policy or bad aging is handled correctly.
+    """
+
+    with pytest.raises(ValueError, match="Scheduling policy is not known."):
+        scheduler = OutletScheduler(1, policy="lifo")
+
+    with pytest.raises(ValueError, match="Aging must be a number more than 0."):
+        scheduler = OutletScheduler(1, policy="priority", aging=0)
+
+
+def test_put_priority_checks():
+    """ Test to see if a bad priority or deadline is handled correctly.
+    """
+
+    scheduler = OutletScheduler(1)
+
+    with pytest.raises(ValueError, match="Priority of order is not an integer."):
+        scheduler.put("hot_tea", priority="high")
+
+    with pytest.raises(ValueError,
+        match="Deadline of order is not a number of at least 0."):
+        scheduler.put("hot_tea", deadline=-1)
+
+
+def test_fifo_ignores_priority():
+    """ Test to see if the fifo policy hands out orders as they arrived.
+    """
+
+    scheduler = OutletScheduler(1, 3)
+    scheduler.put("hot_tea")
+    scheduler.put("hot_water", priority=5)
+    scheduler.put("black_tea", deadline=0)
+
+    assert [scheduler.get() for i in range(3)] == ["hot_tea", "hot_water",
+        "black_tea"]
+
+
+def test_priority_and_deadline_order():
+    """ Test to see if the priority policy hands out orders by due time,
+    taking both priority and deadline into account.
+    """
+
+    scheduler = OutletScheduler(1, 4, "priority", 30, VirtualClock())
+    scheduler.put("hot_tea")
+    scheduler.put("hot_water", priority=1)
+    scheduler.put("black_tea", deadline=5)
+    scheduler.put("green_tea")
+
+    assert [scheduler.get() for i in range(4)] == ["hot_water", "black_tea",
+        "hot_tea", "green_tea"]
+
+
+def test_priority_aging():
+    """ Test to see if an order of low priority that waited long enough
+    goes before an order of high priority that just arrived.
+    """
+
+    clock = VirtualClock()
+    scheduler = OutletScheduler(1, 4, "priority", 30, clock)
+    scheduler.put("hot_tea")
+    clock.advanceTo(20)
+    scheduler.put("hot_water", priority=1)
+    clock.advanceTo(40)
+    scheduler.put("black_tea", priority=1)
+
+    assert [scheduler.get() for i in range(3)] == ["hot_water", "hot_tea",
+        "black_tea"]
+
+
+def test_missed_deadlines():
+    """ Test to see if orders given an outlet after their deadline are
+    counted.
+    """
+
+    clock = VirtualClock()
+    scheduler = OutletScheduler(1, 2, "priority", 30, clock)
+    scheduler.put("hot_tea", deadline=5)
+    scheduler.put("hot_water", deadline=50)
+    clock.advanceTo(10)
+    scheduler.get()
+    scheduler.get()
+
+    assert scheduler.stats()["missed_deadlines"] == 1
+    assert scheduler.stats()["max_wait"] == 10
+
+
+def test_full():
+    """ Test to see if a full line is reported.
+    """
+
+    scheduler = OutletScheduler(1, 1)
+
+    assert scheduler.full() == False
+
+    scheduler.put("hot_tea")
+
+    assert scheduler.full() == True
+
+
+def test_putBack_front():
+    """ Test to see if an order put back goes to the front of the line,
+    even if the line is full.
+    """
+
+    scheduler = OutletScheduler(1, 1)
+    scheduler.put("a")
+    scheduler.putBack("b")
+
+    assert scheduler.stats()["queue_depth"] == 2
+    assert scheduler.get() == "b"
+
+
+def test_putBack_admitted_once():
+    """ Test to see if an order put back is only counted as admitted, and
+    its wait only added up, the first time it gets an outlet.
+    """
+
+    clock = VirtualClock()
+    scheduler = OutletScheduler(1, 1, clock=clock)
+    scheduler.put("a")
+    clock.advanceTo(5)
+    order = scheduler.get()
+    scheduler.putBack(order)
+    scheduler.release()
+    clock.advanceTo(20)
+
+    assert scheduler.get() == "a"
+
+    stats = scheduler.stats()
+    assert stats["admitted"] == 1
+    assert stats["total_wait"] == 5
+    assert stats["mean_wait"] == 5
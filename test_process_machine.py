@@ -0,0 +1,247 @@
+# Test functionality of the ProcessMachine class, method by method
+
+from clock import VirtualClock
+from coffee_machine import CoffeeMachine, Order
+from event_log import MemorySink
+from process_machine import ProcessMachine
+from write_ahead_log import WriteAheadLog
+import multiprocessing
+import pytest
+
+def test_ProcessMachine_options(tmp_path):
+    """ Test to check if machines and options the outlet processes cannot
+    run with are handled correctly.
+    """
+
+    # assign data to pass to coffee machine
+    beverages = {"hot_tea":{"milk":1}}
+
+    with pytest.raises(ValueError, match="Machine is not a CoffeeMachine."):
+        machine = ProcessMachine("hello")
+
+    with pytest.raises(ValueError, match="cannot run on a virtual clock."):
+        machine = ProcessMachine(CoffeeMachine(1, beverages, {"milk":1},
+            clock=VirtualClock(), event_sink=MemorySink()))
+
+    with pytest.raises(ValueError, match="cannot wait for refills."):
+        machine = ProcessMachine(CoffeeMachine(1, beverages, {"milk":1},
+            refill_policy="wait", event_sink=MemorySink()))
+
+    with pytest.raises(ValueError, match="cannot keep a write-ahead log."):
+        machine = ProcessMachine(CoffeeMachine(1, beverages, {"milk":1},
+            wal=WriteAheadLog(str(tmp_path / "machine.wal"), sync=False),
+            event_sink=MemorySink()))
+
+    machine = CoffeeMachine(1, beverages, {"milk":1}, event_sink=MemorySink())
+
+    with pytest.raises(ValueError, match="Number of processes is not an"):
+        processes = ProcessMachine(machine, 0)
+
+    with pytest.raises(ValueError, match="Chunk size is not an integer"):
+        processes = ProcessMachine(machine, 1, 1.5)
+
+
+def test_makeOrder():
+    """ Test to see if drinks made on outlet processes come back in order,
+    with the same outcomes as on outlet threads.
+    """
+
+    # assign data to pass to coffee machine
+    beverages = {"hot_tea":{"milk":2, "water":1}, "hot_water":{"water":3},
+        "green_tea":{"water":1, "green_mixture":1}}
+    raw_material_qty = {"milk":3, "water":5}
+    machine = CoffeeMachine(2, beverages, raw_material_qty,
+        event_sink=MemorySink())
+
+    processes = ProcessMachine(machine)
+    results = processes.makeOrder(["hot_tea", Order("green_tea"), " ",
+        "hot_water", "hot_tea"])
+
+    assert [result.drink_ID for result in results] == [0, 1, 2, 3]
+    assert [result.status for result in results[1:3]] == [-1, 1]
+    assert results[1].missing == ["green_mixture"]
+
+    # the teas race for the milk on the two outlets, and whichever comes
+    # second is short, and refilled by what is missing
+    first, second = sorted([results[0], results[3]],
+        key=lambda result: -result.status)
+
+    assert (first.status, second.status) == (1, 0)
+    assert second.shortfall == {"milk":1}
+    assert second.refilled == {"milk":1}
+    assert dict(processes.raw_material_qty) == {"milk":0, "water":0}
+
+    assert processes.makeOrder([]) == []
+    processes.close()
+
+
+def test_makeOrder_reject():
+    """ Test to see if drinks short on ingredients are not made with the
+    "reject" refill policy.
+    """
+
+    # assign data to pass to coffee machine
+    beverages = {"hot_tea":{"milk":2}}
+    machine = CoffeeMachine(1, beverages, {"milk":3}, refill_policy="reject",
+        event_sink=MemorySink())
+
+    processes = ProcessMachine(machine)
+    results = processes.makeOrder(["hot_tea", "hot_tea"])
+
+    assert [result.status for result in results] == [1, 0]
+    assert results[1].shortfall == {"milk":1}
+    assert results[1].refilled == {}
+    assert dict(processes.raw_material_qty) == {"milk":1}
+
+    processes.close()
+
+
+def test_makeOrder_orders_type():
+    """ Test to check if orders that are not drinks the machine knows are
+    handled correctly.
+    """
+
+    # assign data to pass to coffee machine
+    beverages = {"hot_tea":{"milk":2}}
+    machine = CoffeeMachine(1, beverages, {"milk":3},
+        event_sink=MemorySink())
+    processes = ProcessMachine(machine)
+
+    with pytest.raises(ValueError, match="Orders were expected in a list"):
+        processes.makeOrder(5)
+
+    with pytest.raises(ValueError, match="Drink name in order is not a"):
+        processes.makeOrder([5])
+
+    with pytest.raises(ValueError, match="Drink recipe for ordered"):
+        processes.makeOrder(["latte"])
+
+    processes.close()
+
+
+@pytest.mark.parametrize("method", ["fork", "spawn"])
+def test_makeOrder_shared_levels(method):
+    """ Test to see if drinks made on several processes at once all come out
+    of the same levels, with none lost.
+    """
+
+    # assign data to pass to coffee machine
+    beverages = {"hot_tea":{"milk":1, "water":2}, "hot_water":{"water":1}}
+    raw_material_qty = {"milk":200, "water":1000}
+    machine = CoffeeMachine(4, beverages, raw_material_qty,
+        event_sink=MemorySink())
+
+    processes = ProcessMachine(machine, chunk_size=8,
+        context=multiprocessing.get_context(method))
+    processes.start()
+
+    results = processes.makeOrder(["hot_tea", "hot_water"] * 150)
+    results += processes.makeOrder(["hot_tea"] * 60)
+
+    processes.shutdown()
+
+    # the last 10 teas are short on milk, which is refilled
+    assert [result.status for result in results].count(1) == 350
+    assert dict(processes.raw_material_qty) == {"milk":0, "water":430}
+
+    processes.close()
+
+
+def test_start():
+    """ Test to see if outlet processes are only started once, and not
+    after the shared inventory is freed.
+    """
+
+    # assign data to pass to coffee machine
+    beverages = {"hot_tea":{"milk":1}}
+    machine = CoffeeMachine(2, beverages, {"milk":5},
+        event_sink=MemorySink())
+
+    processes = ProcessMachine(machine)
+    processes.start()
+
+    with pytest.raises(ValueError, match="already started."):
+        processes.start()
+
+    assert len(processes.processes) == 2
+    processes.close()
+    assert processes.processes == []
+
+    with pytest.raises(ValueError, match="Outlet processes are closed."):
+        processes.start()
+
+
+def test_refill():
+    """ Test to see if refills go to the shared inventory.
+    """
+
+    # assign data to pass to coffee machine
+    beverages = {"hot_tea":{"milk":1}}
+    machine = CoffeeMachine(1, beverages, {"milk":5},
+        event_sink=MemorySink())
+    processes = ProcessMachine(machine)
+
+    processes.refill("milk", 3)
+    assert processes.raw_material_qty["milk"] == 8
+
+    with pytest.raises(ValueError, match="Ingredient is not a string."):
+        processes.refill(5, 3)
+
+    with pytest.raises(ValueError, match="Quantity is not an integer."):
+        processes.refill("milk", 1.5)
+
+    with pytest.raises(ValueError, match="Ingredient not in coffee"):
+        processes.refill("water", 3)
+
+    with pytest.raises(ValueError, match="Cannot add because final"):
+        processes.refill("milk", -9)
+
+    processes.close()
+
+
+def test_close_levels():
+    """ Test to see if the levels left in the shared inventory are copied
+    back to the machine when the started outlet processes are closed.
+    """
+
+    # assign data to pass to coffee machine
+    beverages = {"hot_tea":{"milk":2}, "latte":{"milk":1, "beans":1}}
+    machine = CoffeeMachine(2, beverages, {"milk":5, "beans":1},
+        event_sink=MemorySink())
+    processes = ProcessMachine(machine)
+    processes.start()
+
+    processes.makeOrder(["hot_tea"])
+    processes.refill("beans", 2)
+    assert machine.raw_material_qty["milk"] == 5
+
+    processes.close()
+
+    assert dict(machine.raw_material_qty) == {"milk":3, "beans":3}
+    assert machine.makeOrder(["latte"])[0].status == 1
+
+
+def test_makeOrder_process_exited():
+    """ Test to see if an order fails, instead of waiting forever, when an
+    outlet process exits before its drinks are done, and the next order
+    runs on fresh processes.
+    """
+
+    # assign data to pass to coffee machine
+    beverages = {"hot_tea":{"milk":1}}
+    machine = CoffeeMachine(1, beverages, {"milk":5},
+        event_sink=MemorySink())
+    processes = ProcessMachine(machine)
+    processes.start()
+
+    processes.processes[0].terminate()
+    processes.processes[0].join()
+
+    with pytest.raises(ValueError, match="exited before its drinks were"):
+        processes.makeOrder(["hot_tea"])
+
+    assert processes.processes == []
+    assert processes.makeOrder(["hot_tea"])[0].status == 1
+    assert processes.raw_material_qty["milk"] == 4
+
+    processes.close()
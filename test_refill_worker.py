@@ -0,0 +1,107 @@
+# Test functionality of the RefillWorker class, method by method
+
+from clock import VirtualClock
+from refill_worker import RefillWorker
+import pytest
+
+def test_RefillWorker_refill_type():
+    """ Test to check if a refill that cannot be called is refused.
+    """
+
+    with pytest.raises(ValueError, match="Refill is not callable."):
+        worker = RefillWorker("hello")
+
+
+def test_RefillWorker_delay():
+    """ Test to check if a delay that is not a number of at least 0 is
+    refused.
+    """
+
+    with pytest.raises(ValueError, match="Refill delay is not a number"):
+        worker = RefillWorker(print, -1)
+
+
+def test_RefillWorker_rate():
+    """ Test to check if a rate that is not a number more than 0 is
+    refused.
+    """
+
+    with pytest.raises(ValueError, match="Refill rate must be a number"):
+        worker = RefillWorker(print, 0, 0)
+
+
+def test_latency():
+    """ Test to see if a refill takes the delay, plus a second for every
+    rate units it adds.
+    """
+
+    assert RefillWorker(print, 5).latency({"milk":10}) == 5
+    assert RefillWorker(print, 5, 2).latency({"milk":10, "water":4}) == 12
+
+
+def test_request_thread():
+    """ Test to see if refills are done on the background thread, in the
+    order they were asked for, and their actions are run once done.
+    """
+
+    levels = {"milk":0}
+    done = []
+
+    def refill(ingredient, qty):
+        levels[ingredient] += qty
+
+    worker = RefillWorker(refill)
+    worker.request({"milk":2}, done.append, 1)
+    worker.request({"milk":3}, done.append, 2)
+    worker.flush()
+
+    assert levels == {"milk":5}
+    assert done == [1, 2]
+    assert worker.stats() == {"requested":2, "delivered":2, "pending":0,
+        "failed":0, "quantities":{"milk":5}}
+
+    worker.close()
+    assert worker.thread is None
+
+
+def test_request_virtual_clock():
+    """ Test to see if refills are scheduled on a virtual clock one after
+    another, each taking its latency.
+    """
+
+    clock = VirtualClock()
+    done = []
+
+    worker = RefillWorker(lambda ingredient, qty: None, 10, 1, clock)
+    worker.request({"milk":5}, lambda: done.append(clock.now()))
+    worker.request({"milk":5}, lambda: done.append(clock.now()))
+
+    assert worker.pending == 2
+
+    clock.run()
+
+    assert done == [15, 30]
+    assert worker.pending == 0
+
+
+def test_request_failed():
+    """ Test to see if a refill that raises an error is counted, handed
+    on, and still runs its action, without stopping the worker.
+    """
+
+    def refill(ingredient, qty):
+        raise ValueError("broken")
+
+    errors = []
+    done = []
+
+    worker = RefillWorker(refill)
+    worker.request({"milk":2}, done.append, 1, on_error=errors.append)
+    worker.request({"milk":2})
+    worker.flush()
+
+    # the action still runs, after the error is handed on
+    assert [str(error) for error in errors] == ["broken"]
+    assert done == [1]
+    assert worker.stats()["failed"] == 2
+    assert worker.stats()["pending"] == 0
@@ -0,0 +1,126 @@
+# Test functionality of the SharedInventory class, method by method
+
+from shared_inventory import SharedInventory
+import multiprocessing
+import pytest
+
+def takeMany(inventory, count):
+    """ Takes a drink of one unit of each ingredient count times, in
+    another process.
+    """
+
+    for i in range(count):
+        inventory.take((0, 1), (1, 1))
+
+    inventory.close()
+
+
+def addAndUnlink(inventory):
+    """ Adds to a level and unlinks the inventory, in another process.
+    """
+
+    inventory.add(1, 4)
+    inventory.unlink()
+
+
+def test_SharedInventory_type():
+    """ Test to check if levels that are not a tuple of integers are
+    handled correctly.
+    """
+
+    with pytest.raises(ValueError, match="Levels are not a tuple."):
+        inventory = SharedInventory([2])
+
+    with pytest.raises(ValueError, match="Level is not an integer."):
+        inventory = SharedInventory((2.5,))
+
+
+def test_levels():
+    """ Test to see if the levels given are kept in shared memory.
+    """
+
+    inventory = SharedInventory((2, 3))
+
+    assert inventory.levels() == (2, 3)
+    inventory.unlink()
+
+    # a machine with no ingredients still gets memory
+    inventory = SharedInventory(())
+
+    assert inventory.levels() == ()
+    inventory.unlink()
+
+
+def test_take():
+    """ Test to see if a drink is only taken out if every ingredient is
+    sufficient, unless the short ones are refilled.
+    """
+
+    inventory = SharedInventory((5, 1, 7))
+
+    assert inventory.take((0, 1), (2, 1, 0)) == (True, {})
+    assert inventory.levels() == (3, 0, 7)
+
+    assert inventory.take((0, 1), (2, 1, 0)) == (False, {1: 1})
+    assert inventory.levels() == (3, 0, 7)
+
+    # refilled ingredients are left empty by the drink
+    assert inventory.take((0, 1), (4, 1, 0), True) == (True, {0: 1, 1: 1})
+    assert inventory.levels() == (0, 0, 7)
+
+    inventory.unlink()
+
+
+def test_add():
+    """ Test to see if adding to a level never leaves it negative.
+    """
+
+    inventory = SharedInventory((5,))
+
+    assert inventory.add(0, 3) == 8
+
+    with pytest.raises(ValueError, match="Cannot add because final"):
+        inventory.add(0, -9)
+
+    assert inventory.levels() == (8,)
+    inventory.unlink()
+
+
+def test_attach():
+    """ Test to see if an inventory passed to another process attaches to
+    the same memory, and leaves freeing it to the process that created it.
+    """
+
+    context = multiprocessing.get_context("spawn")
+    inventory = SharedInventory((5, 6), context)
+
+    process = context.Process(target=addAndUnlink, args=(inventory,))
+    process.start()
+    process.join()
+
+    assert process.exitcode == 0
+    assert inventory.levels() == (5, 10)
+    assert inventory.owner == True
+
+    inventory.unlink()
+    assert inventory.owner == False
+
+
+@pytest.mark.parametrize("method", ["fork", "spawn"])
+def test_take_processes(method):
+    """ Test to see if drinks taken from several processes at once are all
+    taken out of the same levels, with none lost.
+    """
+
+    context = multiprocessing.get_context(method)
+    inventory = SharedInventory((1000, 1000), context)
+
+    processes = [context.Process(target=takeMany, args=(inventory, 200))
+        for i in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+    assert inventory.levels() == (200, 200)
+    inventory.unlink()
@@ -0,0 +1,181 @@
+# Test functionality of the capacity simulator, function by function
+
+from simulator import CapacitySimulator, loadArrivals, main
+from simulator import periodicRefills, poissonArrivals, sweep
+import json
+import pytest
+
+def test_poissonArrivals_seeded():
+    """ Test to check if arrivals are repeatable, in order and in range.
+    """
+
+    # assign data to pass to coffee machine
+    mix = {"hot_tea":1, "black_tea":3, "cocoa":0}
+
+    arrivals = poissonArrivals(0.5, 1000, mix, 7)
+    times = [arrival[0] for arrival in arrivals]
+
+    assert arrivals == poissonArrivals(0.5, 1000, mix, 7)
+    assert times == sorted(times)
+    assert 0 < times[0] and times[-1] < 1000
+    assert 400 < len(arrivals) < 600
+    assert {arrival[1] for arrival in arrivals} == {"hot_tea", "black_tea"}
+
+
+def test_poissonArrivals_checks():
+    """ Test to check if a bad rate or order mix is handled correctly.
+    """
+
+    with pytest.raises(ValueError,
+        match="Arrival rate must be a number more than 0."):
+        poissonArrivals(0, 1000, ["hot_tea"])
+
+    with pytest.raises(ValueError, match="Order mix is empty."):
+        poissonArrivals(1, 1000, [])
+
+    with pytest.raises(ValueError,
+        match="Weight of drink in order mix is not a number of at least 0."):
+        poissonArrivals(1, 1000, {"hot_tea":{"milk":1}})
+
+
+def test_loadArrivals():
+    """ Test to check if recorded arrivals are read in time order.
+    """
+
+    arrivals = loadArrivals("test_data/recorded_arrivals.txt")
+
+    assert arrivals == [(0.0, "hot_tea"), (3.0, "hot_tea"),
+        (12.5, "black_tea")]
+
+
+def test_loadArrivals_format(tmp_path):
+    """ Test to check if a line without a time is handled correctly.
+    """
+
+    path = tmp_path / "arrivals.txt"
+    path.write_text("hot_tea\n")
+
+    with pytest.raises(ValueError,
+        match="Arrival is not a time and a drink name."):
+        loadArrivals(str(path))
+
+
+def test_periodicRefills():
+    """ Test to check if refills are scheduled at every interval.
+    """
+
+    # assign data to pass to coffee machine
+    total_items_qty = {"milk":5}
+
+    refills = periodicRefills(total_items_qty, 10, 35)
+
+    assert [refill[0] for refill in refills] == [10, 20, 30]
+
+    with pytest.raises(ValueError,
+        match="Refill interval must be a number more than 0."):
+        periodicRefills(total_items_qty, 0, 35)
+
+
+def test_simulate_contention_and_stockout():
+    """ Test to check if orders wait for the outlet, and are turned away
+    once an ingredient runs out.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 1
+    beverages = {"hot_tea":{"milk":1}}
+    total_items_qty = {"milk":2}
+    arrivals = [(0, "hot_tea"), (0, "hot_tea"), (0, "hot_tea")]
+
+    simulator = CapacitySimulator(num_outlets, beverages, total_items_qty,
+        pour_time=10)
+    report = simulator.simulate(arrivals, interval=10)
+    summary = report["summary"]
+    curves = report["curves"]
+
+    assert summary["served"] == 2
+    assert summary["stockouts"] == 1
+    assert summary["max_wait"] == 20
+    assert summary["utilization"] == 1.0
+    assert summary["first_stockout"] == {"milk":20}
+    assert curves["time"] == [0, 10]
+    assert curves["queue_length"] == [2, 1]
+    assert curves["mean_wait"] == [10, 0]
+    assert curves["stockouts"] == [0, 1]
+    assert curves["levels"] == {"milk":[1, 0]}
+
+
+def test_simulate_refills():
+    """ Test to check if a refill on the schedule prevents a stockout.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 1
+    beverages = {"hot_tea":{"milk":1}}
+    total_items_qty = {"milk":2}
+    arrivals = [(0, "hot_tea"), (0, "hot_tea"), (0, "hot_tea")]
+
+    simulator = CapacitySimulator(num_outlets, beverages, total_items_qty,
+        pour_time=10)
+    report = simulator.simulate(arrivals, [(15, {"milk":2})], interval=10)
+
+    assert report["summary"]["served"] == 3
+    assert report["summary"]["stockouts"] == 0
+    assert report["curves"]["levels"] == {"milk":[1, 2, 1]}
+
+
+def test_simulate_outlets_and_unavailable():
+    """ Test to check if more outlets remove the wait, and drinks the
+    machine has no ingredients for are counted apart.
+    """
+
+    # assign data to pass to coffee machine
+    num_outlets = 2
+    beverages = {"hot_tea":{"milk":1}, "cocoa":{"cocoa":1}}
+    total_items_qty = {"milk":10}
+    arrivals = [(0, "hot_tea"), (0, "cocoa"), (0, "hot_tea")]
+
+    simulator = CapacitySimulator(num_outlets, beverages, total_items_qty,
+        pour_time=10)
+    summary = simulator.simulate(arrivals)["summary"]
+
+    assert summary["served"] == 2
+    assert summary["unavailable"] == 1
+    assert summary["max_wait"] == 0
+    assert summary["end"] == 10
+
+    with pytest.raises(ValueError,
+        match="Drink recipe for ordered drink is not known."):
+        simulator.simulate([(0, "latte")])
+
+
+def test_sweep():
+    """ Test to check if every combination of settings is simulated.
+    """
+
+    # assign data to pass to coffee machine
+    beverages = {"hot_tea":{"milk":1}}
+    total_items_qty = {"milk":5}
+    arrivals = poissonArrivals(0.1, 3600, ["hot_tea"])
+
+    reports = sweep(beverages, total_items_qty, arrivals, [1, 2], [1, 100],
+        [None, 600], pour_time=30)
+    summaries = [report["summary"] for report in reports]
+
+    assert len(reports) == 8
+    assert summaries[0]["served"] == 5
+    assert summaries[1]["served"] > 5
+    assert summaries[3]["stockouts"] == 0
+    assert summaries[7]["p99_wait"] <= summaries[3]["p99_wait"]
+
+
+def test_main(capsys):
+    """ Test to check if the command line prints a summary per setting.
+    """
+
+    main(["--arrivals", "test_data/recorded_arrivals.txt", "--num-outlets",
+        "1", "3"])
+    reports = json.loads(capsys.readouterr().out)
+
+    assert [report["summary"]["num_outlets"] for report in reports] == [1, 3]
+    assert "curves" not in reports[0]
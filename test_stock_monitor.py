@@ -0,0 +1,69 @@
+# Test functionality of the StockMonitor class, method by method
+
+from stock_monitor import StockMonitor
+import math
+import pytest
+
+def test_StockMonitor_window():
+    """ Test to check if a window that is not an integer more than 0 is
+    refused.
+    """
+
+    with pytest.raises(ValueError, match="Stock window is not an integer"):
+        monitor = StockMonitor(["milk"], 0)
+
+
+def test_StockMonitor_horizon():
+    """ Test to check if a horizon that is not a number more than 0 is
+    refused.
+    """
+
+    with pytest.raises(ValueError, match="Stock horizon must be a number"):
+        monitor = StockMonitor(["milk"], 5, "hello")
+
+
+def test_rates_window():
+    """ Test to see if rates are worked out from the last window pours
+    only.
+    """
+
+    monitor = StockMonitor(["milk", "water"], 3)
+
+    assert monitor.rates(0) == {"milk":0.0, "water":0.0}
+
+    for now in range(5):
+        monitor.record(now * 10, (now, 1), (100, 100))
+
+    # pours at 20, 30 and 40 are left, and the last two used 7 milk and
+    # 2 water in 20 seconds
+    assert monitor.rates(40) == {"milk":0.35, "water":0.1}
+
+
+def test_forecast():
+    """ Test to see if the time each ingredient runs out in is forecast
+    from its rate.
+    """
+
+    monitor = StockMonitor(["milk", "water", "sugar"], 10)
+    monitor.record(0, (2, 1, 0), (20, 10, 5))
+    monitor.record(10, (2, 1, 0), (18, 0, 5))
+
+    assert monitor.forecast(10, (18, 0, 5)) == {"milk":90.0, "water":0.0,
+        "sugar":math.inf}
+
+
+def test_record_low_once():
+    """ Test to see if an ingredient is reported low once, and again only
+    after its forecast went back beyond the horizon.
+    """
+
+    monitor = StockMonitor(["milk"], 10, 30)
+
+    assert monitor.record(0, (1,), (10,)) == []
+    assert monitor.record(10, (1,), (9,)) == []
+    assert monitor.record(20, (1,), (1,)) == [("milk", 1, 10.0)]
+    assert monitor.record(30, (1,), (0,)) == []
+
+    # a refill takes the forecast beyond the horizon again
+    assert monitor.record(40, (1,), (100,)) == []
+    assert monitor.record(50, (1,), (1,)) == [("milk", 1, 10.0)]
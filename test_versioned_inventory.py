@@ -0,0 +1,99 @@
+# Test functionality of the VersionedInventory class, method by method
+
+from versioned_inventory import VersionedInventory
+import threading
+import pytest
+
+def test_VersionedInventory_type():
+    """ Test to check if non tuple levels are handled correctly.
+    """
+
+    with pytest.raises(ValueError, match="Levels are not a tuple."):
+        inventory = VersionedInventory([2])
+
+
+def test_levels():
+    """ Test to see if the levels given are the first snapshot.
+    """
+
+    inventory = VersionedInventory((2, 3))
+
+    assert inventory.levels() == (2, 3)
+    assert inventory.snapshot == (0, (2, 3))
+
+
+def test_read():
+    """ Test to see if read returns the version along with its levels.
+    """
+
+    inventory = VersionedInventory((2, 3))
+    inventory.compareAndSwap(0, (1, 3))
+
+    assert inventory.read() == (1, (1, 3))
+
+
+def test_compareAndSwap():
+    """ Test to see if a commit only goes through from the latest version.
+    """
+
+    inventory = VersionedInventory((2,))
+    version, levels = inventory.snapshot
+
+    assert inventory.compareAndSwap(version, (1,))
+    assert not inventory.compareAndSwap(version, (0,))
+    assert inventory.levels() == (1,)
+    assert inventory.stats() == {"version":1, "commits":1, "retries":1}
+
+
+def test_update_no_change():
+    """ Test to see if an update that changes nothing is not committed.
+    """
+
+    inventory = VersionedInventory((2,))
+    result = inventory.update(lambda levels: (None, levels[0]))
+
+    assert result == 2
+    assert inventory.stats()["commits"] == 0
+
+
+def test_update_retries_on_conflict():
+    """ Test to see if an update is computed again when another commit
+    got in first.
+    """
+
+    inventory = VersionedInventory((2,))
+    calls = []
+
+    def change(levels):
+        # sneak in a commit the first time round
+        if not calls:
+            version, current = inventory.snapshot
+            inventory.compareAndSwap(version, (10,))
+        calls.append(levels[0])
+        return (levels[0] - 1,), None
+
+    inventory.update(change)
+
+    assert calls == [2, 10]
+    assert inventory.levels() == (9,)
+    assert inventory.stats() == {"version":2, "commits":2, "retries":1}
+
+
+def test_update_concurrent():
+    """ Test to see if concurrent updates never lose a change.
+    """
+
+    inventory = VersionedInventory((0,))
+
+    def add_many():
+        for i in range(1000):
+            inventory.update(lambda levels: ((levels[0] + 1,), None))
+
+    threads = [threading.Thread(target=add_many) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert inventory.levels() == (4000,)
+    assert inventory.stats()["commits"] == 4000
@@ -0,0 +1,207 @@
+# Test functionality of the WriteAheadLog class, method by method
+
+from write_ahead_log import WriteAheadLog
+import threading
+import pytest
+
+def test_WriteAheadLog_options(tmp_path):
+    """ Test to check if options that make no sense are handled correctly.
+    """
+
+    path = str(tmp_path / "stock.wal")
+
+    with pytest.raises(ValueError, match="Path of log file is not a"):
+        wal = WriteAheadLog(5)
+
+    with pytest.raises(ValueError, match="Snapshot interval is not an"):
+        wal = WriteAheadLog(path, 0)
+
+    with pytest.raises(ValueError, match="Commit delay is not a number"):
+        wal = WriteAheadLog(path, 10, -1)
+
+
+def test_open_new(tmp_path):
+    """ Test to see if a new log starts from the levels given, with a
+    snapshot of them.
+    """
+
+    path = str(tmp_path / "stock.wal")
+    wal = WriteAheadLog(path)
+
+    assert wal.open({"milk":5, "water":3}) == {"milk":5, "water":3}
+    assert (tmp_path / "stock.wal.snapshot").exists()
+
+    with pytest.raises(ValueError, match="already open."):
+        wal.open({})
+
+    wal.close()
+
+
+def test_log_recover(tmp_path):
+    """ Test to see if changes logged are added back on to the snapshot
+    when the log is opened again, after the levels given.
+    """
+
+    path = str(tmp_path / "stock.wal")
+    wal = WriteAheadLog(path)
+    wal.open({"milk":5, "water":3})
+
+    assert wal.log("pour", "latte", {"milk":-2}) == 1
+    assert wal.log("refill", None, {"water":4}) == 2
+    assert wal.levels == {"milk":3, "water":7}
+    assert wal.durable == 2
+
+    # as after a crash, the log is not closed
+    recovered = WriteAheadLog(path)
+
+    assert recovered.open({"milk":100, "sugar":1}) == {"milk":3, "water":7,
+        "sugar":1}
+    assert recovered.lsn == 2
+    assert recovered.stats()["recovery"]["changes"] == 2
+
+    # recovering wrote a snapshot, so nothing is left to add back on
+    recovered.close()
+    again = WriteAheadLog(path)
+
+    assert again.open({})["water"] == 7
+    assert again.recovery["changes"] == 0
+    again.close()
+
+
+def test_append_errors(tmp_path):
+    """ Test to check if changes of unknown kinds, or to a log that is not
+    open, are handled correctly.
+    """
+
+    wal = WriteAheadLog(str(tmp_path / "stock.wal"))
+
+    with pytest.raises(ValueError, match="Write-ahead log is not open."):
+        wal.append("pour", "latte", {"milk":-2})
+
+    wal.open({"milk":5})
+
+    with pytest.raises(ValueError, match="Change kind is not known."):
+        wal.append("spill", "latte", {"milk":-2})
+
+    wal.close()
+
+
+def test_snapshot_compaction(tmp_path):
+    """ Test to see if the log is emptied into a snapshot every so many
+    changes, so recovery only adds back on the changes after it.
+    """
+
+    path = str(tmp_path / "stock.wal")
+    wal = WriteAheadLog(path, snapshot_every=3)
+    wal.open({"milk":100})
+
+    for i in range(7):
+        wal.log("pour", "latte", {"milk":-1})
+
+    # the first snapshot is written when the log is opened
+    assert wal.snapshots == 3
+    assert wal.snapshot_lsn == 6
+
+    with open(path, "rb") as f:
+        assert len(f.readlines()) == 1
+
+    recovered = WriteAheadLog(path)
+
+    assert recovered.open({}) == {"milk":93}
+    assert recovered.recovery["changes"] == 1
+    recovered.close()
+
+
+def test_recover_torn_and_old_lines(tmp_path):
+    """ Test to see if a last line cut short by a crash is dropped, and
+    changes the snapshot already takes in are not added twice.
+    """
+
+    path = str(tmp_path / "stock.wal")
+    wal = WriteAheadLog(path)
+    wal.open({"milk":10})
+
+    wal.log("pour", "latte", {"milk":-2})
+    with open(path, "rb") as f:
+        old_lines = f.read()
+
+    # as a crash after the snapshot but before the log was emptied
+    wal.snapshot()
+    wal.log("pour", "latte", {"milk":-3})
+    wal.close()
+
+    with open(path, "rb") as f:
+        new_lines = f.read()
+
+    with open(path, "wb") as f:
+        f.write(old_lines + new_lines + b'[4, "pour", "latte", {"mi')
+
+    recovered = WriteAheadLog(path)
+
+    assert recovered.open({}) == {"milk":5}
+    assert recovered.recovery["changes"] == 1
+    assert recovered.lsn == 2
+    recovered.close()
+
+
+def test_group_commit(tmp_path):
+    """ Test to see if changes committed by several threads at once share
+    fsyncs, with none lost.
+    """
+
+    path = str(tmp_path / "stock.wal")
+    wal = WriteAheadLog(path, snapshot_every=10000, commit_delay=0.002)
+    wal.open({"milk":1000})
+
+    def pour():
+        for i in range(25):
+            wal.log("pour", "latte", {"milk":-1})
+
+    threads = [threading.Thread(target=pour) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    stats = wal.stats()
+
+    assert stats["lsn"] == 200
+    assert stats["fsyncs"] < 200
+    assert stats["changes_per_fsync"] > 1
+    assert 0 < stats["commit_p50"] <= stats["commit_p99"]
+    wal.close()
+
+    assert WriteAheadLog(path).open({}) == {"milk":800}
+
+
+def test_flush_failed(tmp_path, monkeypatch):
+    """ Test to see if a change whose flush failed is not lost, and no more
+    changes are taken until a snapshot takes it in.
+    """
+
+    path = str(tmp_path / "stock.wal")
+    wal = WriteAheadLog(path)
+    wal.open({"milk":5})
+    wal.log("pour", "latte", {"milk":-1})
+
+    def fsync(fd):
+        raise OSError("disk is full")
+
+    monkeypatch.setattr("write_ahead_log.os.fsync", fsync)
+
+    with pytest.raises(OSError, match="disk is full"):
+        wal.log("pour", "latte", {"milk":-2})
+
+    assert len(wal.buffer) == 1
+    assert wal.durable == 1
+
+    with pytest.raises(ValueError, match="needs a snapshot."):
+        wal.log("refill", None, {"milk":4})
+
+    monkeypatch.undo()
+    wal.snapshot()
+
+    assert wal.error is None
+    assert wal.log("refill", None, {"milk":4}) == 3
+    assert WriteAheadLog(path).open({}) == {"milk":6}
+    wal.close()
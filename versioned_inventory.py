@@ -0,0 +1,174 @@
+# Versioned inventory for the Coffee Machine. Ingredient levels are kept in
+# immutable snapshots, and a change is committed with a compare-and-swap on
+# the snapshot version, retrying only if another outlet committed first.
+
+import threading
+
+class VersionedInventory:
+    """ Class for optimistic, lock-free style updates of ingredient levels.
+    Every commit swaps in a new read-only snapshot of the levels along with
+    a new version number. A change is computed from the current snapshot
+    without holding any lock, and only committed if the version has not
+    moved in the meantime.
+
+    Attributes
+    ----------
+
+    snapshot : tuple
+        Pair of the current version (int) and the current levels, a tuple
+        of the quantity of each ingredient. Swapped as a whole, so it is
+        always consistent.
+
+    commits : int
+        Number of changes committed so far.
+
+    retries : int
+        Number of changes that had to be computed again because another
+        change was committed first.
+
+    """
+
+
+    def __init__(self, levels=()):
+        """Initializes the VersionedInventory class.
+
+        Parameters
+        ----------
+
+        levels : tuple
+            Starting quantity of each ingredient.
+
+        Returns
+        -------
+
+        """
+
+        if not isinstance(levels, tuple):
+            raise ValueError("Levels are not a tuple.")
+
+        self.snapshot = (0, levels)
+
+        # only held for the compare and the swap of a commit, never while
+        # a change is being computed
+        self.commit_lock = threading.Lock()
+
+        self.commits = 0
+        self.retries = 0
+
+
+    def levels(self):
+        """Returns the current levels of all ingredients.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        levels : tuple
+            Quantity of each ingredient.
+
+        """
+
+        return self.snapshot[1]
+
+
+    def read(self):
+        """Returns the current version along with its levels, which are
+        never changed once committed, so they can be read at any rate
+        without taking a lock.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        snapshot : tuple
+            Pair of the current version and the current levels.
+
+        """
+
+        return self.snapshot
+
+
+    def compareAndSwap(self, version, new_levels):
+        """Commits new levels, but only if no other change was committed
+        since the given version was read.
+
+        Parameters
+        ----------
+        version : int
+            Version the new levels were computed from.
+
+        new_levels : tuple
+            New levels of all ingredients.
+
+        Returns
+        -------
+        committed : bool
+            Whether the new levels were committed.
+
+        """
+
+        with self.commit_lock:
+            if self.snapshot[0] != version:
+                self.retries += 1
+                return False
+
+            self.snapshot = (version + 1, new_levels)
+            self.commits += 1
+
+        return True
+
+
+    def update(self, change):
+        """Applies a change to the levels, retrying on conflict until it
+        is committed.
+
+        Parameters
+        ----------
+        change : callable
+            Called with the current levels, and returns a pair of the new
+            levels (a tuple, or None to leave them as they are) and a
+            result. May be called several times, so it must not have side
+            effects.
+
+        Returns
+        -------
+        result : object
+            Result returned by change for the committed levels.
+
+        """
+
+        while True:
+            version, levels = self.snapshot
+            new_levels, result = change(levels)
+
+            if new_levels is None:
+                return result
+
+            if self.compareAndSwap(version, new_levels):
+                return result
+
+
+    def stats(self):
+        """Returns the version and the commit and retry counters.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        stats : dict
+            Dict with the current version, commits and retries.
+
+        """
+
+        with self.commit_lock:
+            return {
+                "version": self.snapshot[0],
+                "commits": self.commits,
+                "retries": self.retries,
+            }
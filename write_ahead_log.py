@@ -0,0 +1,580 @@
+# Write-ahead log for the Coffee Machine. Every change to the levels, such
+# as a pour or a refill, is appended to a log file as the amounts it adds
+# to or takes from each ingredient, and a drink is only done once its change
+# is on disk. Outlets committing at the same time share one fsync, so the
+# log costs far less than writing the levels out on every pour.
+#
+# Every so often the levels are written out whole as a snapshot, and the log
+# is emptied. After a crash, the levels are the snapshot with the changes in
+# the log after it added back on.
+#
+# The log holds one JSON list per line, of the log sequence number, the kind
+# of change, the drink it was for or None, and the change to each
+# ingredient. The snapshot holds the levels and the last log sequence number
+# they take in.
+
+import collections
+import json
+import os
+import threading
+import time
+
+# known kinds of changes
+CHANGE_KINDS = ("pour", "refill", "reserve", "release")
+
+class WriteAheadLog:
+    """ Class for keeping the levels of a coffee machine on disk. Changes
+    are appended to a buffer, and whoever commits first while no flush is
+    going on writes out and syncs the whole buffer, with every change
+    appended meanwhile, for the others. Changes add up in any order, so
+    outlets log them once their locks are released.
+
+    The log keeps the levels it has been told of itself, so a snapshot
+    always takes in exactly the changes logged before it, however the
+    machine locks its own levels.
+
+    Attributes
+    ----------
+
+    path : str
+        Path of the log file. The snapshot is kept next to it, with
+        .snapshot added to the path.
+
+    snapshot_every : int
+        Number of changes logged between snapshots.
+
+    commit_delay : float
+        Seconds a flush waits for more changes before writing, so more of
+        them share an fsync.
+
+    sync : bool
+        Whether changes are synced to disk, or only written to the file.
+
+    levels : dict
+        Quantity of each ingredient, with every change logged so far.
+
+    lsn : int
+        Log sequence number of the last change logged.
+
+    durable : int
+        Log sequence number of the last change on disk.
+
+    snapshot_lsn : int
+        Log sequence number of the last change the snapshot takes in.
+
+    error : Exception
+        Error the last flush failed with, or None. Once a flush fails, the
+        log may end in a torn line, so no more changes are taken until a
+        snapshot takes in the levels whole.
+
+    fsyncs : int
+        Number of flushes so far, each writing and syncing a group of
+        changes.
+
+    flushed_changes : int
+        Number of changes the flushes wrote out so far.
+
+    snapshots : int
+        Number of snapshots written so far.
+
+    latencies : collections.deque
+        Seconds the last changes took to commit, from being logged to
+        being on disk.
+
+    recovery : dict
+        Seconds the levels took to recover when the log was opened, and
+        the number of changes added back on.
+
+    """
+
+    # number of commit latencies kept for the percentiles
+    LATENCY_WINDOW = 1024
+
+
+    def __init__(self, path, snapshot_every=1000, commit_delay=0,
+        sync=True):
+        """Initializes the WriteAheadLog class.
+
+        Parameters
+        ----------
+
+        path : str
+            Path of the log file.
+
+        snapshot_every : int
+            Number of changes logged between snapshots. Defaults to 1000.
+            Recovery adds back on at most this many changes.
+
+        commit_delay : float
+            Seconds a flush waits for more changes before writing.
+            Defaults to 0, for outlets that pour at once to share an
+            fsync without waiting on each other.
+
+        sync : bool
+            Whether changes are synced to disk. Defaults to True. Without
+            syncing, changes survive the process crashing, but not the
+            machine.
+
+        Returns
+        -------
+
+        """
+
+        if not isinstance(path, str):
+            raise ValueError("Path of log file is not a string.")
+
+        if not isinstance(snapshot_every, int) or snapshot_every <= 0:
+            raise ValueError("Snapshot interval is not an integer more "+
+                "than 0.")
+
+        if not isinstance(commit_delay, (int, float)) or commit_delay < 0:
+            raise ValueError("Commit delay is not a number of at least 0.")
+
+        self.path = path
+        self.snapshot_path = path + ".snapshot"
+        self.snapshot_every = snapshot_every
+        self.commit_delay = commit_delay
+        self.sync = sync
+
+        self.file = None
+        self.levels = {}
+        self.buffer = []
+        self.lsn = 0
+        self.durable = 0
+        self.snapshot_lsn = 0
+        self.flushing = False
+        self.error = None
+
+        # guards everything above, and wakes commits once flushed
+        self.lock = threading.Lock()
+        self.flushed = threading.Condition(self.lock)
+
+        self.fsyncs = 0
+        self.flushed_changes = 0
+        self.snapshots = 0
+        self.latencies = collections.deque(maxlen=self.LATENCY_WINDOW)
+        self.recovery = {"seconds": 0.0, "changes": 0}
+
+
+    def open(self, levels):
+        """Opens the log, recovering the levels it holds, if any. A new log
+        starts from the levels given, with a first snapshot of them.
+
+        Parameters
+        ----------
+        levels : dict
+            Quantity of each ingredient to start from, with ingredient as
+            key, if the log holds no levels yet.
+
+        Returns
+        -------
+        levels : dict
+            Quantity of each ingredient the log holds, and of every other
+            ingredient given, as given.
+
+        """
+
+        if self.file is not None:
+            raise ValueError("Write-ahead log is already open.")
+
+        start = time.perf_counter()
+
+        recovered = self.__recover()
+
+        with self.lock:
+            if recovered is None:
+                self.levels = dict(levels)
+                changes = 0
+            else:
+                self.levels, self.lsn, changes = recovered
+                for ingredient in levels:
+                    self.levels.setdefault(ingredient, levels[ingredient])
+
+            self.durable = self.lsn
+            self.file = open(self.path, "ab")
+
+            # the recovered changes go into a snapshot straight away, so
+            # recovering again is quick, and a torn last line is dropped
+            self.__writeSnapshot()
+
+        self.recovery = {"seconds": time.perf_counter() - start,
+            "changes": changes}
+
+        return dict(self.levels)
+
+
+    def __recover(self):
+        """Method to read the levels back from the snapshot and the log.
+        Changes the snapshot already takes in are skipped, and so is a last
+        line that was only partly written.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        recovered : tuple
+            Levels, log sequence number of the last change, and number of
+            changes added back on, or None if there is no snapshot.
+
+        """
+
+        if not os.path.exists(self.snapshot_path):
+            return None
+
+        with open(self.snapshot_path, "r") as f:
+            snapshot = json.load(f)
+
+        levels = snapshot["levels"]
+        lsn = snapshot["lsn"]
+        changes = 0
+
+        if not os.path.exists(self.path):
+            return levels, lsn, changes
+
+        with open(self.path, "rb") as f:
+            for line in f:
+                # a line without its end was cut short by a crash, and
+                # nothing was written after it
+                if not line.endswith(b"\n"):
+                    break
+
+                record_lsn, kind, drink_name, change = json.loads(line)
+
+                if record_lsn <= lsn:
+                    continue
+
+                for ingredient in change:
+                    levels[ingredient] = (levels.get(ingredient, 0) +
+                        change[ingredient])
+
+                lsn = record_lsn
+                changes += 1
+
+        return levels, lsn, changes
+
+
+    def log(self, kind, drink_name, change):
+        """Logs a change to the levels, and waits until it is on disk.
+
+        Parameters
+        ----------
+        kind : str
+            Kind of the change, one of CHANGE_KINDS.
+
+        drink_name : str
+            Name of the drink the change was for, or None.
+
+        change : dict
+            Amount added to each ingredient, negative for amounts taken
+            out, with ingredient as key.
+
+        Returns
+        -------
+        lsn : int
+            Log sequence number of the change.
+
+        """
+
+        start = time.perf_counter()
+
+        lsn = self.append(kind, drink_name, change)
+        self.commit(lsn)
+
+        with self.lock:
+            self.latencies.append(time.perf_counter() - start)
+
+        return lsn
+
+
+    def append(self, kind, drink_name, change):
+        """Appends a change to the levels to the buffer, without waiting
+        for it to be on disk.
+
+        Parameters
+        ----------
+        kind : str
+            Kind of the change, one of CHANGE_KINDS.
+
+        drink_name : str
+            Name of the drink the change was for, or None.
+
+        change : dict
+            Amount added to each ingredient, with ingredient as key.
+
+        Returns
+        -------
+        lsn : int
+            Log sequence number of the change, to commit.
+
+        """
+
+        if kind not in CHANGE_KINDS:
+            raise ValueError("Change kind is not known.")
+
+        with self.lock:
+            if self.file is None:
+                raise ValueError("Write-ahead log is not open.")
+
+            self.__checkFailed()
+
+            self.lsn += 1
+            self.buffer.append(json.dumps([self.lsn, kind, drink_name,
+                change]).encode("utf-8") + b"\n")
+
+            for ingredient in change:
+                self.levels[ingredient] = (self.levels.get(ingredient, 0) +
+                    change[ingredient])
+
+            return self.lsn
+
+
+    def commit(self, lsn):
+        """Waits until a change is on disk. If no flush is going on, this
+        caller flushes every change appended so far, and the callers
+        waiting meanwhile are done once it is.
+
+        Parameters
+        ----------
+        lsn : int
+            Log sequence number of the change.
+
+        Returns
+        -------
+
+        """
+
+        with self.flushed:
+            while self.durable < lsn:
+                self.__checkFailed()
+
+                if self.flushing:
+                    self.flushed.wait()
+                    continue
+
+                self.flushing = True
+                flushed = None
+
+                # the buffer is written without the lock, so outlets keep
+                # appending the next group meanwhile
+                self.lock.release()
+                try:
+                    flushed = self.__flush()
+                finally:
+                    self.lock.acquire()
+                    self.flushing = False
+                    self.flushed.notify_all()
+
+                if flushed - self.snapshot_lsn >= self.snapshot_every:
+                    self.__writeSnapshot()
+
+
+    def __flush(self):
+        """Method to write out and sync the buffer, by the one caller
+        flushing, without the lock held.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        lsn : int
+            Log sequence number of the last change flushed.
+
+        """
+
+        if self.commit_delay > 0:
+            time.sleep(self.commit_delay)
+
+        with self.lock:
+            lines = self.buffer
+            self.buffer = []
+            lsn = self.lsn
+
+        try:
+            self.file.write(b"".join(lines))
+            self.file.flush()
+
+            if self.sync:
+                os.fsync(self.file.fileno())
+        except Exception as error:
+            # the lines are put back, for the snapshot that has to take
+            # them in, since only part of them may be in the file
+            with self.lock:
+                self.buffer = lines + self.buffer
+                self.error = error
+            raise
+
+        with self.lock:
+            self.durable = lsn
+            self.fsyncs += 1
+            self.flushed_changes += len(lines)
+
+        return lsn
+
+
+    def __checkFailed(self):
+        """Method to refuse changes once a flush failed, until a snapshot
+        is written, once the lock is held.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+
+        """
+
+        if self.error is not None:
+            raise ValueError("Write-ahead log failed to write changes, "+
+                "and needs a snapshot.")
+
+
+    def __writeSnapshot(self):
+        """Method to write out the levels as a snapshot and empty the log,
+        once the lock is held. The snapshot replaces the last one whole, so
+        a crash meanwhile leaves one or the other, and changes left in the
+        log that it takes in are skipped when recovering.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+
+        """
+
+        # the snapshot takes in the changes not yet flushed as well
+        self.buffer = []
+
+        temp_path = self.snapshot_path + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump({"lsn": self.lsn, "levels": self.levels}, f)
+            f.flush()
+            if self.sync:
+                os.fsync(f.fileno())
+
+        os.replace(temp_path, self.snapshot_path)
+
+        # the new name is only on disk once the directory is
+        if self.sync:
+            directory = os.open(os.path.dirname(os.path.abspath(
+                self.snapshot_path)), os.O_RDONLY)
+            try:
+                os.fsync(directory)
+            finally:
+                os.close(directory)
+
+        self.file.truncate(0)
+        self.file.flush()
+        if self.sync:
+            os.fsync(self.file.fileno())
+
+        self.durable = self.lsn
+        self.snapshot_lsn = self.lsn
+        self.snapshots += 1
+        self.error = None
+        self.flushed.notify_all()
+
+
+    def snapshot(self):
+        """Writes out a snapshot of the levels now, and empties the log.
+        Changes are taken again after a failed flush once this is done.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+
+        """
+
+        with self.flushed:
+            while self.flushing:
+                self.flushed.wait()
+
+            if self.file is None:
+                raise ValueError("Write-ahead log is not open.")
+
+            self.__writeSnapshot()
+
+
+    def close(self):
+        """Writes out every change appended so far, and closes the log. It
+        can be opened again.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+
+        """
+
+        with self.flushed:
+            while self.flushing:
+                self.flushed.wait()
+
+            if self.file is None:
+                return
+
+            # after a failed flush the changes go in a snapshot, since the
+            # log may end in a torn line
+            if self.error is not None:
+                self.__writeSnapshot()
+            elif self.buffer:
+                self.file.write(b"".join(self.buffer))
+                self.buffer = []
+                self.file.flush()
+                if self.sync:
+                    os.fsync(self.file.fileno())
+
+            self.durable = self.lsn
+            self.file.close()
+            self.file = None
+            self.flushed.notify_all()
+
+
+    def stats(self):
+        """Returns a consistent copy of the log counters, along with the
+        commit latency of the last changes.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        stats : dict
+            Dict with the log sequence number, the flushes and snapshots
+            so far, the changes per flush, the median and 99th percentile
+            commit latency in seconds, and the recovery listed in the
+            class attributes.
+
+        """
+
+        with self.lock:
+            latencies = sorted(self.latencies)
+
+            if latencies:
+                p50 = latencies[(len(latencies) - 1) // 2]
+                p99 = latencies[(len(latencies) - 1) * 99 // 100]
+            else:
+                p50 = p99 = 0.0
+
+            return {
+                "lsn": self.lsn,
+                "fsyncs": self.fsyncs,
+                "snapshots": self.snapshots,
+                "changes_per_fsync": (self.flushed_changes /
+                    max(self.fsyncs, 1)),
+                "commit_p50": p50,
+                "commit_p99": p99,
+                "recovery": dict(self.recovery),
+            }